@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+Drives concurrent requests through AsyncCaseTagger, and compares them to tagging the same
+texts sequentially with CaseTagger.
+
+Usage: python benchmarks/async_tagging.py [--requests N] [--phrases N] [--workers N]
+"""
+import argparse
+import asyncio
+import copy
+import time
+
+from corpus import create_text, strip_tags, count_tokens
+
+from casetagger.aio import AsyncCaseTagger
+from casetagger.tagger import CaseTagger
+
+LANGUAGE = "bench_async"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=50)
+    parser.add_argument('--phrases', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    CaseTagger.instantiate_db(LANGUAGE)
+    CaseTagger.train(create_text(500, seed=1, language=LANGUAGE))
+    CaseTagger.finalize_training()
+
+    texts = [strip_tags(create_text(args.phrases, seed=100 + i, language=LANGUAGE)) for i in range(args.requests)]
+    tokens = sum(count_tokens(text) for text in texts)
+
+    sequential_texts = copy.deepcopy(texts)
+    start = time.time()
+    for text in sequential_texts:
+        CaseTagger.tag_text(text)
+    sequential_time = time.time() - start
+
+    tagger = AsyncCaseTagger(LANGUAGE, max_workers=args.workers)
+    concurrent_texts = copy.deepcopy(texts)
+
+    async def run():
+        await asyncio.gather(*[tagger.tag_text(text) for text in concurrent_texts])
+        await tagger.close()
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    start = time.time()
+    loop.run_until_complete(run())
+    concurrent_time = time.time() - start
+    loop.close()
+
+    print("Sequential: %.0f tokens/s" % (tokens / sequential_time))
+    print("Concurrent (%d requests): %.0f tokens/s" % (args.requests, tokens / concurrent_time))
+    print("Coalesced %d key lookups into %d queries" % (tagger.lookups, tagger.queries))
+
+    CaseTagger.db._destroy_database()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+Compares building a db from scratch with ModelBuilder to training it incrementally, for wall-clock time and
+for the equivalence of the resulting dbs.
+
+With --max-keys, the builder spills sorted runs to temporary files whenever that many cases are counted.
+
+Usage: python benchmarks/bulk_build.py [--phrases N] [--texts N] [--max-keys N]
+"""
+import argparse
+import time
+
+from corpus import create_text
+
+from casetagger.build import ModelBuilder
+from casetagger.db import DbHandler
+from casetagger.tagger import CaseTagger
+
+TRAIN_LANGUAGE = "bench_build_train"
+BUILD_LANGUAGE = "bench_build"
+
+
+def get_model(db):
+    cases = {}
+    for case in db.get_all_cases():
+        key = (case.type, case.case_from, case.case_to)
+        cases[key] = cases.get(key, 0) + case.occurrences
+
+    counters = {}
+    for counter in db.get_all_case_counters():
+        key = (counter.type, counter.case_from)
+        counters[key] = counters.get(key, 0) + counter.occurrences
+
+    return cases, counters
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--phrases', type=int, default=200)
+    parser.add_argument('--texts', type=int, default=5)
+    parser.add_argument('--max-keys', type=int, default=None)
+    args = parser.parse_args()
+
+    texts = [create_text(args.phrases, seed=i, language=TRAIN_LANGUAGE) for i in range(args.texts)]
+
+    CaseTagger.instantiate_db(TRAIN_LANGUAGE)
+    CaseTagger.db._clear_database()
+    start = time.time()
+    CaseTagger.train_texts(texts)
+    CaseTagger.finalize_training()
+    train_time = time.time() - start
+
+    builder = ModelBuilder(BUILD_LANGUAGE, max_keys=args.max_keys)
+    start = time.time()
+    builder.add_texts(texts)
+    builder.build(replace=True)
+    build_time = time.time() - start
+
+    stats = builder.get_stats()
+    print("Incremental train: %.2f s" % train_time)
+    print("Bulk build: %.2f s (aggregate %.2f s, sort %.2f s, load %.2f s, index %.2f s, analyze %.2f s, "
+          "finalize %.2f s)" % (build_time, stats['aggregate'], stats['sort'], stats['load'], stats['index'],
+                                stats['analyze'], stats['finalize']))
+
+    built_db = DbHandler(BUILD_LANGUAGE)
+    print("Equivalent: %s" % (get_model(CaseTagger.db) == get_model(built_db)))
+    print("%d cases, %d from-counters" % (stats['cases'], stats['case_counters']))
+    print("Spilled %d keys in %d sorted runs" % (stats['spilled_keys'], stats['spilled_runs']))
+
+    built_db._destroy_database()
+    CaseTagger.db._destroy_database()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+Synthetic corpora for the benchmarks.
+"""
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from typecraft_python.models import Text, Phrase, Word, Morpheme
+
+WORDS = [u"hei", u"dette", u"er", u"gøy", u"og", u"veldig", u"morsomt", u"la", u"oss", u"leke",
+         u"huset", u"bilen", u"gikk", u"kom", u"store", u"små", u"mannen", u"kvinnen", u"barna", u"ute"]
+POS = [u"N", u"V", u"ADJ", u"PREP", u"CONJ", u"PN", u"ADV", u"DET"]
+GLOSSES = [u"PL", u"SG", u"DEF", u"INDEF", u"PST", u"PRS", u"3SG", u"1SG", u"NEU", u"MASC"]
+
+
+def create_text(phrase_count, seed=0, language="bench"):
+    """
+    Creates a fully annotated text of random phrases.
+
+    :param phrase_count: The number of phrases.
+    :param seed: The random seed, the same seed always yields the same text.
+    :param language: The language of the text.
+    :return: A Text.
+    """
+    rand = random.Random(seed)
+    text = Text(title="synthetic-%d" % seed, language=language)
+
+    for _ in range(phrase_count):
+        phrase = Phrase()
+        words = [rand.choice(WORDS) for _ in range(rand.randint(3, 10))]
+        phrase.phrase = u" ".join(words)
+
+        for word_form in words:
+            word = Word()
+            word.word = word_form
+            # Most words keep a fixed POS, so there is something to learn
+            word.pos = POS[sum(map(ord, word_form)) % len(POS)] if rand.random() < 0.8 else rand.choice(POS)
+
+            split = rand.randint(1, len(word_form))
+            for part in [word_form[:split], word_form[split:]]:
+                if part:
+                    morpheme = Morpheme()
+                    morpheme.morpheme = part
+                    morpheme.glosses = [rand.choice(GLOSSES)]
+                    word.add_morpheme(morpheme)
+
+            phrase.add_word(word)
+
+        text.add_phrase(phrase)
+
+    return text
+
+
+def strip_tags(text):
+    """
+    Removes all POS-tags and glosses of a text, in place.
+
+    :param text:
+    :return: The text.
+    """
+    for phrase in text.phrases:
+        for word in phrase.words:
+            word.pos = u""
+            for morpheme in word.morphemes:
+                morpheme.glosses = []
+    return text
+
+
+def count_tokens(text):
+    return sum(len(phrase.words) for phrase in text.phrases)
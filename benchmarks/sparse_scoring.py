@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+Compares scoring batches with sparse matrix products to merging the cases of every token, for agreement
+and speed. Requires numpy and scipy.
+
+The model is built once per process, which is included in the end-to-end figure. With the default 500
+training phrases, building took about 5 s. Tagging 661 tokens, sparse scoring ran at 170 tokens/s against
+73 for merging, but only at 77 tokens/s with the build. With --phrases 400 (2601 tokens), it ran at
+122 tokens/s with the build against 63, so the build pays off from about 700 tokens per process.
+
+Usage: python benchmarks/sparse_scoring.py [--train-phrases N] [--phrases N] [--batch-size N]
+"""
+import argparse
+import copy
+import time
+
+from corpus import create_text, strip_tags, count_tokens
+
+from casetagger.config import config
+from casetagger.tagger import CaseTagger
+
+LANGUAGE = "bench_sparse"
+
+
+def get_tags(text):
+    return [(word.pos, [morpheme.glosses for morpheme in word.morphemes])
+            for phrase in text.phrases for word in phrase.words]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--train-phrases', type=int, default=500)
+    parser.add_argument('--phrases', type=int, default=100)
+    parser.add_argument('--batch-size', type=int, default=50)
+    args = parser.parse_args()
+
+    CaseTagger.instantiate_db(LANGUAGE)
+    CaseTagger.train(create_text(args.train_phrases, seed=1, language=LANGUAGE))
+    CaseTagger.finalize_training()
+
+    text = strip_tags(create_text(args.phrases, seed=2, language=LANGUAGE))
+    tokens = count_tokens(text)
+
+    cases_text = copy.deepcopy(text)
+    start = time.time()
+    CaseTagger.tag_phrases(cases_text.phrases, args.batch_size)
+    cases_time = time.time() - start
+
+    config['use_sparse_scoring'] = True
+
+    start = time.time()
+    CaseTagger.get_sparse_model(CaseTagger.db, CaseTagger.resolve_tagger_config())
+    build_time = time.time() - start
+
+    sparse_text = copy.deepcopy(text)
+    start = time.time()
+    CaseTagger.tag_phrases(sparse_text.phrases, args.batch_size)
+    sparse_time = time.time() - start
+
+    cases_tags = get_tags(cases_text)
+    sparse_tags = get_tags(sparse_text)
+    agreeing = sum(1 for cases_tag, sparse_tag in zip(cases_tags, sparse_tags) if cases_tag == sparse_tag)
+
+    print("Cases: %.0f tokens/s" % (tokens / cases_time))
+    print("Sparse: %.0f tokens/s, model built in %.2f s, %.0f tokens/s with the build" %
+          (tokens / sparse_time, build_time, tokens / (build_time + sparse_time)))
+    print("Agreement: %d of %d words (%.1f %%)" % (agreeing, len(cases_tags), 100.0 * agreeing / len(cases_tags)))
+
+    CaseTagger.db._destroy_database()
+
+
+if __name__ == '__main__':
+    main()
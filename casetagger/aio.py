@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+Asyncio façade over the tagger, for use from async applications.
+
+This module requires Python 3.5 or newer.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from casetagger.config import config, get_tagger_config
+from casetagger.db import DbHandler
+from casetagger.models import WordCases, MorphemeCases
+from typecraft_python.models import Text
+
+
+class AsyncCaseTagger(object):
+    """
+    Tags texts without blocking the event loop.
+
+    Case generation runs in a bounded thread pool, and all database access runs in a single
+    dedicated thread owning the connection. Lookups of concurrent requests are coalesced: keys
+    requested while a query is in flight are fetched together in the next query, and keys requested
+    by several requests at once are only fetched once.
+    """
+
+    def __init__(self, language, max_workers=4, timeout=None):
+        """
+        Creates the tagger.
+
+        :param language: The language of the database to tag with.
+        :param max_workers: The number of threads generating cases.
+        :param timeout: The default timeout of a request in seconds, or None.
+        """
+        self.language = language
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers)
+        self.db_executor = ThreadPoolExecutor(1)
+        self.db = None
+
+        # Keys waiting for the next query, and their futures
+        self.pending = {}
+        self.query_running = False
+
+        # Stats
+        self.lookups = 0
+        self.queries = 0
+
+    def _create_db(self):
+        self.db = DbHandler(self.language, config['use_memory_db'])
+
+    async def _run_in_db_thread(self, func, *args):
+        loop = asyncio.get_event_loop()
+
+        if self.db is None:
+            await loop.run_in_executor(self.db_executor, self._create_db)
+
+        return await loop.run_in_executor(self.db_executor, func, *args)
+
+    async def get_to_cases_by_keys(self, keys):
+        """
+        Fetches the to-cases of a set of (type, case_from) keys, coalescing the lookup with the
+        lookups of other requests.
+
+        :param keys: An iterable of (type, case_from) tuples.
+        :return: A dict of (type, case_from) to a list of cases. The cases are shared, and must not be modified.
+        """
+        loop = asyncio.get_event_loop()
+        keys = list(set(keys))
+        futures = []
+
+        for key in keys:
+            future = self.pending.get(key)
+            if future is None:
+                future = loop.create_future()
+                self.pending[key] = future
+            futures.append(future)
+
+        self.lookups += len(keys)
+
+        if not self.query_running:
+            self.query_running = True
+            loop.call_soon(self._flush)
+
+        # The futures are shared with other requests, so a cancelled request must not cancel them
+        results = await asyncio.gather(*[asyncio.shield(future) for future in futures])
+
+        return dict((key, result) for key, result in zip(keys, results) if len(result) > 0)
+
+    def _flush(self):
+        pending, self.pending = self.pending, {}
+        asyncio.ensure_future(self._query(pending))
+
+    async def _query(self, pending):
+        self.queries += 1
+
+        try:
+            result = await self._run_in_db_thread(self.db_get_to_cases_by_keys, list(pending.keys()))
+        except Exception as e:
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for key, future in pending.items():
+                if not future.done():
+                    future.set_result(result.get(key, []))
+        finally:
+            # Keys requested while we were querying are fetched together in the next query
+            if len(self.pending) > 0:
+                self._flush()
+            else:
+                self.query_running = False
+
+    def db_get_to_cases_by_keys(self, keys):
+        return self.db.get_to_cases_by_keys(keys)
+
+    async def _get_all_to_cases(self, cases):
+        to_cases = await self.get_to_cases_by_keys((case.type, case.case_from) for case in cases)
+
+        return DbHandler.collect_to_cases(cases, to_cases)
+
+    async def tag_text(self, text, timeout=None, tagger_config=None):
+        """
+        Tags a text, the same way CaseTagger.tag_text does.
+
+        If the request times out or is cancelled the text may be partially tagged.
+
+        :param text:
+        :param timeout: The timeout of this request in seconds, defaults to the timeout of the tagger.
+        :param tagger_config: The TaggerConfig to tag with, defaults to the current config.
+        :return:
+        """
+        if not isinstance(text, Text):
+            raise Exception("Invalid argument to tag_text, expected typecraft_python.models.text.Text object")
+
+        if timeout is None:
+            timeout = self.timeout
+
+        if tagger_config is None:
+            tagger_config = get_tagger_config()
+
+        if timeout is None:
+            await self._tag_text(text, tagger_config)
+        else:
+            await asyncio.wait_for(self._tag_text(text, tagger_config), timeout)
+
+    async def _tag_text(self, text, tagger_config):
+        loop = asyncio.get_event_loop()
+
+        for i in range(tagger_config.number_of_passes):
+            for phrase in text.phrases:
+                for word in phrase.words:
+                    if tagger_config.tag_pos:
+                        word_cases = await loop.run_in_executor(self.executor, WordCases, word, phrase, False, None,
+                                                                tagger_config)
+                        word_cases = await self._get_all_to_cases(word_cases)
+
+                        word.pos = word_cases.merge(tagger_config)
+
+                    if not tagger_config.tag_gloss:
+                        continue
+
+                    for morpheme in word.morphemes:
+                        morpheme_cases = await loop.run_in_executor(self.executor, MorphemeCases,
+                                                                    morpheme, word, phrase, False, None, tagger_config)
+                        morpheme_cases = await self._get_all_to_cases(morpheme_cases)
+
+                        morpheme.glosses = morpheme_cases.merge(tagger_config).split(".")
+
+    async def close(self):
+        """
+        Closes the database connection and shuts down the executors.
+
+        :return:
+        """
+        if self.db is not None:
+            await self._run_in_db_thread(self.db.close)
+            self.db = None
+
+        self.executor.shutdown()
+        self.db_executor.shutdown()
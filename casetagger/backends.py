@@ -0,0 +1,270 @@
+from casetagger.config import BASE_DIR
+from casetagger.models import Case, CaseFromCounter
+from casetagger.packed import PackedModel
+
+
+"""
+The maximum number of case_from values we bind in a single IN-clause.
+"""
+MAX_KEYS_PER_QUERY = 500
+
+"""
+Flag of the user_version of a sqlite db, set when rare cases were removed from it, see DbHandler.is_complete.
+"""
+DB_FLAG_INCOMPLETE = 1
+
+
+def create_packed_path(language):
+    return BASE_DIR + '/db/' + language + '_db.ctpk'
+
+
+def select_by_keys(conn, query, keys):
+    """
+    Runs a query for many (type, case_from) keys, grouping the keys by type and binding
+    the case_from values in chunks.
+
+    :param conn: A sqlite connection.
+    :param query: A query with a placeholder for the type and a '%s' for the case_from placeholders.
+    :param keys: An iterable of (type, case_from) tuples.
+    :return: A generator of the resulting rows.
+    """
+    froms_by_type = {}
+    for case_type, case_from in keys:
+        froms_by_type.setdefault(case_type, []).append(case_from)
+
+    for case_type, case_froms in froms_by_type.items():
+        for i in range(0, len(case_froms), MAX_KEYS_PER_QUERY):
+            chunk = case_froms[i:i + MAX_KEYS_PER_QUERY]
+            for row in conn.execute(query % ",".join("?" * len(chunk)), [case_type] + chunk):
+                yield row
+
+
+class StorageBackend(object):
+    """
+    Interface of the storage backends a DbHandler reads cases from.
+    """
+
+    """
+    Whether the backend can be written to.
+    """
+    read_only = False
+
+    def get_cases_by_from(self, case_type, case_from):
+        """
+        Fetches all cases matching a type and case_from.
+
+        :param case_type:
+        :param case_from:
+        :return: A list of Case objects.
+        """
+        raise NotImplementedError
+
+    def get_case_counter(self, case_type, case_from):
+        """
+        Fetches the from-counter of a type and case_from.
+
+        :param case_type:
+        :param case_from:
+        :return: A CaseFromCounter, or None.
+        """
+        raise NotImplementedError
+
+    def get_cases_by_from_many(self, keys):
+        """
+        Fetches all cases matching any of a set of (type, case_from) keys.
+
+        :param keys: An iterable of (type, case_from) tuples.
+        :return: A dict of (type, case_from) to a list of Case objects, holding only the keys with cases.
+        """
+        result = {}
+        for case_type, case_from in keys:
+            cases = self.get_cases_by_from(case_type, case_from)
+            if len(cases) > 0:
+                result[(case_type, case_from)] = cases
+        return result
+
+    def get_case_counters_many(self, keys):
+        """
+        Fetches the from-counters of a set of (type, case_from) keys.
+
+        :param keys: An iterable of (type, case_from) tuples.
+        :return: A dict of (type, case_from) to a CaseFromCounter, holding only the keys with a counter.
+        """
+        result = {}
+        for case_type, case_from in keys:
+            case_counter = self.get_case_counter(case_type, case_from)
+            if case_counter is not None:
+                result[(case_type, case_from)] = case_counter
+        return result
+
+    def bulk_insert(self, cases, case_counters, cursor=None):
+        """
+        Inserts cases and from-counters, adding their occurrences to any existing ones.
+
+        :param cases: An iterable of Case objects.
+        :param case_counters: An iterable of CaseFromCounter objects.
+        :param cursor: An optional cursor of the transaction to insert in.
+        :return:
+        """
+        raise NotImplementedError
+
+    def iter_cases(self):
+        """
+        Iterates all cases.
+
+        :return: An iterable of Case objects.
+        """
+        raise NotImplementedError
+
+    def iter_case_counters(self):
+        """
+        Iterates all from-counters.
+
+        :return: An iterable of CaseFromCounter objects.
+        """
+        raise NotImplementedError
+
+    def iter_case_rows(self):
+        """
+        Iterates all cases of the (type, case_from) keys with a from-counter, with the occurrences of their
+        from-counters, as plain tuples, which is much cheaper than creating Case objects.
+
+        :return: An iterable of (type, case_from, case_to, occurrences, from-counter occurrences).
+        """
+        raise NotImplementedError
+
+    def is_complete(self):
+        """
+        Returns whether the backend holds every key training generated, see DbHandler.is_complete.
+
+        :return:
+        """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class SqliteBackend(StorageBackend):
+    """
+    Backend storing the cases in a sqlite database.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def get_cases_by_from(self, case_type, case_from):
+        res = self.conn.execute('''
+            SELECT type, case_from, case_to, occurrences FROM cases WHERE type=? AND case_from=?''',
+                                (case_type, case_from)).fetchall()
+
+        return [Case(row[0], row[1], row[2], row[3]) for row in res]
+
+    def get_case_counter(self, case_type, case_from):
+        row = self.conn.execute('''
+            SELECT type, case_from, occurrences FROM cases_from_counter WHERE type=? AND case_from=?''',
+                                (case_type, case_from)).fetchone()
+
+        if row is None:
+            return None
+
+        return CaseFromCounter(row[0], row[1], row[2])
+
+    def get_cases_by_from_many(self, keys):
+        result = {}
+        for row in select_by_keys(self.conn, '''
+                SELECT type, case_from, case_to, occurrences FROM cases WHERE type=? AND case_from IN (%s)''', keys):
+            result.setdefault((row[0], row[1]), []).append(Case(row[0], row[1], row[2], row[3]))
+        return result
+
+    def get_case_counters_many(self, keys):
+        result = {}
+        for row in select_by_keys(self.conn, '''
+                SELECT type, case_from, occurrences FROM cases_from_counter WHERE type=? AND case_from IN (%s)''',
+                                  keys):
+            result[(row[0], row[1])] = CaseFromCounter(row[0], row[1], row[2])
+        return result
+
+    def bulk_insert(self, cases, case_counters, cursor=None):
+        should_commit = cursor is None
+
+        if cursor is None:
+            cursor = self.conn.cursor()
+
+        for case in cases:
+            cursor.execute('''
+                INSERT OR IGNORE INTO cases(type, case_from, case_to, occurrences) VALUES (?,?,?,?)''',
+                           (case.type, case.case_from, case.case_to, 0))
+            cursor.execute('''
+                UPDATE cases SET occurrences = occurrences + ? WHERE type=? AND case_from=? AND case_to=?''',
+                           (case.occurrences, case.type, case.case_from, case.case_to))
+
+        for case_counter in case_counters:
+            cursor.execute('''
+                INSERT OR IGNORE INTO cases_from_counter(type, case_from, occurrences) VALUES (?,?,?)''',
+                           (case_counter.type, case_counter.case_from, 0))
+            cursor.execute('''
+                UPDATE cases_from_counter SET occurrences = occurrences + ? WHERE type=? AND case_from=?''',
+                           (case_counter.occurrences, case_counter.type, case_counter.case_from))
+
+        if should_commit:
+            self.conn.commit()
+
+    def iter_cases(self):
+        return (Case(row[0], row[1], row[2], row[3]) for row in self.conn.execute('''
+            SELECT type, case_from, case_to, occurrences FROM cases'''))
+
+    def iter_case_counters(self):
+        return (CaseFromCounter(row[0], row[1], row[2]) for row in self.conn.execute('''
+            SELECT type, case_from, occurrences FROM cases_from_counter'''))
+
+    def iter_case_rows(self):
+        # Scanning both tables is cheaper than joining them
+        from_occurrences = dict(((row[0], row[1]), row[2]) for row in self.conn.execute('''
+            SELECT type, case_from, occurrences FROM cases_from_counter'''))
+
+        for case_type, case_from, case_to, occurrences in self.conn.execute('''
+                SELECT type, case_from, case_to, occurrences FROM cases'''):
+            from_count = from_occurrences.get((case_type, case_from))
+            if from_count is not None:
+                yield case_type, case_from, case_to, occurrences, from_count
+
+    def is_complete(self):
+        return not self.conn.execute("PRAGMA user_version").fetchone()[0] & DB_FLAG_INCOMPLETE
+
+
+class MmapBackend(StorageBackend):
+    """
+    Read-only backend over a memory-mapped packed model.
+
+    As the model is mapped read-only, all processes using the same model share one physical copy of it.
+    """
+
+    read_only = True
+
+    def __init__(self, path):
+        self.model = PackedModel(path)
+
+    def get_cases_by_from(self, case_type, case_from):
+        return self.model.get_cases_by_from(case_type, case_from)
+
+    def get_case_counter(self, case_type, case_from):
+        return self.model.get_case_counter(case_type, case_from)
+
+    def bulk_insert(self, cases, case_counters, cursor=None):
+        raise Exception("Can not insert into the read-only mmap backend")
+
+    def iter_cases(self):
+        return self.model.get_all_cases()
+
+    def iter_case_counters(self):
+        return self.model.get_all_case_counters()
+
+    def iter_case_rows(self):
+        return self.model.get_all_case_rows()
+
+    def is_complete(self):
+        return self.model.complete
+
+    def close(self):
+        self.model.close()
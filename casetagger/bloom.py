@@ -0,0 +1,126 @@
+import hashlib
+import math
+import os
+import struct
+
+"""
+Magic bytes and version written at the start of every persisted bloom filter.
+"""
+BLOOM_MAGIC = b'CTBF'
+BLOOM_VERSION = 1
+BLOOM_HEADER = struct.Struct('>4sBQI')
+
+
+def create_bloom_key(case_type, case_from):
+    """
+    Creates the key we store in the bloom filter for a (type, case_from) pair.
+
+    :param case_type: The type of the case.
+    :param case_from: The from-part of the case.
+    :return: A byte-string.
+    """
+    if case_from is None:
+        case_from = u""
+
+    return (u"%d\x00%s" % (case_type, case_from)).encode('utf8')
+
+
+class BloomFilter(object):
+    """
+    A simple bloom filter over byte-string keys.
+
+    The filter never yields false negatives, so any key it rejects is guaranteed
+    to not exist in the set it was built from.
+    """
+
+    def __init__(self, capacity, error_rate=0.01, num_bits=None, num_hashes=None, bits=None):
+        """
+        Creates an empty bloom filter sized for a given capacity and false-positive rate.
+
+        :param capacity: The expected number of keys.
+        :param error_rate: The wanted false-positive rate, between 0 and 1.
+        :param num_bits: Overrides the computed number of bits.
+        :param num_hashes: Overrides the computed number of hash functions.
+        :param bits: An existing bit-array, used when loading a persisted filter.
+        """
+        if not 0 < error_rate < 1:
+            raise Exception("Invalid error_rate for BloomFilter, expected a value between 0 and 1")
+
+        capacity = max(capacity, 1)
+
+        if num_bits is None:
+            num_bits = int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+            num_bits = max(num_bits, 64)
+        if num_hashes is None:
+            num_hashes = max(int(round(float(num_bits) / capacity * math.log(2))), 1)
+
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        self.bits = bits if bits is not None else bytearray((self.num_bits + 7) // 8)
+
+    def _indices(self, key):
+        """
+        Yields the bit-indices of a key, using double hashing over a single md5 digest.
+
+        :param key: A byte-string.
+        :return: Generator of indices.
+        """
+        h1, h2 = struct.unpack('<QQ', hashlib.md5(key).digest())
+
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, key):
+        """
+        Adds a key to the filter.
+
+        :param key: A byte-string.
+        :return: void
+        """
+        for index in self._indices(key):
+            self.bits[index >> 3] |= 1 << (index & 7)
+
+    def __contains__(self, key):
+        """
+        Checks whether a key may be in the filter.
+
+        :param key: A byte-string.
+        :return: False if the key is definitely not in the filter, True otherwise.
+        """
+        for index in self._indices(key):
+            if not self.bits[index >> 3] & (1 << (index & 7)):
+                return False
+        return True
+
+    def save(self, path):
+        """
+        Persists the filter to a file.
+
+        :param path: The path of the file.
+        :return: void
+        """
+        with open(path, 'wb') as bloom_file:
+            bloom_file.write(BLOOM_HEADER.pack(BLOOM_MAGIC, BLOOM_VERSION, self.num_bits, self.num_hashes))
+            bloom_file.write(bytes(self.bits))
+
+    @staticmethod
+    def load(path):
+        """
+        Loads a filter persisted with BloomFilter.save.
+
+        :param path: The path of the file.
+        :return: A BloomFilter, or None if the file does not exist.
+        """
+        if not os.path.isfile(path):
+            return None
+
+        with open(path, 'rb') as bloom_file:
+            header = bloom_file.read(BLOOM_HEADER.size)
+            magic, version, num_bits, num_hashes = BLOOM_HEADER.unpack(header)
+
+            if magic != BLOOM_MAGIC or version != BLOOM_VERSION:
+                raise Exception("Invalid bloom filter file " + path)
+
+            bits = bytearray(bloom_file.read())
+
+        return BloomFilter(1, num_bits=num_bits, num_hashes=num_hashes, bits=bits)
@@ -0,0 +1,81 @@
+import time
+
+
+class TagBudget(object):
+    """
+    Bounds the time and work spent on tagging a text, see CaseTagger.tag_text.
+
+    The work is counted in the cases created for the tokens, which is what grows superlinearly with long
+    phrases and words. The budget is checked before every token is refined, so it is exceeded by at most
+    the cost of one token.
+    """
+
+    def __init__(self, seconds=None, max_cases=None):
+        """
+        Creates the budget. A budget without limits lets all refinement complete.
+
+        :param seconds: The maximum number of seconds to tag a text for.
+        :param max_cases: The maximum number of cases to create for a text.
+        """
+        if seconds is not None and seconds < 0:
+            raise Exception("Invalid time budget %s, must not be negative" % seconds)
+
+        if max_cases is not None and max_cases < 0:
+            raise Exception("Invalid case budget %s, must not be negative" % max_cases)
+
+        self.seconds = seconds
+        self.max_cases = max_cases
+        self.start()
+
+    def start(self):
+        """
+        Starts spending the budget on a new text.
+
+        :return:
+        """
+        self.start_time = time.time()
+        self.cases = 0
+        self.tokens = 0
+        self.refinements = 0
+        self.refined_tokens = 0
+
+    def spend(self, cases):
+        """
+        Records the cases created for a token.
+
+        :param cases:
+        :return:
+        """
+        self.cases += cases
+
+    def get_elapsed(self):
+        return time.time() - self.start_time
+
+    def is_exhausted(self):
+        """
+        Returns whether the time or work of the budget is spent.
+
+        :return:
+        """
+        if self.max_cases is not None and self.cases >= self.max_cases:
+            return True
+
+        return self.seconds is not None and self.get_elapsed() >= self.seconds
+
+    def get_report(self):
+        """
+        Returns how much of the refinement of the text was completed.
+
+        The tokens are the words and morphemes decided in the cheap pass, and the refinements are the tokens
+        to refine, one for every token in every pass.
+
+        :return: A dict.
+        """
+        return {
+            'tokens': self.tokens,
+            'refinements': self.refinements,
+            'refined': self.refined_tokens,
+            'completed': float(self.refined_tokens) / self.refinements if self.refinements > 0 else 1.0,
+            'cases': self.cases,
+            'elapsed': self.get_elapsed()
+        }
@@ -0,0 +1,414 @@
+import heapq
+import itertools
+import os
+import sqlite3
+import tempfile
+import time
+from collections import OrderedDict
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+from casetagger.config import config, get_tagger_config
+from casetagger.db import DbHandler, DB_TABLES, DB_INDEXES, create_db_path, create_bloom_filter_path
+from casetagger.memo import get_phrase_key
+from casetagger.tagger import CaseTagger
+
+
+def get_case_sort_key(key):
+    """
+    Returns the sort key of a (type, case_from, case_to) key, ordering the keys like the unique index of the
+    cases table does, with NULLs first.
+
+    :param key:
+    :return:
+    """
+    case_type, case_from, case_to = key
+
+    return case_type, case_from is not None, case_from or "", case_to is not None, case_to or ""
+
+
+"""
+The number of records written to a run, or to the db, at a time.
+"""
+CHUNK_SIZE = 10000
+
+
+def write_run(sorted_counts):
+    """
+    Writes sorted case counts to a temporary file, which is removed when it is closed.
+
+    :param sorted_counts: An iterable of ((type, case_from, case_to), occurrences), sorted by get_case_sort_key.
+    :return: The file, positioned at its start.
+    """
+    run = tempfile.TemporaryFile()
+
+    sorted_counts = iter(sorted_counts)
+    while True:
+        chunk = list(itertools.islice(sorted_counts, CHUNK_SIZE))
+        if len(chunk) == 0:
+            break
+        pickle.dump(chunk, run, pickle.HIGHEST_PROTOCOL)
+
+    run.seek(0)
+    return run
+
+
+def read_run(run):
+    """
+    Reads the case counts of a run written by write_run, a chunk at a time.
+
+    :param run:
+    :return: A generator of ((type, case_from, case_to), occurrences).
+    """
+    while True:
+        try:
+            chunk = pickle.load(run)
+        except EOFError:
+            return
+
+        for item in chunk:
+            yield item
+
+
+def merge_sorted_counts(runs):
+    """
+    Merges sorted runs of case counts, summing the occurrences of the keys found in several runs.
+
+    :param runs: Iterables of ((type, case_from, case_to), occurrences), sorted by get_case_sort_key.
+    :return: A generator of ((type, case_from, case_to), occurrences), sorted by get_case_sort_key.
+    """
+    decorated_runs = [((get_case_sort_key(key), key, occurrences) for key, occurrences in run) for run in runs]
+
+    current_key = None
+    current_occurrences = 0
+
+    for _, key, occurrences in heapq.merge(*decorated_runs):
+        if current_key is not None and key == current_key:
+            current_occurrences += occurrences
+            continue
+
+        if current_key is not None:
+            yield current_key, current_occurrences
+
+        current_key = key
+        current_occurrences = occurrences
+
+    if current_key is not None:
+        yield current_key, current_occurrences
+
+
+def load_sorted_counts(conn, sorted_counts):
+    """
+    Loads the cases and from-counters of sorted case counts into empty tables.
+
+    The counts are sorted by key, so the rows are appended to the unique indexes in order, and the counts of
+    the cases of a from-counter come together, so the from-counters are summed while the cases are loaded.
+    The rows are written a chunk at a time, so any number of counts can be loaded.
+
+    Incremental training never matches keys holding NULLs, as NULLs are not equal in SQL, and leaves their
+    rows with 0 occurrences. Such rows are loaded with 0 occurrences as well, so the db is the same.
+
+    :param conn: The connection to the db to load.
+    :param sorted_counts: An iterable of ((type, case_from, case_to), occurrences), sorted by get_case_sort_key.
+    :return: The number of cases and from-counters loaded.
+    """
+    cursor = conn.cursor()
+    case_rows = []
+    counter_rows = []
+    case_count = 0
+    counter_count = 0
+
+    def write_rows():
+        cursor.executemany('''
+            INSERT INTO cases(type, case_from, case_to, occurrences) VALUES (?,?,?,?)''', case_rows)
+        cursor.executemany('''
+            INSERT INTO cases_from_counter(type, case_from, occurrences) VALUES (?,?,?)''', counter_rows)
+        del case_rows[:]
+        del counter_rows[:]
+
+    counter_key = None
+    counter_occurrences = 0
+
+    for (case_type, case_from, case_to), occurrences in sorted_counts:
+        if (case_type, case_from) != counter_key:
+            if counter_key is not None:
+                counter_rows.append(counter_key + (counter_occurrences if counter_key[1] is not None else 0,))
+                counter_count += 1
+            counter_key = (case_type, case_from)
+            counter_occurrences = 0
+
+        counter_occurrences += occurrences
+
+        case_rows.append((case_type, case_from, case_to,
+                          occurrences if case_from is not None and case_to is not None else 0))
+        case_count += 1
+
+        if len(case_rows) >= CHUNK_SIZE:
+            write_rows()
+
+    if counter_key is not None:
+        counter_rows.append(counter_key + (counter_occurrences if counter_key[1] is not None else 0,))
+        counter_count += 1
+
+    write_rows()
+
+    return case_count, counter_count
+
+
+class ModelBuilder(object):
+    """
+    Builds the db of a language from scratch, much faster than training it incrementally.
+
+    The counts of all cases are aggregated in memory first. They are then loaded into a new db file in key
+    order, with only the unique indexes of the tables, which are appended to in order. The secondary indexes
+    are created after the load, the statistics of the query planner are gathered with ANALYZE, and the new
+    file replaces the db of the language.
+
+    If the number of keys in memory is capped, the counts are spilled to a temporary file as a sorted run
+    whenever the cap is reached, and the runs are merged while the db is loaded, so the memory use does not
+    grow with the corpus as long as the texts are added as they are parsed. The cap covers the keys of the
+    distinct phrases waiting to be counted as well, so duplicate phrases are only collapsed within that
+    window. The counts can also be merged into an existing db, see train.
+
+    The built db holds the same cases and from-counters as training the same texts with train_texts.
+    """
+
+    def __init__(self, language, tagger_config=None, max_keys=None):
+        """
+        Creates the builder.
+
+        :param language: The language to build the db of.
+        :param tagger_config: The TaggerConfig to create the cases with, defaults to the current config.
+        :param max_keys: The maximum number of case and phrase keys in memory, defaults to
+            config['build_max_keys']. None counts all keys in memory.
+        """
+        if tagger_config is None:
+            tagger_config = get_tagger_config()
+
+        if max_keys is None:
+            max_keys = config['build_max_keys']
+
+        if max_keys is not None and max_keys < 1:
+            raise Exception("Invalid key cap %d, must be at least 1" % max_keys)
+
+        self.language = language
+        self.tagger_config = tagger_config
+        self.max_keys = max_keys
+        self.counts = {}
+        # The distinct phrases added but not yet counted, with their number of copies
+        self.phrases = OrderedDict()
+        # The temporary files of the spilled runs
+        self.runs = []
+
+        # Stats
+        self.timings = dict((step, 0.0) for step in ['aggregate', 'sort', 'load', 'index', 'analyze', 'finalize'])
+        self.cases = 0
+        self.case_counters = 0
+        self.spilled_runs = 0
+        self.spilled_keys = 0
+
+    def add_texts(self, texts):
+        """
+        Adds the phrases of texts to be counted. Duplicate phrases are collapsed, like in train_texts, but
+        with a key cap only while they wait to be counted.
+
+        :param texts: An iterable of texts, which is consumed one text at a time.
+        :return:
+        """
+        start = time.time()
+
+        for text in texts:
+            for phrase in text.phrases:
+                key = get_phrase_key(phrase)
+
+                group = self.phrases.get(key)
+                if group is not None:
+                    group[1] += 1
+                    continue
+
+                self.phrases[key] = [phrase, 1]
+
+                if self.max_keys is not None and len(self.phrases) + len(self.counts) >= self.max_keys:
+                    self.count_phrases()
+
+        self.timings['aggregate'] += time.time() - start
+
+    def count_phrases(self):
+        """
+        Counts the cases of the phrases waiting to be counted, spilling the counts whenever the cap is reached.
+
+        :return:
+        """
+        start = time.time()
+
+        for phrase, count in self.phrases.values():
+            CaseTagger.count_phrase_cases(phrase, self.counts, self.tagger_config, count)
+
+            if self.max_keys is not None and len(self.counts) >= self.max_keys:
+                self.spill()
+
+        self.phrases = OrderedDict()
+        self.timings['aggregate'] += time.time() - start
+
+    def spill(self):
+        """
+        Writes the counts in memory to a sorted run, and clears them.
+
+        :return:
+        """
+        self.spilled_runs += 1
+        self.spilled_keys += len(self.counts)
+        self.runs.append(write_run(self.sort_counts()))
+        self.counts = {}
+
+    def sort_counts(self):
+        """
+        Returns the counts in memory, sorted by get_case_sort_key.
+
+        :return: A list of ((type, case_from, case_to), occurrences).
+        """
+        return sorted(self.counts.items(), key=lambda item: get_case_sort_key(item[0]))
+
+    def get_sorted_counts(self):
+        """
+        Returns all counted cases, merging the spilled runs with the counts in memory. The phrases waiting to
+        be counted must be counted first, see count_phrases.
+
+        :return: An iterable of ((type, case_from, case_to), occurrences), sorted by get_case_sort_key.
+        """
+        sorted_counts = self.sort_counts()
+
+        if len(self.runs) == 0:
+            return sorted_counts
+
+        return merge_sorted_counts([read_run(run) for run in self.runs] + [sorted_counts])
+
+    def close(self):
+        """
+        Removes the spilled runs.
+
+        :return:
+        """
+        for run in self.runs:
+            run.close()
+
+        self.runs = []
+
+    def build(self, replace=False):
+        """
+        Builds the db from the counted cases, and finalizes it like finalize_training.
+
+        :param replace: Whether to replace an existing db of the language.
+        :return:
+        """
+        db_path = create_db_path(self.language)
+
+        if os.path.isfile(db_path) and not replace:
+            raise Exception("A db of '%s' already exists, pass replace to build it anew" % self.language)
+
+        build_path = db_path + '.build'
+        if os.path.isfile(build_path):
+            os.remove(build_path)
+
+        if not os.path.isdir(os.path.dirname(db_path)):
+            os.makedirs(os.path.dirname(db_path))
+
+        self.count_phrases()
+
+        start = time.time()
+        sorted_counts = self.get_sorted_counts()
+        self.timings['sort'] = time.time() - start
+
+        conn = sqlite3.connect(build_path)
+        # The file is only moved in place once it is complete, so it needs no journal
+        conn.execute("PRAGMA journal_mode=OFF")
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.executescript(DB_TABLES)
+
+        start = time.time()
+        self.cases, self.case_counters = load_sorted_counts(conn, sorted_counts)
+        conn.commit()
+        self.close()
+        self.timings['load'] = time.time() - start
+
+        start = time.time()
+        conn.executescript(DB_INDEXES)
+        conn.commit()
+        self.timings['index'] = time.time() - start
+
+        start = time.time()
+        conn.execute("ANALYZE")
+        conn.commit()
+        conn.close()
+        self.timings['analyze'] = time.time() - start
+
+        for path in [db_path, db_path + '-wal', db_path + '-shm', create_bloom_filter_path(self.language)]:
+            if os.path.isfile(path):
+                os.remove(path)
+
+        os.rename(build_path, db_path)
+
+        start = time.time()
+        db = DbHandler(self.language, False, 'sqlite')
+
+        if config['use_bloom_filter']:
+            db.build_bloom_filter()
+
+        if config['use_top_cases']:
+            db.refresh_top_cases()
+
+        db.close()
+        self.timings['finalize'] = time.time() - start
+
+    def train(self, db, batch_size=None):
+        """
+        Merges the counted cases into an existing db, with the same result as training the texts with
+        train_texts. The cases are applied in key order, a batch of them per transaction.
+
+        :param db: The DbHandler to train.
+        :param batch_size: The number of cases per transaction, defaults to CHUNK_SIZE.
+        :return:
+        """
+        db.check_writable()
+
+        if batch_size is None:
+            batch_size = CHUNK_SIZE
+
+        self.count_phrases()
+
+        start = time.time()
+        sorted_counts = iter(self.get_sorted_counts())
+        self.timings['sort'] = time.time() - start
+
+        start = time.time()
+        while True:
+            chunk = list(itertools.islice(sorted_counts, batch_size))
+            if len(chunk) == 0:
+                break
+
+            cursor = db.conn.cursor()
+            db.apply_case_deltas(OrderedDict(chunk), cursor)
+            db.conn.commit()
+            self.cases += len(chunk)
+
+        self.close()
+        self.timings['load'] = time.time() - start
+
+    def get_stats(self):
+        """
+        Returns the number of cases and from-counters built, the runs and keys spilled, and the time of every
+        step.
+
+        :return: A dict.
+        """
+        stats = dict(self.timings)
+        stats['total'] = sum(self.timings.values())
+        stats['cases'] = self.cases
+        stats['case_counters'] = self.case_counters
+        stats['spilled_runs'] = self.spilled_runs
+        stats['spilled_keys'] = self.spilled_keys
+
+        return stats
@@ -1,16 +1,13 @@
 # -*- coding: utf-8 -*-
 
-import click
+import os
 
-from casetagger.debug import TestResult
-from casetagger.tagger import CaseTagger
+import click
 
 from casetagger.config import config, VERSION
 import casetagger.logger as logger
-from casetagger.util import separate_texts_by_languages
-from typecraft_python.models import Text, Phrase, Word
 
-from typecraft_python.parsing.parser import Parser, TypecraftParseException
+# Everything else is imported by the commands needing it, so short invocations like --version start fast
 
 
 # Some utility methods
@@ -22,6 +19,9 @@ def input_to_texts(files, input_is_rawtext):
     :param input_is_rawtext:
     :return:
     """
+    from casetagger.parse_cache import parse_cached
+    from typecraft_python.parsing.parser import Parser, TypecraftParseException
+
     parsed_texts = []
     for file in files:
         file_contents = read_file(file)
@@ -30,8 +30,11 @@ def input_to_texts(files, input_is_rawtext):
             parsed_texts.append(file_contents)
         else:  # We interpret as typecraft-texts
             try:
-                parsed_texts.extend(Parser.parse(file_contents))
-            except TypecraftParseException, e:
+                if config['use_parse_cache'] and os.path.isfile(file.name):
+                    parsed_texts.extend(parse_cached(file_contents, file.name, Parser.parse))
+                else:
+                    parsed_texts.extend(Parser.parse(file_contents))
+            except TypecraftParseException as e:
                 logger.critical("Invalid format in input-file: " + str(e))
                 exit(1)
 
@@ -41,6 +44,65 @@ def input_to_texts(files, input_is_rawtext):
     return parsed_texts
 
 
+def input_to_journaled_texts(files):
+    """
+    Parses typecraft files like input_to_texts, and derives a stable id for every text for the journal of
+    trained texts, from the absolute path of its file and its position in the file. Titles are not used, as
+    texts may have no title or share one.
+
+    :param files:
+    :return: A list of (text_id, text) tuples.
+    """
+    journaled_texts = []
+    for file in files:
+        path = os.path.abspath(file.name)
+
+        for index, text in enumerate(input_to_texts([file], False)):
+            journaled_texts.append(("%s#%d" % (path, index), text))
+
+    return journaled_texts
+
+
+def input_to_builders(files, language, max_keys):
+    """
+    Parses typecraft files one at a time, and adds their texts to a ModelBuilder per language as they are parsed,
+    so the texts of only one file are held in memory at a time.
+
+    :param files:
+    :param language: The language to count all texts for, or None to count the texts for their own languages.
+    :param max_keys: The maximum number of keys every builder holds in memory, see ModelBuilder.
+    :return: A dict of language to ModelBuilder.
+    """
+    from casetagger.build import ModelBuilder
+
+    builders = {}
+    for file in files:
+        for text in input_to_texts([file], False):
+            text_language = language if language is not None else text.language
+
+            if text_language not in builders:
+                builders[text_language] = ModelBuilder(text_language, max_keys=max_keys)
+
+            builders[text_language].add_texts([text])
+
+    return builders
+
+
+def separate_journaled_texts_by_languages(journaled_texts):
+    """
+    Separates (text_id, text) tuples by the language of the texts, like separate_texts_by_languages.
+
+    :param journaled_texts:
+    :return: A dict of language to a list of (text_id, text) tuples.
+    """
+    separated = {}
+
+    for text_id, text in journaled_texts:
+        separated.setdefault(text.language, []).append((text_id, text))
+
+    return separated
+
+
 def read_file(file):
     """
     Reads a file.
@@ -67,6 +129,8 @@ def convert_raw_text_to_texts(text_content):
     :param text_content:
     :return:
     """
+    from typecraft_python.models import Text, Phrase, Word
+
     text = Text()
 
     for line in text_content:
@@ -83,14 +147,72 @@ def convert_raw_text_to_texts(text_content):
     return text
 
 
+def log_bloom_filter_stats():
+    """
+    Logs how many lookups the bloom filter of the current db has skipped.
+
+    :return:
+    """
+    from casetagger.tagger import CaseTagger
+
+    stats = CaseTagger.db.get_bloom_filter_stats()
+    logger.debug("Bloom filter skipped %d of %d lookups" % (stats['skipped'], stats['lookups']))
+
+
+def log_spill_stats(stats):
+    """
+    Logs the runs spilled by a ModelBuilder.
+
+    :param stats: The stats of the builder.
+    :return:
+    """
+    if stats['spilled_runs'] > 0:
+        logger.debug("Spilled %d keys in %d sorted runs" % (stats['spilled_keys'], stats['spilled_runs']))
+
+
+def log_phrase_memo_stats():
+    """
+    Logs how many phrases the phrase memo has tagged, if it is used.
+
+    :return:
+    """
+    from casetagger.tagger import CaseTagger
+
+    if CaseTagger.phrase_memo is None:
+        return
+
+    stats = CaseTagger.phrase_memo.get_stats()
+    logger.debug("Phrase memo hit %d of %d phrases (%.1f %%), %d evictions, %d invalidations"
+                 % (stats['hits'], stats['hits'] + stats['misses'], stats['hit_rate'] * 100,
+                    stats['evictions'], stats['invalidations']))
+
+
 @click.group()
 @click.option('--debug', is_flag=True, default=False)
 @click.option('-v', '--verbose', is_flag=True, default=False)
 @click.option('--memory', is_flag=True, default=False)
+@click.option('--backend', type=click.Choice(['sqlite', 'mmap']), default=None,
+              help="Storage backend to read the model from. The mmap backend reads an exported model.")
+@click.option('--parse-cache', is_flag=True, default=False,
+              help="Cache parsed input files next to them, and reuse the cache while the files are unchanged.")
+@click.option('--phrase-memo', is_flag=True, default=False,
+              help="Tag repeated phrases only once, reusing the tags of earlier identical phrases.")
+@click.option('--tag-level', type=click.Choice(['pos', 'gloss', 'all']), default=None,
+              help="Only tag and test the POS-tags or the glosses. Defaults to the tag_level of the config.")
 @click.version_option(version=VERSION)
-def main(debug, verbose, memory):
+def main(debug, verbose, memory, backend, parse_cache, phrase_memo, tag_level):
+    logger.setup_output()
+
     config['verbosity_level'] = 2 if debug else 1 if verbose else 0
     config['use_memory_db'] = memory
+    config['use_parse_cache'] = parse_cache
+    config['use_phrase_memo'] = phrase_memo
+
+    if backend is not None:
+        config['db_backend'] = backend
+
+    if tag_level is not None:
+        config['tag_level'] = tag_level
 
 
 @main.command()
@@ -100,6 +222,10 @@ def main(debug, verbose, memory):
 @click.option('--print-test-details', is_flag=True, default=False)
 @click.argument('files', nargs=-1, type=click.File('rb'))
 def test(language, raw_text, output_raw_text, print_test_details, files):
+    from casetagger.debug import TestResult
+    from casetagger.tagger import CaseTagger
+    from casetagger.util import separate_texts_by_languages
+
     if len(files) == 0:
         logger.critical("No input files")
         exit(1)
@@ -118,6 +244,8 @@ def test(language, raw_text, output_raw_text, print_test_details, files):
 
         for text in parsed_texts:
             test_results.append(CaseTagger.test_text(text))
+
+        log_bloom_filter_stats()
     else:
         separated = separate_texts_by_languages(parsed_texts)
 
@@ -127,6 +255,10 @@ def test(language, raw_text, output_raw_text, print_test_details, files):
             for text in texts:
                 test_results.append(CaseTagger.test_text(text))
 
+            log_bloom_filter_stats()
+
+    log_phrase_memo_stats()
+
     for result in test_results:
         logger.log(unicode(result))
 
@@ -139,8 +271,23 @@ def test(language, raw_text, output_raw_text, print_test_details, files):
 @click.option('--language', default=None)
 @click.option('--raw-text', is_flag=True, default=False)
 @click.option('--output-raw-text', is_flag=True, default=False)
+@click.option('--batch-size', type=int, default=None,
+              help="Tag this many phrases per bulk lookup, instead of word by word.")
+@click.option('--time-budget', type=float, default=None,
+              help="Only refine the tags of a text for this many seconds, after tagging it from cheap cases.")
+@click.option('--case-budget', type=int, default=None,
+              help="Only refine the tags of a text until this many cases are created.")
+@click.option('--sparse', is_flag=True, default=False,
+              help="Score the batches with sparse matrix products, which requires numpy and scipy. "
+                   "Implies tagging in batches. Building the model takes seconds, so it only pays off when "
+                   "tagging many tokens at once.")
 @click.argument('files', nargs=-1, type=click.File('rb'))
-def tag(language, raw_text, output_raw_text, files):
+def tag(language, raw_text, output_raw_text, batch_size, time_budget, case_budget, sparse, files):
+    from casetagger.budget import TagBudget
+    from casetagger.tagger import CaseTagger
+    from casetagger.util import separate_texts_by_languages
+    from typecraft_python.parsing.parser import Parser
+
     parsed_texts = []
 
     if len(files) == 0:
@@ -150,12 +297,23 @@ def tag(language, raw_text, output_raw_text, files):
     logger.debug("Parsing files")
     parsed_texts = input_to_texts(files, raw_text)
 
+    budget = None
+    if time_budget is not None or case_budget is not None:
+        budget = TagBudget(time_budget, case_budget)
+
+    if sparse:
+        config['use_sparse_scoring'] = True
+        if batch_size is None:
+            batch_size = config['tag_batch_size']
+
     if language is not None:
         CaseTagger.instantiate_db(language)
 
         for text in parsed_texts:
             logger.debug("Tagging text " + text.title)
-            CaseTagger.tag_text(text)
+            tag_text(text, batch_size, budget)
+
+        log_bloom_filter_stats()
     else:
         separated = separate_texts_by_languages(parsed_texts)
 
@@ -163,33 +321,282 @@ def tag(language, raw_text, output_raw_text, files):
             CaseTagger.instantiate_db(language)
 
             for text in texts:
-                CaseTagger.tag_text(text)
+                tag_text(text, batch_size, budget)
+
+            log_bloom_filter_stats()
+
+    log_phrase_memo_stats()
 
     print(Parser.write(parsed_texts).decode("utf8"))
 
 
+def tag_text(text, batch_size, budget=None):
+    """
+    Tags a text, within the budget if one is given, else in batches if a batch size is given.
+
+    :param text:
+    :param batch_size:
+    :param budget: Optional TagBudget.
+    :return:
+    """
+    from casetagger.tagger import CaseTagger
+
+    if budget is not None:
+        report = CaseTagger.tag_text(text, budget=budget)
+        logger.debug("Refined %d of %d tokens (%.1f %%) of %s in %.3f s, %d cases"
+                     % (report['refined'], report['refinements'], report['completed'] * 100, text.title,
+                        report['elapsed'], report['cases']))
+    elif batch_size is None:
+        CaseTagger.tag_text(text)
+    else:
+        CaseTagger.tag_phrases(text.phrases, batch_size)
+
+
 @main.command()
 @click.argument('files', nargs=-1, type=click.File('rb'))
 @click.option('--language', default=None)
-def train(files, language):
+@click.option('--journal', is_flag=True, default=False,
+              help="Record trained texts by file and position, and skip texts that are already trained.")
+@click.option('--batch-size', type=int, default=None,
+              help="The number of phrases written per transaction.")
+@click.option('--train-level', type=click.Choice(['pos', 'gloss', 'all']), default=None,
+              help="Only write the cases needed to tag POS-tags or glosses. Defaults to the train_level of the config.")
+@click.option('--max-keys', type=int, default=None,
+              help="Hold at most this many case and phrase keys in memory, spilling sorted runs to temporary files.")
+def train(files, language, journal, batch_size, train_level, max_keys):
+    from casetagger.tagger import CaseTagger
 
     if len(files) == 0:
         logger.critical("No input files")
         exit(1)
 
-    parsed_texts = input_to_texts(files, False)
+    if journal and max_keys is not None:
+        logger.critical("--max-keys can not be combined with --journal")
+        exit(1)
+
+    if train_level is not None:
+        config['train_level'] = train_level
+
+    if max_keys is not None:
+        for language, builder in input_to_builders(files, language, max_keys).items():
+            CaseTagger.instantiate_db(language)
+            builder.train(CaseTagger.db)
+            log_spill_stats(builder.get_stats())
+            CaseTagger.finalize_training()
+        return
+
+    if journal:
+        journaled_texts = input_to_journaled_texts(files)
+    else:
+        journaled_texts = [(None, text) for text in input_to_texts(files, False)]
 
     if language is not None:
+        separated = {language: journaled_texts}
+    else:
+        separated = separate_journaled_texts_by_languages(journaled_texts)
+
+    for language, language_texts in separated.items():
+        texts = [text for _, text in language_texts]
+        text_ids = [text_id for text_id, _ in language_texts] if journal else None
+
         CaseTagger.instantiate_db(language)
+        train_texts(texts, text_ids, batch_size)
+        CaseTagger.finalize_training()
 
-        for text in parsed_texts:
-            CaseTagger.train(text)
-    else:
-        separated = separate_texts_by_languages(parsed_texts)
 
-        for language, texts in separated.iteritems():
+def find_changed_text_ids(text_ids, texts):
+    """
+    Finds the texts that are in the journal of trained texts of the current db, but have changed since they
+    were trained.
+
+    :param text_ids:
+    :param texts:
+    :return: The ids of the changed texts.
+    """
+    from casetagger.tagger import CaseTagger
+    from casetagger.util import get_text_fingerprint
+
+    changed_text_ids = []
+    for text_id, text in zip(text_ids, texts):
+        trained_fingerprint = CaseTagger.db.get_trained_text_fingerprint(text_id)
+
+        if trained_fingerprint is not None and trained_fingerprint != get_text_fingerprint(text):
+            changed_text_ids.append(text_id)
+
+    return changed_text_ids
+
+
+def train_texts(texts, text_ids, batch_size):
+    """
+    Trains texts, either through a single writer or one by one through the journal of trained texts.
+
+    Texts that have changed since they were journaled are not retrained, as the journal does not hold the
+    trained version to subtract. They are reported, and nothing is trained.
+
+    :param texts:
+    :param text_ids: The ids of the texts in the journal, or None to train without the journal.
+    :param batch_size:
+    :return:
+    """
+    from casetagger.tagger import CaseTagger
+
+    if text_ids is None:
+        CaseTagger.train_texts(texts, batch_size)
+        return
+
+    changed_text_ids = find_changed_text_ids(text_ids, texts)
+
+    if len(changed_text_ids) > 0:
+        for text_id in changed_text_ids:
+            logger.critical("Text " + text_id + " has changed since it was trained")
+
+        logger.critical("Untrain the trained version of these texts with `untrain --journal` first, "
+                        "or replace them with CaseTagger.retrain")
+        exit(1)
+
+    for text_id, text in zip(text_ids, texts):
+        logger.debug("Training from text " + text_id)
+
+        if not CaseTagger.apply_text_delta(None, text, text_id):
+            logger.debug("Text " + text_id + " is already trained")
+
+
+@main.command()
+@click.argument('files', nargs=-1, type=click.File('rb'))
+@click.option('--language', default=None)
+@click.option('--replace', is_flag=True, default=False,
+              help="Replace the existing db of the language, instead of failing.")
+@click.option('--train-level', type=click.Choice(['pos', 'gloss', 'all']), default=None,
+              help="Only write the cases needed to tag POS-tags or glosses. Defaults to the train_level of the config.")
+@click.option('--max-keys', type=int, default=None,
+              help="Hold at most this many case and phrase keys in memory, spilling sorted runs to temporary files.")
+def build(files, language, replace, train_level, max_keys):
+    if len(files) == 0:
+        logger.critical("No input files")
+        exit(1)
+
+    if train_level is not None:
+        config['train_level'] = train_level
+
+    for language, builder in input_to_builders(files, language, max_keys).items():
+        builder.build(replace)
+
+        stats = builder.get_stats()
+        logger.log("Built %s with %d cases and %d from-counters in %.2f s" %
+                   (language, stats['cases'], stats['case_counters'], stats['total']))
+        log_spill_stats(stats)
+        logger.log("Aggregate %.2f s, sort %.2f s, load %.2f s, index %.2f s, analyze %.2f s, finalize %.2f s" %
+                   (stats['aggregate'], stats['sort'], stats['load'], stats['index'], stats['analyze'],
+                    stats['finalize']))
+
+
+@main.command()
+@click.argument('files', nargs=-1, type=click.File('rb'))
+@click.option('--language', default=None)
+@click.option('--journal', is_flag=True, default=False,
+              help="Remove the untrained texts from the journal of trained texts.")
+def untrain(files, language, journal):
+    from casetagger.tagger import CaseTagger
+
+    if len(files) == 0:
+        logger.critical("No input files")
+        exit(1)
+
+    journaled_texts = input_to_journaled_texts(files)
+    separated = separate_journaled_texts_by_languages(journaled_texts)
+
+    if language is not None:
+        separated = {language: journaled_texts}
+
+    if journal:
+        changed_text_ids = []
+        for language, language_texts in separated.items():
             CaseTagger.instantiate_db(language)
+            changed_text_ids.extend(find_changed_text_ids([text_id for text_id, _ in language_texts],
+                                                          [text for _, text in language_texts]))
 
-            for text in texts:
-                logger.debug("Training from text " + text.title)
-                CaseTagger.train(text)
+        if len(changed_text_ids) > 0:
+            for text_id in changed_text_ids:
+                logger.critical("Text " + text_id + " does not match the version it was trained from")
+
+            logger.critical("Untrain the trained version of these texts instead, nothing was untrained")
+            exit(1)
+
+    for language, language_texts in separated.items():
+        CaseTagger.instantiate_db(language)
+
+        for text_id, text in language_texts:
+            logger.debug("Untraining text " + text_id)
+
+            if not CaseTagger.untrain(text, text_id if journal else None):
+                logger.debug("Text " + text_id + " is not trained")
+
+        CaseTagger.finalize_training()
+
+
+@main.command()
+@click.option('--language', required=True)
+@click.option('--min-occurrences', default=2, help="Minimum occurrences of a case to keep it.")
+@click.option('--min-from-occurrences', default=1, help="Minimum occurrences of a from-counter to keep it.")
+@click.option('--type-threshold', multiple=True,
+              help="Minimum occurrences for a single case type, given as TYPE=N. May be repeated.")
+@click.option('--recompute-counters', is_flag=True, default=False,
+              help="Recompute from-counters from the remaining cases instead of keeping them exact.")
+def compact(language, min_occurrences, min_from_occurrences, type_threshold, recompute_counters):
+    from casetagger.db import DbHandler
+
+    type_thresholds = {}
+    for threshold in type_threshold:
+        try:
+            case_type, occurrences = threshold.split("=")
+            type_thresholds[int(case_type)] = int(occurrences)
+        except ValueError:
+            logger.critical("Invalid type threshold '%s', expected TYPE=N" % threshold)
+            exit(1)
+
+    db = DbHandler(language, False, 'sqlite')
+
+    size_before = db.get_size()
+    latency_before = db.measure_lookup_latency()
+
+    removed_cases, removed_counters = db.compact(min_occurrences,
+                                                 min_from_occurrences,
+                                                 type_thresholds,
+                                                 recompute_counters)
+
+    size_after = db.get_size()
+    latency_after = db.measure_lookup_latency()
+
+    logger.log("Removed %d cases and %d from-counters" % (removed_cases, removed_counters))
+    logger.log("Size: %d => %d bytes" % (size_before, size_after))
+    logger.log("Lookup latency: %.1f => %.1f microseconds" % (latency_before * 1e6, latency_after * 1e6))
+
+
+@main.command()
+@click.option('--language', required=True)
+@click.argument('output', type=click.Path(dir_okay=False, writable=True), required=False)
+def export(language, output):
+    from casetagger.backends import create_packed_path
+    from casetagger.db import DbHandler
+    from casetagger.packed import export_db
+
+    if output is None:
+        output = create_packed_path(language)
+
+    db = DbHandler(language, False, 'sqlite')
+    export_db(db, output)
+
+    logger.log("Exported %s to %s" % (language, output))
+
+
+@main.command('import')
+@click.option('--language', required=True)
+@click.argument('input', type=click.Path(exists=True, dir_okay=False))
+def import_(language, input):
+    from casetagger.db import DbHandler
+    from casetagger.packed import import_db
+
+    db = DbHandler(language, False, 'sqlite')
+    import_db(db, input)
+
+    logger.log("Imported %s into %s" % (input, language))
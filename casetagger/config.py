@@ -1,7 +1,7 @@
 # coding: utf-8
+import copy
 import os.path
-import glob
-import json
+import threading
 
 """
 Version of the casetagger
@@ -13,16 +13,298 @@ Base directory.
 """
 BASE_DIR = os.path.dirname(__file__)
 
+
+class Config(dict):
+    """
+    The config, a dict of the defaults that loads the json config files matching a glob pattern the first time
+    it is accessed. Writes load the config first, so the values set override the loaded ones. Loading is
+    guarded by a lock, so threads accessing the config for the first time at once load it only once.
+
+    The version is incremented on every write, so snapshots of the config can tell when they are outdated.
+    Writes to nested values, like config['case_importance']['1'], are not tracked.
+    """
+
+    version = 0
+
+    def __init__(self, defaults=None, json_pattern=None):
+        """
+        Creates the config.
+
+        :param defaults: The default values.
+        :param json_pattern: The glob pattern of the json config files to load, or None to load nothing.
+        """
+        dict.__init__(self, defaults or {})
+        self.json_pattern = json_pattern
+        self.loaded = json_pattern is None
+        self.lock = threading.Lock()
+
+    def load(self):
+        """
+        Loads the json config files over the defaults, unless they are loaded already.
+
+        :return:
+        """
+        if self.loaded:
+            return
+
+        with self.lock:
+            if self.loaded:
+                return
+
+            import glob
+            import json
+
+            values = {}
+            for file_name in sorted(glob.glob(self.json_pattern)):
+                with open(file_name) as json_file:
+                    values.update(json.load(json_file))
+
+            dict.update(self, values)
+            self.version += 1
+            self.loaded = True
+
+    def __getitem__(self, key):
+        self.load()
+        return dict.__getitem__(self, key)
+
+    def __contains__(self, key):
+        self.load()
+        return dict.__contains__(self, key)
+
+    def __iter__(self):
+        self.load()
+        return dict.__iter__(self)
+
+    def __len__(self):
+        self.load()
+        return dict.__len__(self)
+
+    def get(self, key, default=None):
+        self.load()
+        return dict.get(self, key, default)
+
+    def keys(self):
+        self.load()
+        return dict.keys(self)
+
+    def values(self):
+        self.load()
+        return dict.values(self)
+
+    def items(self):
+        self.load()
+        return dict.items(self)
+
+    def copy(self):
+        self.load()
+        return dict(dict.items(self))
+
+    def __setitem__(self, key, value):
+        self.load()
+        dict.__setitem__(self, key, value)
+        self.version += 1
+
+    def __delitem__(self, key):
+        self.load()
+        dict.__delitem__(self, key)
+        self.version += 1
+
+    def update(self, *args, **kwargs):
+        self.load()
+        dict.update(self, *args, **kwargs)
+        self.version += 1
+
+
+class FrozenDict(dict):
+    """
+    A dict that can't be written to, holding the mappings of a TaggerConfig.
+    """
+
+    def _frozen(self, *args, **kwargs):
+        raise Exception("TaggerConfig is frozen, create a new one instead")
+
+    __setitem__ = __delitem__ = update = setdefault = pop = popitem = clear = _frozen
+
+    def __reduce__(self):
+        return FrozenDict, (dict(self),)
+
+
+class TaggerConfig(object):
+    """
+    Frozen, validated snapshot of the config values used to create and merge cases, and of the switches
+    choosing how a tagger tags.
+
+    Everything is read and checked once, when the snapshot is created, and case types are converted to
+    integers up front, so per-token code only does attribute lookups. The mappings are copied into
+    FrozenDicts, so snapshots are independent of the config and of each other, and several configurations
+    can be used side by side.
+    """
+
+    """
+    Config values copied as they are.
+    """
+    FIELDS = ['number_of_passes', 'tag_level', 'train_level', 'register_empty_pos', 'register_empty_gloss',
+              'register_ngrams', 'surrounding_ngram_max_length', 'tuple_max_length', 'ignore_tuples_of_same_type',
+              'ignore_empty_from_cases', 'count_duplicate_cases', 'case_mappings', 'case_from_adjustments',
+              'case_full_adjustments', 'tag_batch_size', 'cache_static_cases', 'prune_tag_cases', 'use_phrase_memo',
+              'use_sparse_scoring']
+
+    def __init__(self, values=None, **overrides):
+        """
+        Creates a snapshot.
+
+        :param values: The config values to snapshot, defaults to the current config.
+        :param overrides: Values overriding the given ones.
+        """
+        if values is None:
+            values = config.copy()
+
+        values = dict(values)
+        values.update(overrides)
+
+        TaggerConfig.validate(values)
+
+        for field in TaggerConfig.FIELDS:
+            value = values[field]
+            if isinstance(value, dict):
+                value = FrozenDict(copy.deepcopy(dict(value)))
+            object.__setattr__(self, field, value)
+
+        case_types = dict((key, value) for key, value in values.items() if key.startswith('case_type_'))
+        for key, case_type in case_types.items():
+            object.__setattr__(self, key, case_type)
+
+        # Which layers are tagged and trained, so skipped layers never have cases created
+        object.__setattr__(self, 'tag_pos', self.tag_level in ('pos', 'all'))
+        object.__setattr__(self, 'tag_gloss', self.tag_level in ('gloss', 'all'))
+        object.__setattr__(self, 'train_pos', self.train_level in ('pos', 'all'))
+        object.__setattr__(self, 'train_gloss', self.train_level in ('gloss', 'all'))
+
+        object.__setattr__(self, 'case_types', sorted(case_types.values()))
+        object.__setattr__(self, 'case_importance',
+                           FrozenDict((int(key), float(value)) for key, value in values['case_importance'].items()))
+        object.__setattr__(self, 'case_groups',
+                           FrozenDict((int(key), copy.deepcopy(value)) for key, value in values['case_groups'].items()))
+        object.__setattr__(self, 'tuple_importance', {})
+
+    def __setattr__(self, key, value):
+        raise Exception("TaggerConfig is frozen, create a new one instead")
+
+    def replace(self, **overrides):
+        """
+        Creates a snapshot with the values of this one, except the given ones.
+
+        :param overrides: Values overriding the ones of this snapshot.
+        :return: A TaggerConfig.
+        """
+        values = dict((key, value) for key, value in vars(self).items()
+                      if key in TaggerConfig.FIELDS or key.startswith('case_type_'))
+        values['case_importance'] = dict((str(key), value) for key, value in self.case_importance.items())
+        values['case_groups'] = dict((str(key), value) for key, value in self.case_groups.items())
+
+        return TaggerConfig(values, **overrides)
+
+    def get_importance(self, case_type):
+        """
+        Returns the importance of a case type, which for tuple types is the mean importance of their types.
+
+        :param case_type:
+        :return: The importance, or None if the type is empty.
+        """
+        importance = self.case_importance.get(case_type)
+
+        if importance is None:
+            importance = self.tuple_importance.get(case_type)
+
+        if importance is None:
+            importances = [self.case_importance[1 << i] for i in range(0, 32) if case_type & (1 << i)]
+            importance = sum(importances) / len(importances) if len(importances) > 0 else None
+            self.tuple_importance[case_type] = importance
+
+        return importance
+
+    @staticmethod
+    def validate(values):
+        """
+        Checks that config values are complete and consistent.
+
+        :param values:
+        :return:
+        """
+        for field in TaggerConfig.FIELDS + ['case_importance', 'case_groups']:
+            if field not in values:
+                raise Exception("Invalid config, missing '%s'" % field)
+
+        for field in ['tag_level', 'train_level']:
+            if values[field] not in ('pos', 'gloss', 'all'):
+                raise Exception("Invalid config, %s must be 'pos', 'gloss' or 'all'" % field)
+
+        for field in ['number_of_passes', 'tuple_max_length', 'tag_batch_size']:
+            if values[field] < 1:
+                raise Exception("Invalid config, %s must be at least 1" % field)
+
+        if values['surrounding_ngram_max_length'] < 0:
+            raise Exception("Invalid config, surrounding_ngram_max_length must not be negative")
+
+        for key, case_type in values.items():
+            if not key.startswith('case_type_'):
+                continue
+
+            if case_type <= 0 or case_type & (case_type - 1) != 0:
+                raise Exception("Invalid config, %s must be a single bit" % key)
+
+            for field in ['case_importance', 'case_groups']:
+                if str(case_type) not in values[field]:
+                    raise Exception("Invalid config, %s has no entry for %s" % (field, key))
+
+
+_tagger_config = None
+
+
+def get_tagger_config():
+    """
+    Returns a snapshot of the current config, which is only recreated when the config has changed.
+
+    :return: A TaggerConfig.
+    """
+    global _tagger_config
+
+    if _tagger_config is None or _tagger_config.config_version != config.version:
+        tagger_config = TaggerConfig()
+        object.__setattr__(tagger_config, 'config_version', config.version)
+        _tagger_config = tagger_config
+
+    return _tagger_config
+
+
 """
 The primary config
 """
-config = {
+config = Config({
     "verbosity_level": 0,
     "print_test_error_detail": False,
     "output_type": "tcxml",
     "tag_level": "all",
+    "train_level": "all",
     "number_of_passes": 2,
+    "tag_batch_size": 50,
+    "cache_static_cases": True,
+    "prune_tag_cases": True,
+    "use_phrase_memo": False,
+    "phrase_memo_size": 10000,
+    "use_sparse_scoring": False,
     "use_memory_db": False,
+    "use_parse_cache": False,
+    "db_backend": "sqlite",
+    "db_timeout": 30.0,
+    "use_wal": True,
+    "train_batch_size": 500,
+    "train_queue_size": 64,
+    "build_max_keys": None,
+    "use_bloom_filter": True,
+    "bloom_filter_error_rate": 0.01,
+    "use_top_cases": False,
+    "top_cases_k": 10,
     "register_empty_pos": True,
     "register_empty_gloss": True,
     "adjust_for_occurrence": False,
@@ -33,6 +315,7 @@ config = {
     "surrounding_ngram_max_length": 4,
     "tuple_max_length": 3,
     "ignore_tuples_of_same_type": True,
+    "count_duplicate_cases": True,
     "case_type_pos_word": 1,
     "case_type_pos_morpheme": 2,
     "case_type_pos_surrounding_ngram": 4,
@@ -151,16 +434,7 @@ config = {
         "2162688obiara@PN": "INDEF",
         "2162688so@Nrel": "LOC"
     }
-}
-
-json_files = glob.glob(BASE_DIR + "/conf/*.json")
-
-# Load all json config
-for file_name in json_files:
-    with open(file_name) as json_file:
-        data = json.load(json_file)
-        config.update(data)
-
+}, BASE_DIR + "/conf/*.json")
 
 
 """
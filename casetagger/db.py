@@ -1,11 +1,16 @@
-from casetagger.config import BASE_DIR
+from casetagger.backends import SqliteBackend, MmapBackend, DB_FLAG_INCOMPLETE, create_packed_path, select_by_keys
+from casetagger.bloom import BloomFilter, create_bloom_key
+from casetagger.config import BASE_DIR, config
 from casetagger.models import Case, CaseFromCounter, Cases
 
 import sqlite3
 import os
+import time
 
-DB_INIT = """
-BEGIN;
+"""
+The tables of a db, with the unique indexes of their constraints.
+"""
+DB_TABLES = """
 CREATE TABLE IF NOT EXISTS cases(
     id INTEGER PRIMARY KEY,
     type INT,
@@ -23,36 +28,109 @@ CREATE TABLE IF NOT EXISTS cases_from_counter(
     UNIQUE(type, case_from)
 );
 
+CREATE TABLE IF NOT EXISTS top_cases(
+    id INTEGER PRIMARY KEY,
+    type INT,
+    case_from TEXT,
+    case_to TEXT,
+    occurrences INT,
+    prob REAL
+);
+
+CREATE TABLE IF NOT EXISTS trained_texts(
+    text_id TEXT PRIMARY KEY,
+    fingerprint TEXT
+);
+"""
+
+"""
+The secondary indexes of a db, which a bulk build creates after loading the tables.
+"""
+DB_INDEXES = """
 CREATE INDEX IF NOT EXISTS cases_def_idx ON cases(type, case_from, case_to);
 CREATE INDEX IF NOT EXISTS cases_from_idx ON cases(type, case_from);
 CREATE INDEX IF NOT EXISTS cases_tf_from_idx ON cases_from_counter(type, case_from);
-COMMIT;
+CREATE INDEX IF NOT EXISTS top_cases_from_idx ON top_cases(type, case_from);
 """
 
+DB_INIT = "BEGIN;" + DB_TABLES + DB_INDEXES + "COMMIT;"
+
 
 def create_db_path(language):
     return BASE_DIR + '/db/' + language + '_db.db'
 
 
+def create_bloom_filter_path(language):
+    return BASE_DIR + '/db/' + language + '_db.bloom'
+
+
 class DbHandler:
     """
     Class that takes care of all database-interacton
+
+    Lookups, bulk inserts and iteration go through a storage backend. The default backend is sqlite,
+    the 'mmap' backend reads a packed model exported with the export command, and is read-only.
     """
 
-    def __init__(self, language, use_memory=False):
+    def __init__(self, language, use_memory=False, backend=None):
+        if backend is None:
+            backend = config['db_backend']
+
         self.db_path = create_db_path(language)
+        self.bloom_filter_path = create_bloom_filter_path(language)
         self.memory = use_memory
 
+        # Bloom filter over all (type, case_from) keys, used to skip lookups of unknown keys
+        self.bloom_filter = None
+        # Whether data derived from the cases (bloom filter, top cases) has been checked for staleness
+        self.derived_checked = False
+        self.bloom_lookups = 0
+        self.bloom_skipped = 0
+        # Incremented on every write through this handler, see get_model_version
+        self.generation = 0
+
+        if backend == 'mmap':
+            if use_memory:
+                raise Exception("The mmap backend is shared between processes and can not be copied to memory")
+
+            self.conn = None
+            self.backend = MmapBackend(create_packed_path(language))
+            self.complete = self.backend.is_complete()
+            self.derived_checked = True
+            self.use_top_cases = False
+            return
+        elif backend != 'sqlite':
+            raise Exception("Unknown db backend '%s', expected 'sqlite' or 'mmap'" % backend)
+
         if not use_memory:
             if not os.path.isdir(BASE_DIR + "/db"):
                 os.makedirs(BASE_DIR + "/db")
-            self.conn = sqlite3.connect(self.db_path)
+            # The connection may be handed to the thread of a CaseWriter, which then is its only user
+            self.conn = sqlite3.connect(self.db_path, timeout=config['db_timeout'], check_same_thread=False)
+
+            # With write-ahead logging, readers do not block the writer, and other processes training the
+            # same language wait up to db_timeout for the write lock instead of failing
+            if config['use_wal']:
+                self.conn.execute("PRAGMA journal_mode=WAL")
+
             self.init()
         else:
-            self.conn = sqlite3.connect(':memory:')
+            self.conn = sqlite3.connect(':memory:', check_same_thread=False)
             self.init()
+
+        self.backend = SqliteBackend(self.conn)
+        self.complete = self.backend.is_complete()
+
+        if use_memory:
             self.copy_from_db(language)
 
+        if config['use_bloom_filter']:
+            self.bloom_filter = BloomFilter.load(self.bloom_filter_path)
+
+        # Whether we read precomputed top cases instead of computing probabilities row by row
+        self.use_top_cases = config['use_top_cases'] and self.conn.execute('''
+            SELECT 1 FROM top_cases LIMIT 1''').fetchone() is not None
+
     def init(self):
         """
         Sets up the database
@@ -63,65 +141,111 @@ class DbHandler:
         self.conn.commit()
 
     def copy_from_db(self, language):
-        other_db = DbHandler(language, False)
-        cases = other_db.get_all_cases()
-        self.insert_cases(cases)
+        other_db = DbHandler(language, False, 'sqlite')
+        self.bulk_insert(other_db.get_all_cases(), other_db.get_all_case_counters())
+        self.set_complete(other_db.is_complete())
+
+    def is_complete(self):
+        """
+        Returns whether the db holds every key training generated. Training generates every n-gram together
+        with the shorter n-gram it extends, and every tuple together with its components, which pruning the
+        cases while tagging relies on, see Cases.prune_cases.
+
+        Removing rare cases with compact breaks this, as the occurrences of a tuple may exceed the ones of its
+        components, and the thresholds may differ by type. Such a db is marked as incomplete, and stays so
+        until it is cleared.
+
+        :return:
+        """
+        return self.complete
+
+    def set_complete(self, complete):
+        """
+        Marks the db as complete or incomplete, see is_complete.
+
+        :param complete:
+        :return:
+        """
+        self.check_writable()
+
+        self.conn.execute("PRAGMA user_version=%d" % (0 if complete else DB_FLAG_INCOMPLETE))
+        self.conn.commit()
+        self.complete = complete
+
+    def check_writable(self):
+        """
+        Raises if the storage backend is read-only, like the mmap backend, which holds no sqlite connection.
+
+        :return:
+        """
+        if self.backend.read_only:
+            raise Exception("Can not write to a read-only db backend")
 
     def get_case(self, case_type, case_from, case_to):
-        res = self.conn.execute('''
-            SELECT * FROM cases WHERE type=? AND case_from=? AND case_to=?''',
-                             (case_type, case_from, case_to)).fetchone()
+        # Like in SQL, NULL never matches
+        if case_to is None:
+            return None
+
+        for case in self.backend.get_cases_by_from(case_type, case_from):
+            if case.case_to == case_to:
+                return case
 
-        return DbHandler._row_to_case(res)
+        return None
 
     def get_cases_by_from(self, case_type, case_from):
-        res = self.conn.execute('''
-            SELECT * FROM cases WHERE type=? AND case_from=?''',
-                                (case_type, case_from)).fetchall()
+        if not self.may_contain(case_type, case_from):
+            return []
 
-        return DbHandler._rows_to_case(res)
+        return self.backend.get_cases_by_from(case_type, case_from)
 
     def get_case_counter(self, case_type, case_from):
-        res = self.conn.execute('''
-            SELECT * FROM cases_from_counter WHERE type=? AND case_from=?''',
-                                (case_type, case_from)).fetchone()
+        if not self.may_contain(case_type, case_from):
+            return None
 
-        return DbHandler._row_to_case_counter(res)
+        return self.backend.get_case_counter(case_type, case_from)
 
     def get_all_cases(self):
-        res = self.conn.execute('''
-            SELECT * FROM cases''').fetchall()
-
-        return DbHandler._rows_to_case(res)
+        return list(self.backend.iter_cases())
 
     def get_all_case_counters(self):
-        res = self.conn.execute('''
-            SELECT * FROM cases_from_counter''').fetchall()
+        return list(self.backend.iter_case_counters())
 
-        return DbHandler._rows_to_case_counters(res)
+    def iter_case_rows(self):
+        return self.backend.iter_case_rows()
 
     def insert_case(self, case, cursor=None):
+        """
+        Inserts a case, incrementing its occurrences and its from-counter by the weight of the case.
+
+        :param case:
+        :param cursor:
+        :return:
+        """
         assert isinstance(case, Case)
 
+        self.check_writable()
         should_commit = cursor is None
 
         if cursor is None:
             cursor = self.conn.cursor()
 
+        weight = case.get_weight()
+
         cursor.execute('''
             INSERT OR IGNORE INTO cases(type, case_from, case_to, occurrences) VALUES (?,?,?,?)''',
                        (case.type, case.case_from, case.case_to, 0))
 
         cursor.execute('''
-            UPDATE cases SET occurrences = occurrences + 1 WHERE type=? AND case_from=? AND case_to=?;''',
-                       (case.type, case.case_from, case.case_to))
+            UPDATE cases SET occurrences = occurrences + ? WHERE type=? AND case_from=? AND case_to=?;''',
+                       (weight, case.type, case.case_from, case.case_to))
 
-        self.insert_case_counter(case, cursor)
+        self.insert_case_counter(case, cursor, weight)
 
         if should_commit:
             self.conn.commit()
 
     def insert_cases(self, cases, cursor=None):
+        self.check_writable()
         should_commit = cursor is None
 
         if cursor is None:
@@ -133,42 +257,252 @@ class DbHandler:
         if should_commit:
             self.conn.commit()
 
-    def insert_case_counter(self, case_counter, cursor=None):
+    def insert_case_counter(self, case_counter, cursor=None, occurrences=1):
         assert isinstance(case_counter, CaseFromCounter) or isinstance(case_counter, Case)
 
+        self.check_writable()
         should_commit = cursor is None
 
         if cursor is None:
             cursor = self.conn.cursor()
 
+        if not self.derived_checked:
+            self.invalidate_derived_data(cursor)
+
+        self.generation += 1
+
+        if self.bloom_filter is not None:
+            self.bloom_filter.add(create_bloom_key(case_counter.type, case_counter.case_from))
+
         cursor.execute('''
             INSERT OR IGNORE INTO cases_from_counter(type, case_from, occurrences) VALUES (?,?,?)''',
                        (case_counter.type, case_counter.case_from, 0))
 
         cursor.execute('''
-            UPDATE cases_from_counter SET occurrences = occurrences + 1 WHERE type=? AND case_from=?''',
-                       (case_counter.type, case_counter.case_from))
+            UPDATE cases_from_counter SET occurrences = occurrences + ? WHERE type=? AND case_from=?''',
+                       (occurrences, case_counter.type, case_counter.case_from))
+
+        if should_commit:
+            self.conn.commit()
+
+    def bulk_insert(self, cases, case_counters, cursor=None):
+        """
+        Inserts cases and from-counters with their occurrences as given, adding them to any existing ones.
+
+        Unlike insert_cases, the from-counters are not derived from the cases.
+
+        :param cases: An iterable of Case objects.
+        :param case_counters: An iterable of CaseFromCounter objects.
+        :param cursor:
+        :return:
+        """
+        self.check_writable()
+        should_commit = cursor is None
+
+        if cursor is None:
+            cursor = self.conn.cursor()
+
+        if not self.derived_checked:
+            self.invalidate_derived_data(cursor)
+
+        self.generation += 1
+
+        if self.bloom_filter is not None:
+            case_counters = list(case_counters)
+            for case_counter in case_counters:
+                self.bloom_filter.add(create_bloom_key(case_counter.type, case_counter.case_from))
+
+        self.backend.bulk_insert(cases, case_counters, cursor)
+
+        if should_commit:
+            self.conn.commit()
+
+    def apply_case_deltas(self, deltas, cursor=None):
+        """
+        Applies signed occurrence deltas to cases, and updates their from-counters accordingly.
+
+        Cases and from-counters whose occurrences drop to zero are removed.
+
+        :param deltas: A dict of (type, case_from, case_to) to the change in occurrences.
+        :param cursor:
+        :return:
+        """
+        self.check_writable()
+        should_commit = cursor is None
+
+        if cursor is None:
+            cursor = self.conn.cursor()
+
+        if not self.derived_checked:
+            self.invalidate_derived_data(cursor)
+
+        self.generation += 1
+        counter_deltas = {}
+
+        for (case_type, case_from, case_to), delta in deltas.items():
+            if delta == 0:
+                continue
+
+            counter_key = (case_type, case_from)
+            counter_deltas[counter_key] = counter_deltas.get(counter_key, 0) + delta
+
+            cursor.execute('''
+                INSERT OR IGNORE INTO cases(type, case_from, case_to, occurrences) VALUES (?,?,?,?)''',
+                           (case_type, case_from, case_to, 0))
+            cursor.execute('''
+                UPDATE cases SET occurrences = occurrences + ? WHERE type=? AND case_from=? AND case_to=?''',
+                           (delta, case_type, case_from, case_to))
+
+            if delta < 0:
+                cursor.execute('''
+                    DELETE FROM cases WHERE type=? AND case_from=? AND case_to=? AND occurrences <= 0''',
+                               (case_type, case_from, case_to))
+
+        for (case_type, case_from), delta in counter_deltas.items():
+            if delta == 0:
+                continue
+
+            if self.bloom_filter is not None:
+                self.bloom_filter.add(create_bloom_key(case_type, case_from))
+
+            cursor.execute('''
+                INSERT OR IGNORE INTO cases_from_counter(type, case_from, occurrences) VALUES (?,?,?)''',
+                           (case_type, case_from, 0))
+            cursor.execute('''
+                UPDATE cases_from_counter SET occurrences = occurrences + ? WHERE type=? AND case_from=?''',
+                           (delta, case_type, case_from))
+
+            if delta < 0:
+                cursor.execute('''
+                    DELETE FROM cases_from_counter WHERE type=? AND case_from=? AND occurrences <= 0''',
+                               (case_type, case_from))
 
         if should_commit:
             self.conn.commit()
 
+    def get_trained_text_fingerprint(self, text_id):
+        """
+        Gets the fingerprint of a text as recorded in the journal of trained texts.
+
+        :param text_id:
+        :return: The fingerprint, or None if the text is not trained.
+        """
+        # The journal is only kept with the trainable sqlite db
+        self.check_writable()
+
+        row = self.conn.execute('''
+            SELECT fingerprint FROM trained_texts WHERE text_id=?''', (text_id,)).fetchone()
+
+        return row[0] if row is not None else None
+
+    def set_trained_text_fingerprint(self, text_id, fingerprint, cursor=None):
+        """
+        Records the fingerprint of a trained text in the journal. A fingerprint of None removes the text.
+
+        :param text_id:
+        :param fingerprint:
+        :param cursor:
+        :return:
+        """
+        self.check_writable()
+        should_commit = cursor is None
+
+        if cursor is None:
+            cursor = self.conn.cursor()
+
+        if fingerprint is None:
+            cursor.execute('''
+                DELETE FROM trained_texts WHERE text_id=?''', (text_id,))
+        else:
+            cursor.execute('''
+                INSERT OR REPLACE INTO trained_texts(text_id, fingerprint) VALUES (?,?)''', (text_id, fingerprint))
+
+        if should_commit:
+            self.conn.commit()
+
+    def get_to_cases_by_keys(self, keys):
+        """
+        Fetches the to-cases of many (type, case_from) keys in bulk, with their probabilities populated.
+
+        :param keys: An iterable of (type, case_from) tuples.
+        :return: A dict of (type, case_from) to a list of cases, holding only the keys with cases.
+        """
+        keys = [key for key in set(keys) if self.may_contain(key[0], key[1])]
+
+        if self.use_top_cases:
+            result = {}
+            for row in select_by_keys(self.conn, '''
+                    SELECT type, case_from, case_to, occurrences, prob FROM top_cases
+                    WHERE type=? AND case_from IN (%s)''', keys):
+                result.setdefault((row[0], row[1]), []).append(Case(row[0], row[1], row[2], row[3], row[4]))
+            return result
+
+        result = self.backend.get_cases_by_from_many(keys)
+        case_counters = self.backend.get_case_counters_many(result.keys())
+
+        for key, cases in result.items():
+            from_occurrences = float(case_counters[key].occurrences)
+            for case in cases:
+                case.prob = float(case.occurrences) / from_occurrences
+
+        return result
+
     def get_all_to_cases(self, cases):
         """
         Takes a set of cases, assumed to contain only cases populated with the type and case_from fields,
         and fetches all cases that match these two columns.
 
+        Every (type, case_from) is only looked up once. The fetched cases get the summed multiplicity
+        of the cases sharing their (type, case_from).
+
         :param cases:
         :return:
         """
         assert isinstance(cases, Cases)
 
-        new_cases = []
+        from_multiplicities = {}
         for case in cases:
-            new_cases.extend(self.get_cases_by_from(case.type, case.case_from))
+            key = (case.type, case.case_from)
+            from_multiplicities[key] = from_multiplicities.get(key, 0) + case.multiplicity
 
         cases_obj = Cases()
-        cases_obj.add_all_cases(new_cases)
-        self.populate_probabilities(cases_obj)
+
+        for (case_type, case_from), multiplicity in from_multiplicities.items():
+            if self.use_top_cases:
+                fetched_cases = self.get_top_cases_by_from(case_type, case_from)
+            else:
+                fetched_cases = self.get_cases_by_from(case_type, case_from)
+
+            for fetched_case in fetched_cases:
+                fetched_case.multiplicity = multiplicity
+                cases_obj.add_case_from_obj(fetched_case)
+
+        if not self.use_top_cases:
+            self.populate_probabilities(cases_obj)
+
+        return cases_obj
+
+    @staticmethod
+    def collect_to_cases(cases, to_cases_by_key):
+        """
+        Builds the result of get_all_to_cases from cases and their to-cases as fetched by get_to_cases_by_keys.
+
+        The fetched cases are copied, so the same fetched cases may be collected several times.
+
+        :param cases: The cases to collect the to-cases of.
+        :param to_cases_by_key: A dict of (type, case_from) to a list of cases.
+        :return: A Cases object.
+        """
+        from_multiplicities = {}
+        for case in cases:
+            key = (case.type, case.case_from)
+            from_multiplicities[key] = from_multiplicities.get(key, 0) + case.multiplicity
+
+        cases_obj = Cases()
+        for key, multiplicity in from_multiplicities.items():
+            for to_case in to_cases_by_key.get(key, []):
+                cases_obj.add_case_from_obj(Case(to_case.type, to_case.case_from, to_case.case_to,
+                                                 to_case.occurrences, to_case.prob, multiplicity))
 
         return cases_obj
 
@@ -199,16 +533,282 @@ class DbHandler:
             prob = float(case.occurrences) / float(from_case.occurrences)
             case.prob = prob
 
+    def may_contain(self, case_type, case_from):
+        """
+        Checks the bloom filter for a (type, case_from) key, if a filter is loaded.
+
+        :param case_type:
+        :param case_from:
+        :return: False if the key is definitely not in the database, True otherwise.
+        """
+        if self.bloom_filter is None:
+            return True
+
+        self.bloom_lookups += 1
+        if create_bloom_key(case_type, case_from) in self.bloom_filter:
+            return True
+
+        self.bloom_skipped += 1
+        return False
+
+    def build_bloom_filter(self, error_rate=None):
+        """
+        Builds a bloom filter over all (type, case_from) keys in the database, and
+        persists it next to the database file.
+
+        Should be called at the end of training.
+
+        :param error_rate: The false-positive rate of the filter, defaults to config['bloom_filter_error_rate'].
+        :return: The built BloomFilter.
+        """
+        self.check_writable()
+
+        if error_rate is None:
+            error_rate = config['bloom_filter_error_rate']
+
+        capacity = self.conn.execute('''
+            SELECT COUNT(*) FROM cases_from_counter''').fetchone()[0]
+
+        bloom_filter = BloomFilter(capacity, error_rate)
+        for case_type, case_from in self.conn.execute('''
+                SELECT type, case_from FROM cases_from_counter'''):
+            bloom_filter.add(create_bloom_key(case_type, case_from))
+
+        if not self.memory:
+            bloom_filter.save(self.bloom_filter_path)
+
+        # The next write makes the persisted filter stale again
+        self.derived_checked = False
+        self.bloom_filter = bloom_filter
+        return bloom_filter
+
+    def invalidate_derived_data(self, cursor=None):
+        """
+        Removes data derived from the cases which is not kept up to date on writes. This is
+        the persisted bloom filter, as handlers opened later would otherwise reject the keys we are about
+        to write, and the precomputed top cases. A loaded bloom filter is kept, as the written keys are
+        added to it. Both are rebuilt by finalize_training.
+
+        :param cursor:
+        :return:
+        """
+        self.derived_checked = True
+
+        if not self.memory and os.path.isfile(self.bloom_filter_path):
+            os.remove(self.bloom_filter_path)
+
+        if cursor is None:
+            cursor = self.conn.cursor()
+
+        cursor.execute("DELETE FROM top_cases")
+        self.use_top_cases = False
+
+    def refresh_top_cases(self, k=None):
+        """
+        Materializes the k most occurring to-cases of every (type, case_from), with their probabilities
+        precomputed. Should be called at the end of training.
+
+        :param k: The number of to-cases to keep per (type, case_from), defaults to config['top_cases_k'].
+        :return:
+        """
+        self.check_writable()
+
+        if k is None:
+            k = config['top_cases_k']
+
+        self.generation += 1
+
+        cursor = self.conn.cursor()
+        cursor.execute("DELETE FROM top_cases")
+        cursor.execute('''
+            INSERT INTO top_cases(type, case_from, case_to, occurrences, prob)
+            SELECT type, case_from, case_to, occurrences, prob FROM (
+                SELECT cases.type, cases.case_from, cases.case_to, cases.occurrences,
+                       CAST(cases.occurrences AS REAL) / cases_from_counter.occurrences AS prob,
+                       ROW_NUMBER() OVER (
+                           PARTITION BY cases.type, cases.case_from
+                           ORDER BY cases.occurrences DESC, cases.case_to) AS rank
+                FROM cases JOIN cases_from_counter
+                    ON cases.type=cases_from_counter.type AND cases.case_from=cases_from_counter.case_from)
+            WHERE rank <= ?''', (k,))
+        self.conn.commit()
+
+        # The next write makes the top cases stale again
+        self.derived_checked = False
+        self.use_top_cases = config['use_top_cases']
+
+    def get_top_cases_by_from(self, case_type, case_from):
+        """
+        Fetches the precomputed top cases of a (type, case_from), with their probabilities populated.
+
+        :param case_type:
+        :param case_from:
+        :return:
+        """
+        if not self.may_contain(case_type, case_from):
+            return []
+
+        res = self.conn.execute('''
+            SELECT type, case_from, case_to, occurrences, prob FROM top_cases WHERE type=? AND case_from=?''',
+                                (case_type, case_from)).fetchall()
+
+        return [Case(row[0], row[1], row[2], row[3], row[4]) for row in res]
+
+    def get_model_version(self):
+        """
+        Returns a version of the trained model, which changes whenever the model is written to, either through
+        this handler or, with sqlite, through another connection to the same database.
+
+        :return: A hashable value, only meaningful when compared to other versions of the same handler.
+        """
+        if self.conn is None:
+            return self.generation
+
+        return self.generation, self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def get_bloom_filter_stats(self):
+        """
+        Returns the number of lookups checked against the bloom filter, and how many of them were skipped.
+
+        :return: A dict.
+        """
+        return {
+            'lookups': self.bloom_lookups,
+            'skipped': self.bloom_skipped
+        }
+
+    def compact(self, min_occurrences=1, min_from_occurrences=1, type_thresholds=None, recompute_counters=False):
+        """
+        Prunes rare cases and from-counters from the database, and vacuums it.
+
+        :param min_occurrences: Cases occurring fewer times than this are removed.
+        :param min_from_occurrences: From-counters occurring fewer times than this are removed, along with their cases.
+        :param type_thresholds: A dict of case type to minimum occurrences, overriding min_occurrences for that type.
+        :param recompute_counters: If True, from-counters are set to the sum of their remaining cases, otherwise
+                                   they are kept exact as trained.
+        :return: A tuple of the number of removed cases and removed from-counters.
+        """
+        self.check_writable()
+
+        if type_thresholds is None:
+            type_thresholds = {}
+
+        self.generation += 1
+
+        cursor = self.conn.cursor()
+        cases_before = cursor.execute('''SELECT COUNT(*) FROM cases''').fetchone()[0]
+        counters_before = cursor.execute('''SELECT COUNT(*) FROM cases_from_counter''').fetchone()[0]
+
+        overridden_types = list(type_thresholds.keys())
+        cursor.execute('''
+            DELETE FROM cases WHERE occurrences < ? AND type NOT IN (%s)''' % ",".join("?" * len(overridden_types)),
+                       [min_occurrences] + overridden_types)
+
+        for case_type, threshold in type_thresholds.items():
+            cursor.execute('''
+                DELETE FROM cases WHERE type=? AND occurrences < ?''', (case_type, threshold))
+
+        cursor.execute('''
+            DELETE FROM cases_from_counter WHERE occurrences < ?''', (min_from_occurrences,))
+
+        # Keep the two tables consistent with each other
+        cursor.execute('''
+            DELETE FROM cases WHERE NOT EXISTS (
+                SELECT 1 FROM cases_from_counter
+                WHERE cases_from_counter.type=cases.type AND cases_from_counter.case_from=cases.case_from)''')
+        cursor.execute('''
+            DELETE FROM cases_from_counter WHERE NOT EXISTS (
+                SELECT 1 FROM cases
+                WHERE cases.type=cases_from_counter.type AND cases.case_from=cases_from_counter.case_from)''')
+
+        if recompute_counters:
+            cursor.execute('''
+                UPDATE cases_from_counter SET occurrences = (
+                    SELECT SUM(occurrences) FROM cases
+                    WHERE cases.type=cases_from_counter.type AND cases.case_from=cases_from_counter.case_from)''')
+
+        cases_after = cursor.execute('''SELECT COUNT(*) FROM cases''').fetchone()[0]
+        counters_after = cursor.execute('''SELECT COUNT(*) FROM cases_from_counter''').fetchone()[0]
+        self.conn.commit()
+
+        if cases_after < cases_before or counters_after < counters_before:
+            self.set_complete(False)
+
+        self.vacuum()
+
+        if self.bloom_filter is not None:
+            self.build_bloom_filter()
+
+        if self.use_top_cases:
+            self.refresh_top_cases()
+
+        return cases_before - cases_after, counters_before - counters_after
+
+    def vacuum(self):
+        """
+        Reclaims unused space in the database file and refreshes the query planner statistics.
+
+        :return:
+        """
+        self.conn.execute("VACUUM")
+        self.conn.execute("ANALYZE")
+        self.conn.commit()
+
+    def get_size(self):
+        """
+        Returns the size of the database in bytes.
+
+        :return:
+        """
+        page_count = self.conn.execute("PRAGMA page_count").fetchone()[0]
+        page_size = self.conn.execute("PRAGMA page_size").fetchone()[0]
+
+        return page_count * page_size
+
+    def measure_lookup_latency(self, sample_size=1000):
+        """
+        Measures the average time of get_cases_by_from over a sample of the keys in the database.
+
+        :param sample_size: The number of keys to look up.
+        :return: The average latency in seconds, or 0 if the database is empty.
+        """
+        keys = self.conn.execute('''
+            SELECT type, case_from FROM cases_from_counter ORDER BY RANDOM() LIMIT ?''', (sample_size,)).fetchall()
+
+        if len(keys) == 0:
+            return 0
+
+        start = time.time()
+        for case_type, case_from in keys:
+            list(self.get_cases_by_from(case_type, case_from))
+
+        return (time.time() - start) / len(keys)
+
+    def close(self):
+        self.backend.close()
+
+        if self.conn is not None:
+            self.conn.close()
+
     def _clear_database(self):
+        self.check_writable()
+        self.generation += 1
         self.conn.execute("DELETE FROM cases")
         self.conn.execute("DELETE FROM cases_from_counter")
+        self.conn.execute("DELETE FROM top_cases")
+        self.conn.execute("DELETE FROM trained_texts")
         self.conn.commit()
+        self.set_complete(True)
 
     def _destroy_database(self):
         self._clear_database()
 
         if not self.memory:
-            os.remove(self.db_path)
+            self.conn.close()
+
+            for path in [self.db_path, self.db_path + '-wal', self.db_path + '-shm', self.bloom_filter_path]:
+                if os.path.isfile(path):
+                    os.remove(path)
 
     @staticmethod
     def _row_to_case_counter(row):
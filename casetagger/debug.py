@@ -1,33 +1,35 @@
-from typecraft_python.models import Morpheme, Word
-
 from casetagger.config import config
-from casetagger.util import get_text_morphemes
-from casetagger.util import get_text_words
 
 
 class TestWordResult(object):
     """
     Class representing a result for a word in a test-run.
     """
+    __slots__ = ('word', 'pos_1', 'pos_2', 'equal')
+
     def __init__(
         self,
-        word_1,
-        word_2
+        word,
+        pos_1,
+        pos_2
     ):
-        assert isinstance(word_1, Word)
-        assert isinstance(word_1, Word)
+        """
+        :param word: The form of the word.
+        :param pos_1: The gold POS-tag.
+        :param pos_2: The tagged POS-tag.
+        """
+        self.word = word
+        self.pos_1 = pos_1
+        self.pos_2 = pos_2
 
-        self.word_1 = word_1
-        self.word_2 = word_2
-
-        self.equal = self.word_1.pos == self.word_2.pos
+        self.equal = pos_1 == pos_2
 
     def __str__(self):
         return u"Word: %s, POS: %s == %s: %s" \
                % (
-                   self.word_1.word,
-                   self.word_1.pos,
-                   self.word_2.pos,
+                   self.word,
+                   self.pos_1,
+                   self.pos_2,
                    "TRUE" if self.equal else "FALSE"
                )
 
@@ -36,28 +38,55 @@ class TestMorphemeResult(object):
     """
     Class representing a result for a morpheme in a test-run.
     """
+    __slots__ = ('morpheme', 'glosses_1', 'glosses_2', 'equal')
+
     def __init__(
         self,
-        morph_1,
-        morph_2
+        morpheme,
+        glosses_1,
+        glosses_2
     ):
-        assert isinstance(morph_1, Morpheme)
-        assert isinstance(morph_2, Morpheme)
-        self.morph_1 = morph_1
-        self.morph_2 = morph_2
-
-        self.equal = morph_1.get_glosses_concatenated(sort=True) == morph_2.get_glosses_concatenated(sort=True)
+        """
+        :param morpheme: The form of the morpheme.
+        :param glosses_1: The gold glosses, sorted and concatenated.
+        :param glosses_2: The tagged glosses, sorted and concatenated.
+        """
+        self.morpheme = morpheme
+        self.glosses_1 = glosses_1
+        self.glosses_2 = glosses_2
+        self.equal = glosses_1 == glosses_2
 
     def __str__(self):
         return u"Morpheme: %s, Glosses: %s == %s: %s" \
                % (
-                   self.morph_1.morpheme,
-                   self.morph_1.get_glosses_concatenated(),
-                   self.morph_2.get_glosses_concatenated(),
+                   self.morpheme,
+                   self.glosses_1,
+                   self.glosses_2,
                    "TRUE" if self.equal else "FALSE"
                )
 
 
+def get_gold_tags(text):
+    """
+    Captures the POS-tags and glosses of a text, so it can be compared with after it is tagged. The glosses of
+    a morpheme are sorted before they are concatenated, as their order doesn't matter.
+
+    :param text:
+    :return: A tuple of a list of the POS-tags of all words, and a list of the glosses of all morphemes,
+        in the order of get_text_words and get_text_morphemes.
+    """
+    poses = []
+    glosses = []
+
+    for phrase in text:
+        for word in phrase:
+            poses.append(word.pos)
+            for morpheme in word:
+                glosses.append(morpheme.get_glosses_concatenated(sort=True))
+
+    return poses, glosses
+
+
 class TestResult(object):
     """
     Class representing the results of a test-run.
@@ -122,18 +151,53 @@ class TestResult(object):
         return res
 
     @staticmethod
-    def from_data(text_1, text_2):
-        words_1 = get_text_words(text_1)
-        words_2 = get_text_words(text_2)
+    def from_data(text_1, text_2, tag_level="all"):
+        """
+        Compares a gold text with a tagged version of it.
 
-        morphemes_1 = get_text_morphemes(text_1)
-        morphemes_2 = get_text_morphemes(text_2)
+        :param text_1: The gold text.
+        :param text_2: The tagged text.
+        :param tag_level: The layers that were tagged, 'pos', 'gloss' or 'all'. The other layer is not compared.
+        :return: A TestResult.
+        """
+        return TestResult.from_gold_tags(text_1.title, get_gold_tags(text_1), text_2, tag_level)
 
-        words = map(lambda x: TestWordResult(x[0], x[1]), zip(words_1, words_2))
-        morphemes = map(lambda x: TestMorphemeResult(x[0], x[1]), zip(morphemes_1, morphemes_2))
+    @staticmethod
+    def from_gold_tags(title, gold_tags, text, tag_level="all"):
+        """
+        Compares the gold tags of a text, as captured by get_gold_tags before tagging, with the text after tagging.
+
+        :param title: The title of the result.
+        :param gold_tags: The tuple of gold POS-tags and glosses returned by get_gold_tags.
+        :param text: The tagged text.
+        :param tag_level: The layers that were tagged, 'pos', 'gloss' or 'all'. The other layer is not compared.
+        :return: A TestResult.
+        """
+        gold_poses, gold_glosses = gold_tags
+        compare_words = tag_level in ('pos', 'all')
+        compare_morphemes = tag_level in ('gloss', 'all')
+
+        words = []
+        morphemes = []
+        word_index = 0
+        morpheme_index = 0
+
+        for phrase in text:
+            for word in phrase:
+                if compare_words:
+                    words.append(TestWordResult(word.word, gold_poses[word_index], word.pos))
+                word_index += 1
+
+                if not compare_morphemes:
+                    continue
+
+                for morpheme in word:
+                    morphemes.append(TestMorphemeResult(morpheme.morpheme, gold_glosses[morpheme_index],
+                                                        morpheme.get_glosses_concatenated(sort=True)))
+                    morpheme_index += 1
 
         return TestResult(
-            text_1.title,
+            title,
             words,
             morphemes
         )
@@ -146,15 +210,7 @@ class TestResult(object):
         if other is None:
             return this
 
-        this.wrong_words.extend(other.wrong_words)
-        this.wrong_morphemes.extend(other.wrong_morphemes)
-
         return TestResult(this.title + " | " + other.title,
-                          this.words_total + other.words_total,
-                          this.morphemes_total + other.morphemes_total,
-                          this.correct_words + other.correct_words,
-                          this.correct_morphemes + other.correct_morphemes,
-                          this.wrong_words,
-                          this.wrong_morphemes)
-
-
+                          this.correct_words + this.wrong_words + other.correct_words + other.wrong_words,
+                          this.correct_morphemes + this.wrong_morphemes + other.correct_morphemes +
+                          other.wrong_morphemes)
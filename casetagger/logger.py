@@ -2,33 +2,46 @@ from casetagger.config import config
 import codecs
 import sys
 
-UTF8Writer = codecs.getwriter('utf8')
-sys.stdout = UTF8Writer(sys.stdout)
+try:
+    text_type = unicode
+except NameError:
+    text_type = str
+
+
+def setup_output():
+    """
+    Makes stdout accept unicode on Python 2. Should be called once by programs printing through the logger.
+
+    :return:
+    """
+    if sys.version_info[0] < 3 and not isinstance(sys.stdout, codecs.StreamWriter):
+        UTF8Writer = codecs.getwriter('utf8')
+        sys.stdout = UTF8Writer(sys.stdout)
 
 
 def log(content):
     if config['verbosity_level'] >= 0:
-        print("[Log]: " + unicode(content))
+        print("[Log]: " + text_type(content))
 
 
 def debug(content):
     if config['verbosity_level'] == 2:
-        print("[Debug]: " + unicode(content))
+        print("[Debug]: " + text_type(content))
 
 
 def error(content):
     if config['verbosity_level'] >= 1:
-        print("[Error]: " + unicode(content))
+        print("[Error]: " + text_type(content))
 
 
 def critical(content):
-    print("[Critical error]: " + unicode(content))
+    print("[Critical error]: " + text_type(content))
 
 
 def debug_print_cases(cases):
     if config["verbosity_level"] == 2:
         if hasattr(cases, '__iter__'):
             for case in cases:
-                print(unicode(case))
+                print(text_type(case))
         else:
-            print(unicode(cases))
+            print(text_type(cases))
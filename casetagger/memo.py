@@ -0,0 +1,186 @@
+import threading
+from collections import OrderedDict
+
+from casetagger.config import config
+
+
+def get_phrase_key(phrase):
+    """
+    Returns the key of a phrase in the memo.
+
+    The tags a phrase gets only depend on its own words and morphemes, and on the tags it has before tagging,
+    so the key holds the word forms, the morpheme segmentation and the existing POS-tags and glosses.
+
+    :param phrase:
+    :return: A hashable tuple.
+    """
+    return tuple((word.word, word.pos, tuple((morpheme.morpheme, tuple(morpheme.glosses))
+                                             for morpheme in word.morphemes))
+                 for word in phrase.words)
+
+
+def get_phrase_tags(phrase):
+    """
+    Returns the POS-tags and glosses of a phrase, as stored in the memo.
+
+    :param phrase:
+    :return: A tuple of (pos, glosses of every morpheme) for every word.
+    """
+    return tuple((word.pos, tuple(tuple(morpheme.glosses) for morpheme in word.morphemes))
+                 for word in phrase.words)
+
+
+def apply_phrase_tags(phrase, tags):
+    """
+    Sets the POS-tags and glosses of a phrase from the memo.
+
+    :param phrase:
+    :param tags: Tags as returned by get_phrase_tags, for a phrase with the same key.
+    :return:
+    """
+    for word, (pos, glosses) in zip(phrase.words, tags):
+        word.pos = pos
+        for morpheme, morpheme_glosses in zip(word.morphemes, glosses):
+            morpheme.glosses = list(morpheme_glosses)
+
+
+class PhraseMemo(object):
+    """
+    Bounded memo of the tags assigned to phrases, so repeated phrases are only tagged once.
+
+    The least recently used phrases are evicted when the memo is full. The memo belongs to a model, identified
+    by a key like the version of the database and the TaggerConfig tagged with, and is cleared when the key
+    changes.
+
+    The memo may be shared by threads tagging with the same model, its entries and stats are guarded by a lock.
+    """
+
+    def __init__(self, max_size=None):
+        """
+        Creates the memo.
+
+        :param max_size: The maximum number of phrases in the memo, defaults to config['phrase_memo_size'].
+        """
+        if max_size is None:
+            max_size = config['phrase_memo_size']
+
+        if max_size < 1:
+            raise Exception("Invalid phrase memo size %d, must be at least 1" % max_size)
+
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.model_key = None
+        self.lock = threading.Lock()
+
+        # Stats
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def validate(self, model_key):
+        """
+        Clears the memo if it was filled for another model.
+
+        :param model_key: A hashable value identifying the model.
+        :return:
+        """
+        with self.lock:
+            if model_key == self.model_key:
+                return
+
+            if len(self.entries) > 0:
+                self.entries.clear()
+                self.invalidations += 1
+
+            self.model_key = model_key
+
+    def get(self, key):
+        """
+        Returns the tags of a phrase key, marking it as recently used.
+
+        :param key: A key as returned by get_phrase_key.
+        :return: The tags, or None if the phrase is not in the memo.
+        """
+        with self.lock:
+            tags = self.entries.pop(key, None)
+
+            if tags is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.entries[key] = tags
+            return tags
+
+    def put(self, key, tags):
+        """
+        Stores the tags of a phrase key, evicting the least recently used phrase if the memo is full.
+
+        :param key: A key as returned by get_phrase_key.
+        :param tags: Tags as returned by get_phrase_tags.
+        :return:
+        """
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = tags
+
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def tag_phrases(self, phrases, tag):
+        """
+        Tags phrases, applying memoized tags where possible.
+
+        The phrases in the memo get their tags directly. Of the others, only the first phrase of every key is
+        tagged, and its tags are memoized and copied to the duplicates of it.
+
+        :param phrases: A list of phrases.
+        :param tag: A function tagging a list of phrases in place.
+        :return:
+        """
+        pending = OrderedDict()
+
+        for phrase in phrases:
+            key = get_phrase_key(phrase)
+
+            if key in pending:
+                # A duplicate of a phrase we are about to tag
+                with self.lock:
+                    self.hits += 1
+                pending[key].append(phrase)
+                continue
+
+            tags = self.get(key)
+
+            if tags is None:
+                pending[key] = [phrase]
+            else:
+                apply_phrase_tags(phrase, tags)
+
+        tag([duplicates[0] for duplicates in pending.values()])
+
+        for key, duplicates in pending.items():
+            tags = get_phrase_tags(duplicates[0])
+            self.put(key, tags)
+
+            for phrase in duplicates[1:]:
+                apply_phrase_tags(phrase, tags)
+
+    def get_stats(self):
+        """
+        Returns the hits, misses, evictions and invalidations of the memo, its size and its hit rate.
+
+        :return: A dict.
+        """
+        lookups = self.hits + self.misses
+
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+            'size': len(self.entries),
+            'hit_rate': float(self.hits) / lookups if lookups > 0 else 0.0
+        }
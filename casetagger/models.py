@@ -1,7 +1,7 @@
 import math
 from functools import reduce
 
-from casetagger.config import config
+from casetagger.config import config, get_tagger_config
 import itertools
 
 from casetagger.logger import debug_print_cases, debug
@@ -14,7 +14,7 @@ class Case:
     Class we use to mock the db-version of a Case.
     """
 
-    def __init__(self, case_type, case_from, case_to, occurrences=1, prob=0):
+    def __init__(self, case_type, case_from, case_to, occurrences=1, prob=0, multiplicity=1):
         """
         Initialises the case.
 
@@ -23,12 +23,35 @@ class Case:
         :param case_to: A string representing the to-part of the case.
         :param occurrences: The amount of times the case has occurred.
         :param prob: The probability value of this case.
+        :param multiplicity: The amount of times the case was generated for a single token.
         """
         self.type = case_type
         self.case_from = case_from
         self.case_to = case_to
         self.occurrences = occurrences
         self.prob = prob
+        self.multiplicity = multiplicity
+
+    def get_key(self):
+        """
+        Returns the (type, case_from, case_to) key identifying the case.
+
+        :return:
+        """
+        return self.type, self.case_from, self.case_to
+
+    def get_weight(self, tagger_config=None):
+        """
+        Returns how many times the case counts when written or looked up. This is its multiplicity if
+        duplicates are counted, as count_duplicate_cases of the config specifies, and 1 otherwise.
+
+        :param tagger_config: The TaggerConfig to use, defaults to the current config.
+        :return:
+        """
+        if tagger_config is None:
+            tagger_config = get_tagger_config()
+
+        return self.multiplicity if tagger_config.count_duplicate_cases else 1
 
     def get_case_types(self):
         """
@@ -104,14 +127,26 @@ class Cases:
 
     We have a specific data structure for the purpose of collection some
     utility methods in overriding classes.
+
+    The collection is an ordered set keyed by (type, case_from, case_to). Adding a case that is already
+    in the collection increments the multiplicity of the existing case instead.
     """
 
-    def __init__(self):
+    def __init__(self, tagger_config=None):
         """
         Constructor.
+
+        :param tagger_config: The TaggerConfig to create and merge the cases with, defaults to the current config.
         """
+        if tagger_config is None:
+            tagger_config = get_tagger_config()
+
+        self.tagger_config = tagger_config
         self.cases = []
+        self.case_index = {}
         self.max_occurrence_count = 0
+        # The (type, case_from) of the shorter n-gram every n-gram extends, by the key of the n-gram
+        self.parent_keys = {}
 
     def add_case(self, case_type, case_from, case_to, occurrences=1, prob=0):
         """
@@ -124,7 +159,73 @@ class Cases:
         :param prob: The probability of this case. Defined as occurrences / sum_{i in allcases}(occurrence_i)
         :return: void
         """
-        self.cases.append(Case(case_type, case_from, case_to, occurrences, prob))
+        existing = self.case_index.get((case_type, case_from, case_to))
+
+        if existing is not None:
+            existing.multiplicity += 1
+            return
+
+        case = Case(case_type, case_from, case_to, occurrences, prob)
+        self.case_index[case.get_key()] = case
+        self.cases.append(case)
+
+    def add_ngram_case(self, case_type, case_from, case_to, parent_from):
+        """
+        Adds an n-gram case, registering the shorter n-gram of the same type it extends.
+
+        :param case_type: The type of the case, an integer.
+        :param case_from: The 'from'-token of the case.
+        :param case_to: The 'to'-token of the case.
+        :param parent_from: The 'from'-token of the n-gram one shorter, or None if this is the shortest.
+        :return: void
+        """
+        parent_key = (case_type, parent_from) if parent_from is not None else None
+        self.parent_keys.setdefault((case_type, case_from), set()).add(parent_key)
+        self.add_case(case_type, case_from, case_to)
+
+    def prune_cases(self, key_filter):
+        """
+        Removes the cases whose (type, case_from) does not exist, resolving the cases level by level.
+
+        Training generates every n-gram of a token together with the shorter n-grams it extends, so an
+        n-gram can only exist if the n-gram one shorter exists. The cases without a shorter n-gram are
+        checked first, and then only the n-grams extending existing ones, one length at a time. Tuples
+        are created from the remaining cases afterwards, so tuples with a missing component are never
+        created either.
+
+        :param key_filter: A function taking a list of (type, case_from) keys and returning the ones that exist.
+        :return: void
+        """
+        level = []
+        children = {}
+        checked = set()
+        for case in self.cases:
+            key = (case.type, case.case_from)
+            if key in checked:
+                continue
+            checked.add(key)
+
+            for parent_key in self.parent_keys.get(key, (None,)):
+                if parent_key is None:
+                    level.append(key)
+                else:
+                    children.setdefault(parent_key, []).append(key)
+
+        existing = set()
+        checked = set(level)
+        while len(level) > 0:
+            found = key_filter(level)
+            existing.update(found)
+
+            level = []
+            for key in found:
+                for child_key in children.get(key, []):
+                    if child_key not in checked:
+                        checked.add(child_key)
+                        level.append(child_key)
+
+        self.cases = [case for case in self.cases if (case.type, case.case_from) in existing]
+        self.case_index = dict((case.get_key(), case) for case in self.cases)
 
     def add_all_cases(self, cases):
         """
@@ -139,14 +240,24 @@ class Cases:
     def add_case_from_obj(self, case):
         """
         Adds a case from an 'Case'-object. Will not clone the case, and may thus be externally overwritten.
+
+        If the case is already in the collection, its multiplicity is added to the existing case.
         :param case:
         :return:
         """
         assert isinstance(case, Case)
 
+        key = case.get_key()
+        existing = self.case_index.get(key)
+
+        if existing is not None:
+            existing.multiplicity += case.multiplicity
+            return
+
+        self.case_index[key] = case
         self.cases.append(case)
 
-    def create_tuple_cases(self):
+    def create_tuple_cases(self, static_cases=None):
         """
         This method will create tuple cases from the current cases.
 
@@ -164,23 +275,58 @@ class Cases:
 
         The maximum length of tuples that are generated can be configured.
 
+        The multiplicity of a tuple is how many times the tuple would have been generated from the duplicated
+        cases, see get_tuple_multiplicity. Unless tuples of the same type are ignored, a case with a multiplicity
+        of at least 2 is also combined with itself, like Arne@Arne.
+
+        If static cases are given, the current cases are the dynamic cases of the same token, and only
+        the tuples combining at least one of them with any of the static base cases are created. The
+        tuples of the static cases alone are already in the static cases. Unless tuples of the same type
+        are ignored, the tuples may join their cases in another order than when all cases are created at once.
+
+        :param static_cases: Optional Cases holding the static cases of the token.
         :return: void
         """
         # TODO: Filter and remove morpheme cases?
 
+        tagger_config = self.tagger_config
+        case_groups = tagger_config.case_groups
+
+        # The cases before tuples are added, which later tuples of dynamic cases are combined with
+        self.base_cases = list(self.cases)
+
+        # A case is in the same case-group as itself, so repeated cases are only combined if those tuples are kept
+        with_replacement = not tagger_config.ignore_tuples_of_same_type
+
         cases_to_be_added = []
-        for i in range(2, config['tuple_max_length']+1):
-            case_combinations = itertools.combinations(self.cases, i)
+        for i in range(2, tagger_config.tuple_max_length+1):
+            if static_cases is None:
+                if with_replacement:
+                    case_combinations = itertools.combinations_with_replacement(self.cases, i)
+                else:
+                    case_combinations = itertools.combinations(self.cases, i)
+            else:
+                case_combinations = Cases.get_mixed_combinations(static_cases.base_cases, self.base_cases, i,
+                                                                 with_replacement)
 
             for case_tuple in case_combinations:
                 # We don't create tuple-cases if the cases are in the same case-group.
                 # This is primarily to avoid creating a lot of ngram-tuples
                 # which yield no additional information when combined.
-                if config['ignore_tuples_of_same_type']:
+                if tagger_config.ignore_tuples_of_same_type:
                     # This somewhat ugly "if" simply says that if either of the cases share case_group...
-                    if len(set(map(lambda x: config['case_groups'][str(x.type)], case_tuple))) < len(case_tuple):
+                    if len(set(map(lambda x: case_groups[x.type], case_tuple))) < len(case_tuple):
                         continue
 
+                if with_replacement:
+                    multiplicity = Cases.get_tuple_multiplicity(case_tuple)
+
+                    if multiplicity == 0:
+                        # The tuple repeats a case more times than it was generated
+                        continue
+                else:
+                    multiplicity = reduce(lambda x, y: x * y.multiplicity, case_tuple, 1)
+
                 cases = sorted(case_tuple, key=lambda x: x.type)
 
                 cases_type = reduce(lambda x, y: x | y.type, cases, 0)
@@ -188,10 +334,53 @@ class Cases:
                 cases_to = case_tuple[0].case_to
 
                 # Note that case_to will be the same for all tuples
-                cases_to_be_added.append(Case(cases_type, cases_from, cases_to))
+                cases_to_be_added.append(Case(cases_type, cases_from, cases_to, multiplicity=multiplicity))
 
         self.add_all_cases(cases_to_be_added)
 
+    @staticmethod
+    def get_mixed_combinations(static_cases, dynamic_cases, length, with_replacement=False):
+        """
+        Generates the combinations of a given length of static and dynamic cases, which hold at least
+        one dynamic case.
+
+        :param static_cases: A list of cases.
+        :param dynamic_cases: A list of cases.
+        :param length: The length of the combinations.
+        :param with_replacement: Whether a case may be repeated within a combination.
+        :return: A generator of tuples of cases.
+        """
+        combinations = itertools.combinations_with_replacement if with_replacement else itertools.combinations
+
+        for dynamic_length in range(1, length+1):
+            for dynamic_combination in combinations(dynamic_cases, dynamic_length):
+                for static_combination in combinations(static_cases, length - dynamic_length):
+                    yield static_combination + dynamic_combination
+
+    @staticmethod
+    def get_tuple_multiplicity(case_tuple):
+        """
+        Returns how many times a tuple would have been generated from the duplicated cases it combines. A case
+        of multiplicity m repeated k times in the tuple can be picked in (m choose k) ways, which is 0 if the
+        case was generated less than k times.
+
+        :param case_tuple: A tuple of cases, where a case may be repeated.
+        :return: The product of the ways each case can be picked.
+        """
+        repeats = {}
+        for case in case_tuple:
+            repeats[id(case)] = repeats.get(id(case), 0) + 1
+
+        multiplicity = 1
+        for case in case_tuple:
+            repeat = repeats.pop(id(case), 0)
+
+            # (m choose k), computed incrementally to keep it an integer
+            for k in range(repeat):
+                multiplicity = multiplicity * (case.multiplicity - k) // (k + 1)
+
+        return multiplicity
+
     def __iter__(self):
         """
         Iterates the cases of this Cases object.
@@ -206,7 +395,7 @@ class Cases:
         """
         return len(self.cases)
 
-    def merge(self):
+    def merge(self, tagger_config=None):
         """
         This is the 'magic-method' of the algorithm.
 
@@ -218,25 +407,29 @@ class Cases:
             2. We have n cases we want to merge.
             3. The the most likely
 
+        :param tagger_config: The TaggerConfig to merge with, defaults to the one of the cases.
         :return: The most promising case.
         """
+        if tagger_config is None:
+            tagger_config = self.tagger_config
 
         merged_cases = self.cases
+        case_mappings = tagger_config.case_mappings
 
         # First check if we have a mapping
         for case in merged_cases:
             key = "%d%s" % (case.type, case.case_from)
-            if key in config['case_mappings']:
-                return config['case_mappings'][key]
+            if key in case_mappings:
+                return case_mappings[key]
 
-        Cases.adjust_individual_probabilities(merged_cases)
+        Cases.adjust_individual_probabilities(merged_cases, tagger_config)
         debug("Before merging:")
         debug_print_cases(merged_cases)
         debug("\n\n")
         if len(self.cases) == 0:
             return ""
 
-        merged_cases = Cases.combine_similar_cases(merged_cases)
+        merged_cases = Cases.combine_similar_cases(merged_cases, tagger_config)
         debug("After merging:")
         debug_print_cases(merged_cases)
         debug("\n\n")
@@ -254,7 +447,7 @@ class Cases:
         return best_case.case_to
 
     @staticmethod
-    def combine_similar_cases(cases):
+    def combine_similar_cases(cases, tagger_config=None):
         """
         Takes a set of cases and combines the ones which are predicting the same
         outcome. Their probability is merged simply by calculating 1 minus the probability
@@ -262,9 +455,15 @@ class Cases:
 
         1 - (prod_{case in cases}(1 - case.prob))
 
+        A case counts as many times as its weight.
+
         :param cases: A set of unique to_cases with their calculated probabilities.
+        :param tagger_config: The TaggerConfig to use, defaults to the current config.
         :return:
         """
+        if tagger_config is None:
+            tagger_config = get_tagger_config()
+
         combined_cases = []
 
         combined_case_dict = {}
@@ -276,30 +475,36 @@ class Cases:
             prob = 1
             occurrences = 0
             for case in cases:
-                prob *= (1-case.prob)
-                occurrences += case.occurrences
+                weight = case.get_weight(tagger_config)
+                prob *= (1-case.prob) ** weight
+                occurrences += case.occurrences * weight
 
             cases[0].prob = 1 - prob
             cases[0].occurrences = occurrences
+            cases[0].multiplicity = 1
             cases[0].case_from = ""
             combined_cases.append(cases[0])
 
         return combined_cases
 
     @staticmethod
-    def adjust_individual_probabilities(cases):
+    def adjust_individual_probabilities(cases, tagger_config=None):
         """
         This method adjusts the probabilities of cases. The adjustment is
         done in accordance with the importance of each case, as defined in
         the config.
 
         :param cases:
+        :param tagger_config: The TaggerConfig to use, defaults to the current config.
         :return:
         """
+        if tagger_config is None:
+            tagger_config = get_tagger_config()
+
         for case in cases:
-            case.prob = Cases.adjust_importance(case.prob, case)
-            case.prob = Cases.adjust_case_from_importance(case.prob, case)
-            case.prob = Cases.adjust_full_case_importance(case.prob, case)
+            case.prob = Cases.adjust_importance(case.prob, case, tagger_config)
+            case.prob = Cases.adjust_case_from_importance(case.prob, case, tagger_config)
+            case.prob = Cases.adjust_full_case_importance(case.prob, case, tagger_config)
             case.prob = Cases.adjust_from_case_complexity(case.prob, case.case_from)
 
     @staticmethod
@@ -356,7 +561,7 @@ class Cases:
         return 1 - temp_prob
 
     @staticmethod
-    def adjust_importance(probability, case):
+    def adjust_importance(probability, case, tagger_config=None):
         """
         Adjust a cases importance from its importance as specified in the config.
 
@@ -364,45 +569,61 @@ class Cases:
 
         :param probability: The probability to adjust.
         :param case_from: The case to find the complexity of.
+        :param tagger_config: The TaggerConfig to use, defaults to the current config.
         :return: New probability
         """
-        case_types = case.get_case_types()
-        importances = list(map(lambda _case_type: config['case_importance'][str(_case_type)], case_types))
-        if len(importances) == 0:
+        if tagger_config is None:
+            tagger_config = get_tagger_config()
+
+        importance = tagger_config.get_importance(case.type)
+        if importance is None:
             return probability
-        importance = sum(importances) / len(importances)
 
         return importance * probability
 
     @staticmethod
-    def adjust_case_from_importance(probability, case):
+    def adjust_case_from_importance(probability, case, tagger_config=None):
         """
         Adjusts a case by an importance of its (type, case_from), if such an adjustment exists.
 
         :param probability: The existing probability for the case.
         :param case: The case object.
+        :param tagger_config: The TaggerConfig to use, defaults to the current config.
         :return:
         """
+        if tagger_config is None:
+            tagger_config = get_tagger_config()
+
+        if len(tagger_config.case_from_adjustments) == 0:
+            return probability
+
         key = u"%d%s" % (case.type, case.case_from)
 
-        if key in config['case_from_adjustments']:
-            importance = config['case_from_adjustment']
+        if key in tagger_config.case_from_adjustments:
+            importance = tagger_config.case_from_adjustments[key]
             return probability * standard_0_to_1000_factor_scale(importance)
         return probability
 
     @staticmethod
-    def adjust_full_case_importance(probablity, case):
+    def adjust_full_case_importance(probablity, case, tagger_config=None):
         """
         Adjusts a case by an importance of the full case input, if such an adjustment exists.
 
         :param probability: The existing probability for the case.
         :param case: The case object.
+        :param tagger_config: The TaggerConfig to use, defaults to the current config.
         :return:
         """
+        if tagger_config is None:
+            tagger_config = get_tagger_config()
+
+        if len(tagger_config.case_full_adjustments) == 0:
+            return probablity
+
         key = u"%d%s%s" % (case.type, case.case_from, case.case_to)
 
-        if key in config['case_full_adjustments']:
-            importance = config['case_from_adjustment']
+        if key in tagger_config.case_full_adjustments:
+            importance = tagger_config.case_full_adjustments[key]
             return probablity * standard_0_to_1000_factor_scale(importance)
         return probablity
 
@@ -436,52 +657,73 @@ class WordCases(Cases):
     for adding word-specific cases.
     """
 
-    def __init__(self, word, phrase):
+    def __init__(self, word, phrase, static_only=False, static_cases=None, tagger_config=None, key_filter=None):
         """
         Creates the word-cases object.
 
         This constructor initialises all relevant cases for the WordCases object.
 
+        The cases are either static, only depending on the word- and morpheme-forms, or dynamic, depending on
+        the POS-tags and glosses, which change while tagging. The static and dynamic cases can be created
+        separately, so the static ones only have to be created once per word.
+
         :param word: The word to get the cases for.
         :param phrase: The surrounding phrase.
+        :param static_only: Only create the static cases, and the tuples of these.
+        :param static_cases: The static cases of the word. If given, only the dynamic cases are created,
+            and the tuples involving them.
+        :param tagger_config: The TaggerConfig to create the cases with, defaults to the current config.
+        :param key_filter: Optional function returning which of a list of (type, case_from) keys exist. If given,
+            the cases are pruned with it before the tuples are created, see prune_cases.
         """
 
-        Cases.__init__(self)
+        Cases.__init__(self, tagger_config)
+        tagger_config = self.tagger_config
         if not isinstance(phrase, Phrase):
             raise Exception("Invalid argument to WordCases.__init__, expected Phrase as second argument")
 
         word_index = phrase.words.index(word)
         pos = word.pos
 
-        morphemes = []
+        add_static = static_cases is None
+        add_dynamic = not static_only
 
-        self.add_case(config['case_type_pos_word'], word.word.lower(), pos)
+        if add_static:
+            self.add_case(tagger_config.case_type_pos_word, word.word.lower(), pos)
 
         if len(word.morphemes) > 0:
             for morpheme in word.morphemes:
-                if not is_empty_ignore(morpheme.morpheme):
-                    self.add_case(config['case_type_pos_morpheme'], morpheme.morpheme.lower(), pos)
-                    for gloss in morpheme.glosses:
-                        self.add_case(config['case_type_pos_gloss'], gloss, pos)
+                if not is_empty_ignore(morpheme.morpheme, tagger_config):
+                    if add_static:
+                        self.add_case(tagger_config.case_type_pos_morpheme, morpheme.morpheme.lower(), pos)
+                    if add_dynamic:
+                        for gloss in morpheme.glosses:
+                            self.add_case(tagger_config.case_type_pos_gloss, gloss, pos)
 
-        if config['register_ngrams']:
-            self.add_word_surrounding_ngram_cases(word_index, phrase, pos)
+        if tagger_config.register_ngrams:
+            self.add_word_surrounding_ngram_cases(word_index, phrase, pos, add_static, add_dynamic)
 
-        self.create_tuple_cases()
+        if key_filter is not None:
+            self.prune_cases(key_filter)
 
-    def add_word_surrounding_ngram_cases(self, word_index, phrase, pos_to):
+        self.create_tuple_cases(static_cases)
+
+    def add_word_surrounding_ngram_cases(self, word_index, phrase, pos_to, add_words=True, add_poses=True):
         """
         Adds the internal word n-gram cases of the phrase/word.
 
         :param word_index:
         :param phrase:
         :param pos_to:
+        :param add_words: Whether to add the n-grams of the words.
+        :param add_poses: Whether to add the n-grams of the POS-tags.
         :return:
         """
         if len(phrase.words) <= 1:
             return
 
-        max_length = config['surrounding_ngram_max_length']+1
+        tagger_config = self.tagger_config
+        max_length = tagger_config.surrounding_ngram_max_length+1
         prefix_ngrams = get_all_prefix_sublists_upto_length(phrase.words,
                                                             word_index,
                                                             max_length)
@@ -500,69 +742,98 @@ class WordCases(Cases):
                                                                   max_length,
                                                                   filler=[filler])
 
+        word_parent, pos_parent = None, None
         for ngram in prefix_ngrams:
-            self.add_case(config['case_type_pos_prefix_ngram'],
-                          "|".join(map(lambda word: word.word if word.word is not None else "", ngram)),
-                          pos_to)
-            self.add_case(config['case_type_pos_prefix_ngram'],
-                          "|".join(map(lambda word: word.pos if word.pos is not None else "", ngram)),
-                          pos_to)
-
+            word_ngram = "|".join(map(lambda word: word.word if word.word is not None else "", ngram))
+            pos_ngram = "|".join(map(lambda word: word.pos if word.pos is not None else "", ngram))
+            if add_words:
+                self.add_ngram_case(tagger_config.case_type_pos_prefix_ngram, word_ngram, pos_to, word_parent)
+            if add_poses:
+                self.add_ngram_case(tagger_config.case_type_pos_prefix_ngram, pos_ngram, pos_to, pos_parent)
+            word_parent, pos_parent = word_ngram, pos_ngram
+
+        word_parent, pos_parent = None, None
         for ngram in suffix_ngrams:
-            self.add_case(config['case_type_pos_suffix_ngram'],
-                          "|".join(map(lambda word: word.word if word.word is not None else "", ngram)),
-                          pos_to)
-            self.add_case(config['case_type_pos_suffix_ngram'],
-                          "|".join(map(lambda word: word.pos if word.pos is not None else "", ngram)),
-                          pos_to)
-
+            word_ngram = "|".join(map(lambda word: word.word if word.word is not None else "", ngram))
+            pos_ngram = "|".join(map(lambda word: word.pos if word.pos is not None else "", ngram))
+            if add_words:
+                self.add_ngram_case(tagger_config.case_type_pos_suffix_ngram, word_ngram, pos_to, word_parent)
+            if add_poses:
+                self.add_ngram_case(tagger_config.case_type_pos_suffix_ngram, pos_ngram, pos_to, pos_parent)
+            word_parent, pos_parent = word_ngram, pos_ngram
+
+        word_parent, pos_parent = None, None
         for ngram in surrounding_ngrams:
-            self.add_case(config['case_type_pos_surrounding_ngram'],
-                          "|".join(map(lambda word: word.word if word.word is not None else "", ngram)),
-                          pos_to)
-            self.add_case(config['case_type_pos_surrounding_ngram'],
-                          "|".join(map(lambda word: word.pos if word.pos is not None else "", ngram)),
-                          pos_to)
+            word_ngram = "|".join(map(lambda word: word.word if word.word is not None else "", ngram))
+            pos_ngram = "|".join(map(lambda word: word.pos if word.pos is not None else "", ngram))
+            if add_words:
+                self.add_ngram_case(tagger_config.case_type_pos_surrounding_ngram, word_ngram, pos_to, word_parent)
+            if add_poses:
+                self.add_ngram_case(tagger_config.case_type_pos_surrounding_ngram, pos_ngram, pos_to, pos_parent)
+            word_parent, pos_parent = word_ngram, pos_ngram
 
 
 class MorphemeCases(Cases):
-    def __init__(self, morpheme, word, phrase):
+    def __init__(self, morpheme, word, phrase, static_only=False, static_cases=None, tagger_config=None,
+                 key_filter=None):
         """
         Creates the MorphemeTargetCases object, registering all valid cases.
 
+        The static and dynamic cases can be created separately, like for WordCases.
+
         :param morpheme:
         :param word:
         :param phrase:
-        """
-        Cases.__init__(self)
+        :param static_only: Only create the static cases, and the tuples of these.
+        :param static_cases: The static cases of the morpheme. If given, only the dynamic cases are created,
+            and the tuples involving them.
+        :param tagger_config: The TaggerConfig to create the cases with, defaults to the current config.
+        :param key_filter: Optional function returning which of a list of (type, case_from) keys exist. If given,
+            the cases are pruned with it before the tuples are created, see prune_cases.
+        """
+        Cases.__init__(self, tagger_config)
+        tagger_config = self.tagger_config
         morpheme_index = word.morphemes.index(morpheme)
 
         # Case variables
         gloss = get_glosses_concatenated(morpheme)
         word_index = phrase.words.index(word)
 
-        self.add_case(config['case_type_gloss_morph'], morpheme.morpheme.lower(), gloss)
-        self.add_case(config['case_type_gloss_word'], morpheme.morpheme.lower(), gloss)
-        self.add_case(config['case_type_gloss_pos'], word.pos, gloss)
+        add_static = static_cases is None
+        add_dynamic = not static_only
 
-        if config['register_ngrams']:
-            self.add_surrounding_morpheme_ngram_cases(morpheme_index, word.morphemes, gloss)
+        if add_static:
+            self.add_case(tagger_config.case_type_gloss_morph, morpheme.morpheme.lower(), gloss)
+            self.add_case(tagger_config.case_type_gloss_word, morpheme.morpheme.lower(), gloss)
+        if add_dynamic:
+            self.add_case(tagger_config.case_type_gloss_pos, word.pos, gloss)
+
+        if tagger_config.register_ngrams:
+            self.add_surrounding_morpheme_ngram_cases(morpheme_index, word.morphemes, gloss, add_static, add_dynamic)
             # self.add_surrounding_word_ngram_cases(word_index, phrase.words, gloss)
-        self.create_tuple_cases()
 
-    def add_surrounding_morpheme_ngram_cases(self, morpheme_index, morphemes, gloss_to):
+        if key_filter is not None:
+            self.prune_cases(key_filter)
+
+        self.create_tuple_cases(static_cases)
+
+    def add_surrounding_morpheme_ngram_cases(self, morpheme_index, morphemes, gloss_to, add_morphs=True,
+                                             add_glosses=True):
         """
         Adds the surrounding morph and gloss n-grams of a given morpheme.
 
         :param morpheme_index:
         :param morphemes:
         :param gloss_to:
+        :param add_morphs: Whether to add the n-grams of the morphs.
+        :param add_glosses: Whether to add the n-grams of the glosses.
         :return:
         """
         if len(morphemes) <= 1:
             return
 
-        max_length = config['surrounding_ngram_max_length']+1
+        tagger_config = self.tagger_config
+        max_length = tagger_config.surrounding_ngram_max_length+1
         prefix_ngrams = get_all_prefix_sublists_upto_length(morphemes,
                                                             morpheme_index,
                                                             max_length)
@@ -581,29 +852,37 @@ class MorphemeCases(Cases):
                                                                   max_length,
                                                                   filler=[filler])
 
+        morph_parent, gloss_parent = None, None
         for ngram in prefix_ngrams:
-            self.add_case(config['case_type_gloss_prefix_ngram'],
-                          "|".join(map(lambda morpheme: morpheme.morpheme if morpheme.morpheme is not None else "", ngram)),
-                          gloss_to)
-            self.add_case(config['case_type_gloss_prefix_ngram'],
-                          "|".join(map(lambda morpheme: get_glosses_concatenated(morpheme), ngram)),
-                          gloss_to)
-
+            morph_ngram = "|".join(map(lambda morpheme: morpheme.morpheme if morpheme.morpheme is not None else "", ngram))
+            gloss_ngram = "|".join(map(lambda morpheme: get_glosses_concatenated(morpheme), ngram))
+            if add_morphs:
+                self.add_ngram_case(tagger_config.case_type_gloss_prefix_ngram, morph_ngram, gloss_to, morph_parent)
+            if add_glosses:
+                self.add_ngram_case(tagger_config.case_type_gloss_prefix_ngram, gloss_ngram, gloss_to, gloss_parent)
+            morph_parent, gloss_parent = morph_ngram, gloss_ngram
+
+        morph_parent, gloss_parent = None, None
         for ngram in suffix_ngrams:
-            self.add_case(config['case_type_gloss_suffix_ngram'],
-                          "|".join(map(lambda morpheme: morpheme.morpheme if morpheme.morpheme is not None else "", ngram)),
-                          gloss_to)
-            self.add_case(config['case_type_gloss_suffix_ngram'],
-                          "|".join(map(lambda morpheme: get_glosses_concatenated(morpheme), ngram)),
-                          gloss_to)
-
+            morph_ngram = "|".join(map(lambda morpheme: morpheme.morpheme if morpheme.morpheme is not None else "", ngram))
+            gloss_ngram = "|".join(map(lambda morpheme: get_glosses_concatenated(morpheme), ngram))
+            if add_morphs:
+                self.add_ngram_case(tagger_config.case_type_gloss_suffix_ngram, morph_ngram, gloss_to, morph_parent)
+            if add_glosses:
+                self.add_ngram_case(tagger_config.case_type_gloss_suffix_ngram, gloss_ngram, gloss_to, gloss_parent)
+            morph_parent, gloss_parent = morph_ngram, gloss_ngram
+
+        morph_parent, gloss_parent = None, None
         for ngram in surrounding_ngrams:
-            self.add_case(config['case_type_gloss_surrounding_ngram'],
-                          "|".join(map(lambda morpheme: morpheme.morpheme if morpheme.morpheme is not None else "", ngram)),
-                          gloss_to)
-            self.add_case(config['case_type_gloss_surrounding_ngram'],
-                          "|".join(map(lambda morpheme: get_glosses_concatenated(morpheme), ngram)),
-                          gloss_to)
+            morph_ngram = "|".join(map(lambda morpheme: morpheme.morpheme if morpheme.morpheme is not None else "", ngram))
+            gloss_ngram = "|".join(map(lambda morpheme: get_glosses_concatenated(morpheme), ngram))
+            if add_morphs:
+                self.add_ngram_case(tagger_config.case_type_gloss_surrounding_ngram, morph_ngram, gloss_to,
+                                    morph_parent)
+            if add_glosses:
+                self.add_ngram_case(tagger_config.case_type_gloss_surrounding_ngram, gloss_ngram, gloss_to,
+                                    gloss_parent)
+            morph_parent, gloss_parent = morph_ngram, gloss_ngram
 
     def add_surrounding_word_ngram_cases(self, word_index, words, gloss_to):
         """
@@ -616,16 +895,20 @@ class MorphemeCases(Cases):
         """
         if len(words) <= 1:
             return
-        for i in range(2, config['surrounding_ngram_max_length']+1):
+        tagger_config = self.tagger_config
+        for i in range(2, tagger_config.surrounding_ngram_max_length+1):
             ngrams_of_length_i = get_consecutive_sublists_of_length_around_index(words, word_index, i)
             for ngram in ngrams_of_length_i:
-                self.add_case(config['case_type_gloss_surrounding_ngram'],
+                self.add_case(tagger_config.case_type_gloss_surrounding_ngram,
                               "".join(map(lambda word: word.word if word.word is not None else "", ngram)),
                               gloss_to)
-                self.add_case(config['case_type_gloss_surrounding_ngram'],
+                self.add_case(tagger_config.case_type_gloss_surrounding_ngram,
                               "".join(map(lambda word: word.pos if word.pos is not None else "", ngram)),
                               gloss_to)
 
 
-def is_empty_ignore(content):
-    return content is None or (config['ignore_empty_from_cases'] and content == "")
+def is_empty_ignore(content, tagger_config=None):
+    if tagger_config is None:
+        tagger_config = get_tagger_config()
+
+    return content is None or (tagger_config.ignore_empty_from_cases and content == "")
@@ -0,0 +1,459 @@
+import hashlib
+import mmap
+import struct
+
+from casetagger.bloom import create_bloom_key
+from casetagger.config import config
+from casetagger.models import Case, CaseFromCounter
+
+"""
+Magic bytes and version written at the start of every packed model.
+"""
+PACKED_MAGIC = b'CTPK'
+PACKED_VERSION = 2
+
+"""
+The header holds the magic, the version, the number of strings, the number of keys, and the offsets
+of the string-offset table, the string data, the key array and the postings region. NULL strings are stored
+as an id after the string table, see get_null_string_id.
+
+Version 2 adds the offset of the hash index after the version 1 header. Both hold flags after the version, which
+files written before the flags existed pad with zeros, see PACKED_FLAG_INCOMPLETE.
+"""
+PACKED_HEADER = struct.Struct('<4sHHIIIIII')
+PACKED_HEADER_V2 = struct.Struct('<4sHHIIIIIII')
+
+"""
+Flag of a packed model exported from a db that rare cases were removed from, see DbHandler.is_complete.
+"""
+PACKED_FLAG_INCOMPLETE = 1
+
+"""
+A single entry of the sorted key array: type, case_from string id and postings offset.
+"""
+PACKED_KEY = struct.Struct('<III')
+
+PACKED_STRING_OFFSET = struct.Struct('<I')
+
+"""
+A single entry of the hash index: the 64 bit hash of a (type, case_from) key and the index of the key.
+"""
+PACKED_HASH_ENTRY = struct.Struct('<QI')
+
+
+def hash_packed_key(case_type, case_from):
+    """
+    Hashes a (type, case_from) key to a 64 bit integer.
+
+    :param case_type:
+    :param case_from:
+    :return:
+    """
+    return struct.unpack('<Q', hashlib.md5(create_bloom_key(case_type, case_from)).digest()[:8])[0]
+
+
+def get_null_string_id(num_strings):
+    """
+    Returns the string id NULL is stored as, which is the id after the last string of the string table.
+
+    :param num_strings: The number of strings in the string table.
+    :return:
+    """
+    return num_strings
+
+
+def encode_varint(value, buf):
+    """
+    Appends an unsigned LEB128-encoded integer to a bytearray.
+
+    :param value: A non-negative integer.
+    :param buf: The bytearray to append to.
+    :return: void
+    """
+    while value >= 0x80:
+        buf.append((value & 0x7f) | 0x80)
+        value >>= 7
+    buf.append(value)
+
+
+def decode_varint(buf, pos):
+    """
+    Decodes an unsigned LEB128-encoded integer from a bytearray.
+
+    :param buf: The bytearray.
+    :param pos: The position to start decoding at.
+    :return: A tuple of the value and the position after it.
+    """
+    value = 0
+    shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def write_packed_model(path, cases, case_counters, complete=True):
+    """
+    Writes cases and from-counters to a packed model file.
+
+    The file consists of a header, a sorted string table, a key array sorted by (type, case_from),
+    a postings region holding the varint-encoded counter and (case_to, occurrences) pairs of each key,
+    and a hash index of the keys sorted by hash.
+
+    :param path: The path of the file to write.
+    :param cases: An iterable of Case objects.
+    :param case_counters: An iterable of CaseFromCounter objects.
+    :param complete: Whether the cases hold every key training generated, see DbHandler.is_complete.
+    :return: void
+    """
+    postings = {}
+    counters = {}
+
+    for case in cases:
+        postings.setdefault((case.type, case.case_from), []).append((case.case_to, case.occurrences))
+
+    for case_counter in case_counters:
+        counters[(case_counter.type, case_counter.case_from)] = case_counter.occurrences
+
+    keys = set(postings.keys()) | set(counters.keys())
+
+    strings = set()
+    for case_type, case_from in keys:
+        strings.add(case_from)
+    for key_postings in postings.values():
+        for case_to, _ in key_postings:
+            strings.add(case_to)
+    strings.discard(None)
+
+    # Strings are sorted by their encoded bytes, so the ids preserve the order we search in
+    encoded_strings = sorted(set(string.encode('utf8') for string in strings))
+    string_ids = dict((string.decode('utf8'), i) for i, string in enumerate(encoded_strings))
+    string_ids[None] = get_null_string_id(len(encoded_strings))
+
+    string_offsets = bytearray()
+    offset = 0
+    for string in encoded_strings:
+        string_offsets.extend(PACKED_STRING_OFFSET.pack(offset))
+        offset += len(string)
+    string_offsets.extend(PACKED_STRING_OFFSET.pack(offset))
+    string_data = b''.join(encoded_strings)
+
+    sorted_keys = sorted(keys, key=lambda key: (key[0], string_ids[key[1]]))
+
+    key_array = bytearray()
+    postings_data = bytearray()
+    for case_type, case_from in sorted_keys:
+        key_postings = sorted((string_ids[case_to], occurrences)
+                              for case_to, occurrences in postings.get((case_type, case_from), []))
+
+        # A key without a counter gets the sum of its cases, which is what training would have counted
+        counter = counters.get((case_type, case_from), sum(occurrences for _, occurrences in key_postings))
+
+        key_array.extend(PACKED_KEY.pack(case_type, string_ids[case_from], len(postings_data)))
+        encode_varint(counter, postings_data)
+        encode_varint(len(key_postings), postings_data)
+        for case_to_id, occurrences in key_postings:
+            encode_varint(case_to_id, postings_data)
+            encode_varint(occurrences, postings_data)
+
+    hash_index = bytearray()
+    for key_hash, index in sorted((hash_packed_key(case_type, case_from), index)
+                                  for index, (case_type, case_from) in enumerate(sorted_keys)):
+        hash_index.extend(PACKED_HASH_ENTRY.pack(key_hash, index))
+
+    string_offsets_offset = PACKED_HEADER_V2.size
+    string_data_offset = string_offsets_offset + len(string_offsets)
+    keys_offset = string_data_offset + len(string_data)
+    postings_offset = keys_offset + len(key_array)
+    hash_index_offset = postings_offset + len(postings_data)
+
+    with open(path, 'wb') as packed_file:
+        packed_file.write(PACKED_HEADER_V2.pack(PACKED_MAGIC,
+                                                PACKED_VERSION,
+                                                0 if complete else PACKED_FLAG_INCOMPLETE,
+                                                len(encoded_strings),
+                                                len(sorted_keys),
+                                                string_offsets_offset,
+                                                string_data_offset,
+                                                keys_offset,
+                                                postings_offset,
+                                                hash_index_offset))
+        packed_file.write(bytes(string_offsets))
+        packed_file.write(string_data)
+        packed_file.write(bytes(key_array))
+        packed_file.write(bytes(postings_data))
+        packed_file.write(bytes(hash_index))
+
+
+class PackedModel(object):
+    """
+    Read-only view of a packed model file.
+
+    The file is memory-mapped, and lookups search it in place without deserializing it. Files of version 2
+    are searched by interpolation search in the hash index, version 1 files by binary search in the string
+    table and key array.
+    """
+
+    def __init__(self, path):
+        """
+        Opens and maps a packed model.
+
+        :param path: The path of a file written by write_packed_model.
+        """
+        self.path = path
+        self.file = open(path, 'rb')
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, flags, self.num_strings, self.num_keys, self.string_offsets_offset, \
+            self.string_data_offset, self.keys_offset, self.postings_offset = PACKED_HEADER.unpack_from(self.mm, 0)
+
+        if magic != PACKED_MAGIC or version not in (1, PACKED_VERSION):
+            raise Exception("Invalid packed model file " + path)
+
+        self.version = version
+        self.complete = not flags & PACKED_FLAG_INCOMPLETE
+        self.null_string_id = get_null_string_id(self.num_strings)
+        self.hash_index_offset = None
+        self.postings_end = len(self.mm)
+
+        if version >= 2:
+            self.hash_index_offset = PACKED_HEADER_V2.unpack_from(self.mm, 0)[-1]
+            self.postings_end = self.hash_index_offset
+
+    def close(self):
+        self.mm.close()
+        self.file.close()
+
+    def _string_bytes(self, string_id):
+        if string_id == self.null_string_id:
+            return None
+
+        start, end = struct.unpack_from('<II', self.mm,
+                                        self.string_offsets_offset + string_id * PACKED_STRING_OFFSET.size)
+        return self.mm[self.string_data_offset + start:self.string_data_offset + end]
+
+    def _string(self, string_id):
+        if string_id == self.null_string_id:
+            return None
+
+        return self._string_bytes(string_id).decode('utf8')
+
+    def _find_string(self, string):
+        """
+        Binary searches the string table.
+
+        :param string: The string to find.
+        :return: The id of the string, or None.
+        """
+        if string is None:
+            return None
+
+        encoded = string.encode('utf8')
+        low, high = 0, self.num_strings
+        while low < high:
+            mid = (low + high) // 2
+            if self._string_bytes(mid) < encoded:
+                low = mid + 1
+            else:
+                high = mid
+
+        if low < self.num_strings and self._string_bytes(low) == encoded:
+            return low
+        return None
+
+    def _key(self, index):
+        return PACKED_KEY.unpack_from(self.mm, self.keys_offset + index * PACKED_KEY.size)
+
+    def _hash_entry(self, position):
+        return PACKED_HASH_ENTRY.unpack_from(self.mm, self.hash_index_offset + position * PACKED_HASH_ENTRY.size)
+
+    def _find_key_by_hash(self, case_type, case_from):
+        """
+        Interpolation searches the hash index, and verifies the keys with a matching hash.
+
+        :param case_type:
+        :param case_from:
+        :return: The index of the key, or None.
+        """
+        if self.num_keys == 0 or case_from is None:
+            return None
+
+        target = hash_packed_key(case_type, case_from)
+        low, high = 0, self.num_keys - 1
+        low_hash, high_hash = self._hash_entry(low)[0], self._hash_entry(high)[0]
+
+        position = None
+        while low <= high and low_hash <= target <= high_hash:
+            if high_hash == low_hash:
+                mid = low
+            else:
+                mid = low + (target - low_hash) * (high - low) // (high_hash - low_hash)
+
+            mid_hash = self._hash_entry(mid)[0]
+            if mid_hash < target:
+                low = mid + 1
+                if low <= high:
+                    low_hash = self._hash_entry(low)[0]
+            elif mid_hash > target:
+                high = mid - 1
+                if low <= high:
+                    high_hash = self._hash_entry(high)[0]
+            else:
+                position = mid
+                break
+
+        if position is None:
+            return None
+
+        # Several keys may share a hash, so we check all of them
+        while position > 0 and self._hash_entry(position - 1)[0] == target:
+            position -= 1
+
+        encoded = case_from.encode('utf8')
+        while position < self.num_keys:
+            key_hash, index = self._hash_entry(position)
+            if key_hash != target:
+                break
+
+            key_type, from_id, _ = self._key(index)
+            if key_type == case_type and self._string_bytes(from_id) == encoded:
+                return index
+            position += 1
+
+        return None
+
+    def _find_key(self, case_type, case_from):
+        """
+        Finds the index of a key, using the hash index if the file has one and
+        binary searching the key array otherwise.
+
+        :param case_type:
+        :param case_from:
+        :return: The index of the key, or None.
+        """
+        if self.hash_index_offset is not None:
+            return self._find_key_by_hash(case_type, case_from)
+
+        from_id = self._find_string(case_from)
+        if from_id is None:
+            return None
+
+        target = (case_type, from_id)
+        low, high = 0, self.num_keys
+        while low < high:
+            mid = (low + high) // 2
+            if self._key(mid)[:2] < target:
+                low = mid + 1
+            else:
+                high = mid
+
+        if low < self.num_keys and self._key(low)[:2] == target:
+            return low
+        return None
+
+    def _postings(self, index):
+        """
+        Decodes the postings of a key.
+
+        :param index: The index of the key.
+        :return: A tuple of the counter occurrences and a list of (case_to id, occurrences).
+        """
+        start = self.postings_offset + self._key(index)[2]
+        if index + 1 < self.num_keys:
+            end = self.postings_offset + self._key(index + 1)[2]
+        else:
+            end = self.postings_end
+
+        buf = bytearray(self.mm[start:end])
+        counter, pos = decode_varint(buf, 0)
+        count, pos = decode_varint(buf, pos)
+
+        postings = []
+        for _ in range(count):
+            case_to_id, pos = decode_varint(buf, pos)
+            occurrences, pos = decode_varint(buf, pos)
+            postings.append((case_to_id, occurrences))
+
+        return counter, postings
+
+    def get_cases_by_from(self, case_type, case_from):
+        index = self._find_key(case_type, case_from)
+        if index is None:
+            return []
+
+        _, postings = self._postings(index)
+        return [Case(case_type, case_from, self._string(case_to_id), occurrences)
+                for case_to_id, occurrences in postings]
+
+    def get_case_counter(self, case_type, case_from):
+        index = self._find_key(case_type, case_from)
+        if index is None:
+            return None
+
+        counter, _ = self._postings(index)
+        return CaseFromCounter(case_type, case_from, counter)
+
+    def get_all_cases(self):
+        for index in range(self.num_keys):
+            case_type, from_id, _ = self._key(index)
+            case_from = self._string(from_id)
+            _, postings = self._postings(index)
+
+            for case_to_id, occurrences in postings:
+                yield Case(case_type, case_from, self._string(case_to_id), occurrences)
+
+    def get_all_case_counters(self):
+        for index in range(self.num_keys):
+            case_type, from_id, _ = self._key(index)
+            counter, _ = self._postings(index)
+
+            yield CaseFromCounter(case_type, self._string(from_id), counter)
+
+    def get_all_case_rows(self):
+        for index in range(self.num_keys):
+            case_type, from_id, _ = self._key(index)
+            case_from = self._string(from_id)
+            counter, postings = self._postings(index)
+
+            for case_to_id, occurrences in postings:
+                yield case_type, case_from, self._string(case_to_id), occurrences, counter
+
+
+def export_db(db, path):
+    """
+    Exports the cases and from-counters of a database to a packed model.
+
+    :param db: A DbHandler.
+    :param path: The path of the file to write.
+    :return: void
+    """
+    write_packed_model(path, db.get_all_cases(), db.get_all_case_counters(), db.is_complete())
+
+
+def import_db(db, path):
+    """
+    Imports a packed model into a database, adding its occurrences to the existing ones, and rebuilds the
+    data derived from the cases like finalize_training.
+
+    :param db: A DbHandler.
+    :param path: The path of a packed model.
+    :return: void
+    """
+    model = PackedModel(path)
+
+    try:
+        db.bulk_insert(model.get_all_cases(), model.get_all_case_counters())
+
+        if not model.complete:
+            db.set_complete(False)
+    finally:
+        model.close()
+
+    if config['use_bloom_filter']:
+        db.build_bloom_filter()
+
+    if config['use_top_cases']:
+        db.refresh_top_cases()
@@ -0,0 +1,120 @@
+import hashlib
+import os
+import pickle
+
+from casetagger.config import VERSION
+
+"""
+Magic written at the start of every parse cache, followed by a plain header line holding the version of the
+casetagger that wrote it and the hash of the contents it was parsed from.
+"""
+PARSE_CACHE_MAGIC = b'CTPC'
+
+"""
+We use the most compact protocol of the interpreter, a cache an older interpreter can't read is simply rebuilt.
+"""
+PARSE_CACHE_PROTOCOL = pickle.HIGHEST_PROTOCOL
+
+
+def create_parse_cache_path(path):
+    return path + '.ctcache'
+
+
+def create_parse_cache_header(content_hash):
+    """
+    Creates the header preceding the pickled texts of a parse cache.
+
+    :param content_hash: The hash of the contents the texts were parsed from.
+    :return: A byte-string.
+    """
+    return PARSE_CACHE_MAGIC + (VERSION + ' ' + content_hash + '\n').encode('ascii')
+
+
+def get_content_hash(file_contents):
+    """
+    Hashes the contents of an input file.
+
+    :param file_contents: A byte-string, or a string which is hashed as utf8.
+    :return: A hex digest.
+    """
+    if not isinstance(file_contents, bytes):
+        file_contents = file_contents.encode('utf8')
+
+    return hashlib.sha1(file_contents).hexdigest()
+
+
+def read_parse_cache(cache_path, content_hash):
+    """
+    Reads the texts of a parse cache, if it was written for the given contents.
+
+    :param cache_path:
+    :param content_hash: The hash of the contents the texts must have been parsed from.
+    :return: A list of Text objects, or None if there is no valid cache for the contents.
+    """
+    if not os.path.isfile(cache_path):
+        return None
+
+    header = create_parse_cache_header(content_hash)
+
+    try:
+        with open(cache_path, 'rb') as cache_file:
+            # The header is checked before unpickling, so we never unpickle a file we didn't write for these contents
+            if cache_file.read(len(header)) != header:
+                return None
+
+            return pickle.load(cache_file)
+    except Exception:
+        # An unreadable cache is simply rebuilt
+        return None
+
+
+def write_parse_cache(cache_path, content_hash, texts):
+    """
+    Writes parsed texts to a parse cache.
+
+    The cache is written to a temporary file first, so concurrent runs never see a partial cache. The temporary
+    file is removed if writing fails.
+
+    :param cache_path:
+    :param content_hash: The hash of the contents the texts were parsed from.
+    :param texts: A list of Text objects.
+    :return:
+    """
+    tmp_path = cache_path + '.%d.tmp' % os.getpid()
+
+    try:
+        with open(tmp_path, 'wb') as cache_file:
+            cache_file.write(create_parse_cache_header(content_hash))
+            pickle.dump(texts, cache_file, PARSE_CACHE_PROTOCOL)
+
+        os.rename(tmp_path, cache_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def parse_cached(file_contents, path, parse):
+    """
+    Parses the contents of a file, reusing the texts cached next to it if the contents are unchanged.
+
+    :param file_contents: The contents of the file.
+    :param path: The path of the file.
+    :param parse: The function parsing the contents to a list of Text objects.
+    :return: A list of Text objects.
+    """
+    cache_path = create_parse_cache_path(path)
+    content_hash = get_content_hash(file_contents)
+
+    texts = read_parse_cache(cache_path, content_hash)
+
+    if texts is None:
+        texts = parse(file_contents)
+
+        try:
+            write_parse_cache(cache_path, content_hash, texts)
+        except (IOError, OSError, pickle.PicklingError, TypeError, AttributeError, RuntimeError):
+            # The input may live in a directory we can't write to, or the texts may hold something that can't be
+            # pickled, in which case we just don't cache
+            pass
+
+    return texts
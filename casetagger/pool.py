@@ -0,0 +1,181 @@
+import os
+import sqlite3
+import threading
+import weakref
+
+from casetagger.config import config
+from casetagger.db import DbHandler, create_db_path
+
+
+class DbPool(object):
+    """
+    Hands out a DbHandler per thread for a language, so a model can be read from several threads at once.
+
+    sqlite connections can't be shared between threads, so every thread gets its own connection the first
+    time it asks for one, and keeps it. The read-only mmap backend is an immutable snapshot that all threads
+    read without locking, so it is shared instead.
+
+    Writes through one of the handlers are not seen by the bloom filters of the others. Call invalidate
+    after writing, and every thread gets a new handler the next time it asks for one, and closes its old one.
+    Writes by other processes are noticed by get_model_version, which invalidates the handlers as well.
+    With use_memory, the handlers are copies of the model, so writes go through get_writer instead.
+
+    The handler of a thread is only referenced by the thread, so it is released when the thread exits.
+    """
+
+    def __init__(self, language, use_memory=None, backend=None):
+        """
+        Creates the pool. No handlers are created until they are asked for.
+
+        :param language: The language of the model.
+        :param use_memory: Whether every thread copies the model to a memory database, defaults to
+            config['use_memory_db'].
+        :param backend: The storage backend, defaults to config['db_backend'].
+        """
+        if use_memory is None:
+            use_memory = config['use_memory_db']
+        if backend is None:
+            backend = config['db_backend']
+
+        self.language = language
+        self.use_memory = use_memory
+        self.backend = backend
+        # Incremented by invalidate, handlers of older generations are replaced
+        self.generation = 0
+
+        self.local = threading.local()
+        # Reentrant, as the shared handler is created while the lock is held
+        self.lock = threading.RLock()
+        # The open handlers, to close them with the pool
+        self.handlers = weakref.WeakSet()
+        self.shared_handler = None
+        # The connection and last data_version used to notice writes by other connections, see get_model_version
+        self.version_conn = None
+        self.data_version = None
+
+    def get(self):
+        """
+        Returns the DbHandler of the current thread.
+
+        :return:
+        """
+        if self.backend == 'mmap':
+            with self.lock:
+                if self.shared_handler is None:
+                    self.shared_handler = self._create_handler()
+                return self.shared_handler
+
+        # Replaces the handlers if another process has written to the model
+        self.get_model_version()
+
+        handler = getattr(self.local, 'handler', None)
+
+        if handler is None or self.local.generation != self.generation:
+            # Only this thread uses its handler, so the superseded one can be closed right away
+            if handler is not None:
+                self._close_handler(handler)
+
+            handler = self._create_handler()
+            self.local.handler = handler
+            self.local.generation = self.generation
+
+        return handler
+
+    def get_writer(self):
+        """
+        Returns the DbHandler of the current thread to write to.
+
+        With use_memory, writes to the copy of a thread would be lost when it is replaced, so they go to a
+        handler on the db file instead, and the copies are made anew from it once the pool is invalidated.
+
+        :return:
+        """
+        if not self.use_memory:
+            return self.get()
+
+        handler = getattr(self.local, 'writer', None)
+
+        if handler is None:
+            handler = self._create_handler(False)
+            self.local.writer = handler
+
+        return handler
+
+    def invalidate(self):
+        """
+        Makes every thread get a new handler the next time it asks for one.
+
+        :return:
+        """
+        with self.lock:
+            self.generation += 1
+
+    def get_model_version(self):
+        """
+        Returns a version of the model, which changes whenever the model is written to, through the pool or by
+        another process. The handlers are invalidated when another connection has written to the model, so the
+        threads get handlers with fresh bloom filters, or fresh copies of the model in memory.
+
+        Unlike DbHandler.get_model_version, the version is the same for all threads. The packed model of the
+        mmap backend is immutable, so only its generation is used.
+
+        :return: A hashable value.
+        """
+        if self.backend == 'mmap':
+            return self.generation
+
+        with self.lock:
+            if self.version_conn is None:
+                db_path = create_db_path(self.language)
+
+                # The db is created by the first handler
+                if not os.path.isfile(db_path):
+                    return self.generation
+
+                self.version_conn = sqlite3.connect(db_path, timeout=config['db_timeout'], check_same_thread=False)
+
+            data_version = self.version_conn.execute("PRAGMA data_version").fetchone()[0]
+
+            if self.data_version is not None and data_version != self.data_version:
+                self.generation += 1
+
+            self.data_version = data_version
+
+            return self.generation
+
+    def close(self):
+        """
+        Closes all handlers of the pool. The pool must not be used by any thread while it is closed.
+
+        :return:
+        """
+        with self.lock:
+            for handler in list(self.handlers):
+                handler.close()
+
+            if self.version_conn is not None:
+                self.version_conn.close()
+
+            self.handlers = weakref.WeakSet()
+            self.shared_handler = None
+            self.version_conn = None
+            self.data_version = None
+            self.generation += 1
+
+    def _create_handler(self, use_memory=None):
+        if use_memory is None:
+            use_memory = self.use_memory
+
+        # Handlers are created one at a time, as opening a handler may create or migrate the schema, which
+        # fails with "database schema has changed" if other threads do it at the same time
+        with self.lock:
+            handler = DbHandler(self.language, use_memory, self.backend)
+            self.handlers.add(handler)
+
+        return handler
+
+    def _close_handler(self, handler):
+        with self.lock:
+            self.handlers.discard(handler)
+
+        handler.close()
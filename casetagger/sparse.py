@@ -0,0 +1,283 @@
+try:
+    import numpy
+    from scipy import sparse
+except ImportError:
+    numpy = None
+    sparse = None
+
+from casetagger.config import get_tagger_config
+from casetagger.models import Case, Cases
+from casetagger.util import standard_0_to_1000_factor_scale
+
+
+def is_available():
+    """
+    Returns whether numpy and scipy are installed, which the sparse scoring engine requires.
+
+    :return:
+    """
+    return sparse is not None
+
+
+class SparseModel(object):
+    """
+    A trained model as sparse (feature key x label) matrices, scoring all tokens of a batch with a few
+    matrix products instead of merging their cases one by one.
+
+    Merging the to-cases of a token, see Cases.merge, is expressed in this algebra:
+
+    - The individual adjustments of a case only depend on the case itself, so they are applied once, and
+      vectorized, when the model is built, and the model holds log(1 - p) of the adjusted probability p of
+      every case.
+    - A batch is a (token x feature key) matrix of the weights of the keys of every token. The noisy-OR
+      combination of the cases predicting a label is then 1 - exp(tokens * log_misses), and the combined
+      occurrences are tokens * occurrences.
+    - The occurrence adjustment and the choice of the best label are vectorized over the candidate labels
+      of all tokens.
+
+    The mappings of the config are checked for every token before it is scored, and ties are broken by the
+    order of the keys of the token, like in Cases.merge. The labels of a key are ordered like in the model,
+    which may differ from the order they are fetched in by Cases.merge, so a few tied tokens may get other
+    tags. The model is built from all cases, so the top cases are not used.
+
+    Building the model reads every case, which takes seconds for a large model and is only paid back when
+    enough tokens are scored with it, see benchmarks/sparse_scoring.py.
+    """
+
+    def __init__(self, db, tagger_config=None):
+        """
+        Builds the model from all cases of a db.
+
+        :param db: The DbHandler to read the cases from.
+        :param tagger_config: The TaggerConfig to adjust the cases with, defaults to the current config.
+        """
+        if sparse is None:
+            raise Exception("The sparse scoring engine requires numpy and scipy")
+
+        if tagger_config is None:
+            tagger_config = get_tagger_config()
+
+        self.tagger_config = tagger_config
+
+        full_adjustments = tagger_config.case_full_adjustments
+
+        # The row of every (type, case_from) and the labels in the order of their columns
+        self.key_index = {}
+        self.labels = []
+        label_index = {}
+        # The columns of the labels of every row, in the order of the model
+        self.key_labels = []
+
+        rows = []
+        columns = []
+        occurrences = []
+        from_counts = []
+        full_factors = []
+
+        # The cases are read as plain tuples, as creating a Case of each would dominate the build
+        for case_type, case_from, case_to, case_occurrences, from_count in db.iter_case_rows():
+            if from_count <= 0:
+                continue
+
+            key = (case_type, case_from)
+            row = self.key_index.get(key)
+            if row is None:
+                row = self.key_index[key] = len(self.key_labels)
+                self.key_labels.append([])
+
+            column = label_index.get(case_to)
+            if column is None:
+                column = label_index[case_to] = len(self.labels)
+                self.labels.append(case_to)
+
+            self.key_labels[row].append(column)
+
+            rows.append(row)
+            columns.append(column)
+            occurrences.append(case_occurrences)
+            from_counts.append(from_count)
+
+            if len(full_adjustments) > 0:
+                full_factors.append(Cases.adjust_full_case_importance(1.0, Case(case_type, case_from, case_to),
+                                                                      tagger_config))
+
+        rows = numpy.array(rows, dtype=int)
+        probs = numpy.array(occurrences, dtype=float) / numpy.array(from_counts, dtype=float)
+
+        key_types = numpy.array([case_type for case_type, _ in self.key_index], dtype=int)
+        key_rows = numpy.array(list(self.key_index.values()), dtype=int)
+
+        # The adjustments of a case that only depend on its (type, case_from)
+        importances = numpy.ones(len(self.key_index))
+        for case_type in set(key_types.tolist()):
+            importance = tagger_config.get_importance(case_type)
+            if importance is not None:
+                importances[key_rows[key_types == case_type]] = importance
+
+        from_factors = numpy.ones(len(self.key_index))
+        for row, adjustment_key in self.find_rows(tagger_config.case_from_adjustments):
+            from_factors[row] = standard_0_to_1000_factor_scale(tagger_config.case_from_adjustments[adjustment_key])
+
+        ngram_counts = numpy.zeros(len(self.key_index), dtype=int)
+        ngram_counts[key_rows] = [case_from.count('|') for _, case_from in self.key_index]
+        tuple_counts = numpy.zeros(len(self.key_index), dtype=int)
+        tuple_counts[key_rows] = [case_from.count('@') for _, case_from in self.key_index]
+
+        # The mapped label of the rows with a mapping in the config
+        self.mappings = dict((row, tagger_config.case_mappings[mapping_key])
+                             for row, mapping_key in self.find_rows(tagger_config.case_mappings))
+
+        # The individual adjustments of Cases.adjust_individual_probabilities, in the same order
+        probs = importances[rows] * probs
+        probs = probs * from_factors[rows]
+        if len(full_factors) > 0:
+            probs = probs * numpy.array(full_factors)
+
+        misses = 1 - probs
+        for counts in [ngram_counts[rows], tuple_counts[rows]]:
+            max_count = counts.max() if len(counts) > 0 else 0
+
+            for i in range(1, max_count + 1):
+                complex_cases = counts >= i
+                misses[complex_cases] *= 1 - probs[complex_cases] / i
+        probs = 1 - misses
+
+        log_misses = numpy.full(len(probs), -numpy.inf)
+        possible = probs < 1
+        log_misses[possible] = numpy.log(1 - probs[possible])
+
+        shape = (len(self.key_index), len(self.labels))
+
+        self.log_misses = sparse.csr_matrix((log_misses, (rows, columns)), shape=shape, dtype=float)
+        self.occurrences = sparse.csr_matrix((occurrences, (rows, columns)), shape=shape, dtype=float)
+        self.presence = sparse.csr_matrix((numpy.ones(len(rows)), (rows, columns)), shape=shape, dtype=float)
+
+    def find_rows(self, config_keys):
+        """
+        Finds the rows of keys of the config written as the type followed by the case_from, like "1jeg".
+
+        :param config_keys: An iterable of keys of the config.
+        :return: A generator of (row, key of the config) for every (type, case_from) of the model a key matches.
+        """
+        for config_key in config_keys:
+            for i in range(1, len(config_key) + 1):
+                if not config_key[:i].isdigit():
+                    break
+
+                row = self.key_index.get((int(config_key[:i]), config_key[i:]))
+                if row is not None:
+                    yield row, config_key
+
+    def create_token_matrix(self, token_cases):
+        """
+        Creates the (token x feature key) matrix of the weights of the keys of every token.
+
+        The tokens with a mapping get no weights, as they are not scored.
+
+        :param token_cases: A list of the Cases of every token.
+        :return: A tuple of the matrix, a dict of the mapped label of the tokens with a mapping, and the rows
+            of the keys of every token in the order of its cases.
+        """
+        count_duplicate_cases = self.tagger_config.count_duplicate_cases
+
+        rows = []
+        columns = []
+        weights = []
+        mapped = {}
+        token_key_rows = []
+
+        for token, cases in enumerate(token_cases):
+            multiplicities = {}
+            # The keys in the order of the cases, which is the order mappings are checked in
+            key_rows = []
+
+            for case in cases:
+                key_row = self.key_index.get((case.type, case.case_from))
+                if key_row is None:
+                    continue
+
+                if key_row not in multiplicities:
+                    multiplicities[key_row] = 0
+                    key_rows.append(key_row)
+                multiplicities[key_row] += case.multiplicity
+
+            token_key_rows.append(key_rows)
+
+            mapping = next((self.mappings[key_row] for key_row in key_rows if key_row in self.mappings), None)
+            if mapping is not None:
+                mapped[token] = mapping
+                continue
+
+            for key_row in key_rows:
+                rows.append(token)
+                columns.append(key_row)
+                weights.append(multiplicities[key_row] if count_duplicate_cases else 1)
+
+        matrix = sparse.csr_matrix((weights, (rows, columns)), shape=(len(token_cases), len(self.key_index)),
+                                   dtype=float)
+
+        return matrix, mapped, token_key_rows
+
+    def predict(self, token_cases):
+        """
+        Returns the most likely label of every token, like Cases.merge of the to-cases of the token would.
+
+        :param token_cases: A list of the Cases of every token, holding the type and case_from of the cases.
+        :return: A list of labels, "" for the tokens without any known case.
+        """
+        token_count = len(token_cases)
+        labels = [""] * token_count
+
+        if token_count == 0:
+            return labels
+
+        tokens, mapped, token_key_rows = self.create_token_matrix(token_cases)
+
+        candidates = tokens.dot(self.presence)
+        candidates.sort_indices()
+        candidates = candidates.tocoo()
+        token_rows = candidates.row
+        label_columns = candidates.col
+
+        if len(token_rows) > 0:
+            log_misses = numpy.asarray(tokens.dot(self.log_misses)[token_rows, label_columns]).ravel()
+            occurrences = numpy.asarray(tokens.dot(self.occurrences)[token_rows, label_columns]).ravel()
+
+            probs = 1 - numpy.exp(log_misses)
+
+            occurrence_max = numpy.zeros(token_count)
+            numpy.maximum.at(occurrence_max, token_rows, occurrences)
+            occurrence_max = occurrence_max[token_rows]
+
+            adjusted = occurrence_max > 0
+            probs[adjusted] /= 1.0 + numpy.exp(-occurrences[adjusted] / (occurrence_max[adjusted] / 2))
+
+            best_probs = numpy.full(token_count, -numpy.inf)
+            numpy.maximum.at(best_probs, token_rows, probs)
+
+            best = numpy.nonzero(probs == best_probs[token_rows])[0]
+            best_tokens, first, counts = numpy.unique(token_rows[best], return_index=True, return_counts=True)
+
+            for token, column, count, index in zip(best_tokens, label_columns[best[first]], counts, first):
+                if count > 1:
+                    column = self.break_tie(token_key_rows[token], set(label_columns[best[index:index + count]]))
+
+                labels[token] = self.labels[column]
+
+        for token, mapping in mapped.items():
+            labels[token] = mapping
+
+        return labels
+
+    def break_tie(self, key_rows, columns):
+        """
+        Returns the first of tied labels in the order of the keys of the token, and of the labels of every key.
+
+        :param key_rows: The rows of the keys of the token, in the order of its cases.
+        :param columns: The columns of the tied labels.
+        :return: A column.
+        """
+        for key_row in key_rows:
+            for column in self.key_labels[key_row]:
+                if column in columns:
+                    return column
@@ -1,21 +1,114 @@
 # -*- coding: utf-8 -*-
-import copy
+import itertools
+import threading
+from collections import OrderedDict
 
-from casetagger.config import config
+from casetagger.config import config, get_tagger_config, TaggerConfig
 from casetagger import logger
 from casetagger.db import DbHandler
+from casetagger.memo import PhraseMemo, get_phrase_key
 from casetagger.models import WordCases, MorphemeCases
-from casetagger.debug import TestResult
+from casetagger.pool import DbPool
+from casetagger.debug import TestResult, get_gold_tags
+from casetagger.util import get_text_fingerprint, hybridmethod
+from casetagger.writer import CaseWriter
 from typecraft_python.models import Text
 
 
-class CaseTagger:
+class CaseTagger(object):
     """
     This is the class that does the primary work-load.
+
+    A CaseTagger instance tags with one model and one TaggerConfig, and may be shared between threads: every
+    thread reads the model through its own connection, see DbPool. Several instances with different models
+    or configurations can be used side by side.
+
+    The methods can also be called on the class itself, in which case they use the class-level db set by
+    instantiate_db and the current config.
     """
 
-    def __init__(self):
-        pass
+    # The db of the class, set by instantiate_db
+    db = None
+    # The per-thread dbs of an instance, see DbPool
+    pool = None
+    # The TaggerConfig of an instance, the class uses the current config
+    tagger_config = None
+    # The memo of tagged phrases, if use_phrase_memo of the TaggerConfig is set
+    phrase_memo = None
+    phrase_memo_lock = threading.Lock()
+    # The model key and SparseModel of the last db scored with, if use_sparse_scoring of the TaggerConfig is set
+    sparse_model = None
+    sparse_model_lock = threading.Lock()
+
+    def __init__(self, model, tagger_config=None, use_memory=None, backend=None):
+        """
+        Creates a tagger for a model.
+
+        :param model: The language of the model to tag with and train.
+        :param tagger_config: The TaggerConfig to use, defaults to a snapshot of the current config.
+        :param use_memory: Whether every thread copies the model to memory, defaults to config['use_memory_db'].
+        :param backend: The storage backend to read the model from, defaults to config['db_backend'].
+        """
+        if tagger_config is None:
+            tagger_config = TaggerConfig()
+
+        self.language = model
+        self.tagger_config = tagger_config
+        self.pool = DbPool(model, use_memory, backend)
+        self.phrase_memo = None
+        self.phrase_memo_lock = threading.Lock()
+        self.sparse_model = None
+        self.sparse_model_lock = threading.Lock()
+
+    @hybridmethod
+    def get_db(self, language=None):
+        """
+        Returns the db to use from the current thread.
+
+        :param language: The language to open a db for, if the class has no db.
+        :return: A DbHandler.
+        """
+        if self.pool is not None:
+            return self.pool.get()
+
+        if self.db is not None:
+            return self.db
+
+        return DbHandler(language, config['use_memory_db'])
+
+    @hybridmethod
+    def resolve_tagger_config(self, tagger_config=None):
+        """
+        Returns the given TaggerConfig, or else the one of the tagger.
+
+        :param tagger_config:
+        :return: A TaggerConfig.
+        """
+        if tagger_config is not None:
+            return tagger_config
+
+        if self.tagger_config is not None:
+            return self.tagger_config
+
+        return get_tagger_config()
+
+    @hybridmethod
+    def invalidate_readers(self):
+        """
+        Makes the other threads of an instance see what was just written, by giving them new connections.
+
+        :return:
+        """
+        if self.pool is not None:
+            self.pool.invalidate()
+
+    def close(self):
+        """
+        Closes all connections of the tagger.
+
+        :return:
+        """
+        self.pool.close()
 
     @classmethod
     def instantiate_db(cls, language):
@@ -30,98 +123,703 @@ class CaseTagger:
         """
         cls.db = DbHandler(language, config['use_memory_db'])
 
-    @classmethod
-    def train(cls, text):
+    @hybridmethod
+    def train(self, text, writer=None, tagger_config=None):
         """
         Trains the database specified by a text
+
+        The cases of every distinct phrase are counted once here, see train_phrases, and handed to a CaseWriter,
+        which applies them in batched transactions from its own thread.
+
         :param text:
+        :param writer: An optional running CaseWriter to write through, shared between several texts.
+        :param tagger_config: The TaggerConfig to create the cases with, defaults to the one of the tagger.
         :return:
         """
         if not isinstance(text, Text):
             raise Exception("Invalid argument to tag_text, expected typecraft_python.models.text.Text object")
 
-        language = text.language
+        tagger_config = self.resolve_tagger_config(tagger_config)
 
-        if cls.db is not None:
-            db = cls.db
-        else:
-            db = DbHandler(language, config['use_memory_db'])
+        if writer is None:
+            with CaseWriter(self.get_training_db(text.language)) as writer:
+                self.train(text, writer, tagger_config)
+            self.invalidate_readers()
+            return
+
+        self.train_phrases(text.phrases, writer, tagger_config)
+
+    @staticmethod
+    def train_phrases(phrases, writer, tagger_config):
+        """
+        Counts the cases of phrases and hands them to a CaseWriter.
+
+        Identical phrases, including their POS-tags and glosses, produce identical cases, so the cases of
+        every distinct phrase are only counted once and multiplied by the number of copies of it.
+
+        :param phrases: An iterable of phrases.
+        :param writer: A running CaseWriter.
+        :param tagger_config: The TaggerConfig to create the cases with.
+        :return:
+        """
+        phrase_counts = CaseTagger.group_duplicate_phrases(phrases)
 
         # Used for debug only
-        phrase_len = len(text.phrases)
+        phrase_len = len(phrase_counts)
         i = 0
 
-        for phrase in text.phrases:
+        for phrase, count in phrase_counts:
+            i += 1
 
-            cursor = db.conn.cursor()
+            logger.debug("Training with phrase " + str(i) + "/" + str(phrase_len) + "\r")
+            writer.put(CaseTagger.count_phrase_cases(phrase, tagger_config=tagger_config, multiplicity=count))
 
-            i += 1
+    @staticmethod
+    def group_duplicate_phrases(phrases):
+        """
+        Groups identical phrases, comparing their word forms, morphemes, POS-tags and glosses.
 
-            if i % 100:
-                db.conn.commit()
+        :param phrases: An iterable of phrases.
+        :return: A list of (phrase, number of copies) for the first copy of every distinct phrase, in order.
+        """
+        groups = OrderedDict()
 
-            logger.debug("Training with phrase " + str(i) + "/" + str(phrase_len) + "\r")
-            for word in phrase.words:
+        for phrase in phrases:
+            key = get_phrase_key(phrase)
 
-                # If we don't have an option to ignore words with empty poses
-                if not (word.pos is None and word.pos is not "" and not config['register_empty_pos']):
-                    word_cases = WordCases(word, phrase)
-                    db.insert_cases(word_cases, cursor)
+            group = groups.get(key)
+            if group is None:
+                groups[key] = [phrase, 1]
+            else:
+                group[1] += 1
 
-                for morpheme in word.morphemes:
-                    # If we don't want to ignore empty glosses
-                    if not (len(morpheme.glosses) == 0 and not config['register_empty_gloss']):
-                        morpheme_cases = MorphemeCases(morpheme, word, phrase)
+        return [(phrase, count) for phrase, count in groups.values()]
 
-                        db.insert_cases(morpheme_cases, cursor)
+    @hybridmethod
+    def train_texts(self, texts, batch_size=None, tagger_config=None):
+        """
+        Trains the database with several texts through a single writer. Duplicate phrases are collapsed across
+        all the texts, see train_phrases.
 
-            db.conn.commit()
+        :param texts:
+        :param batch_size: The number of phrases per transaction, defaults to config['train_batch_size'].
+        :param tagger_config: The TaggerConfig to create the cases with, defaults to the one of the tagger.
+        :return:
+        """
+        texts = list(texts)
 
-    @classmethod
-    def tag_text(cls, text):
+        if len(texts) == 0:
+            return
+
+        for text in texts:
+            if not isinstance(text, Text):
+                raise Exception("Invalid argument to train_texts, expected typecraft_python.models.text.Text objects")
+
+        tagger_config = self.resolve_tagger_config(tagger_config)
+
+        with CaseWriter(self.get_training_db(texts[0].language), batch_size) as writer:
+            self.train_phrases(itertools.chain.from_iterable(text.phrases for text in texts), writer, tagger_config)
+
+        self.invalidate_readers()
+
+    @hybridmethod
+    def get_training_db(self, language=None):
         """
-        Tags a text.
+        Returns the db to write to from the current thread, which for an instance copying the model to memory
+        is a handler on the db file, see DbPool.get_writer.
+
+        :param language: The language to open a db for, if the class has no db.
+        :return: A DbHandler.
+        """
+        if self.pool is not None:
+            return self.pool.get_writer()
+
+        return self.get_db(language)
+
+    @staticmethod
+    def get_phrase_training_cases(phrase, tagger_config=None):
+        """
+        Generates the cases we train with for all words and morphemes of a phrase.
+
+        Only the cases of the layers in the train_level of the config are generated, so a database for
+        a single layer holds only the case types it needs.
+
+        :param phrase:
+        :param tagger_config: The TaggerConfig to create the cases with, defaults to the current config.
+        :return: A generator of WordCases and MorphemeCases objects.
+        """
+        if tagger_config is None:
+            tagger_config = get_tagger_config()
+
+        for word in phrase.words:
+
+            # If we don't have an option to ignore words with empty poses
+            if tagger_config.train_pos and \
+                    not (word.pos is None and word.pos is not "" and not tagger_config.register_empty_pos):
+                yield WordCases(word, phrase, tagger_config=tagger_config)
+
+            if not tagger_config.train_gloss:
+                continue
+
+            for morpheme in word.morphemes:
+                # If we don't want to ignore empty glosses
+                if not (len(morpheme.glosses) == 0 and not tagger_config.register_empty_gloss):
+                    yield MorphemeCases(morpheme, word, phrase, tagger_config=tagger_config)
+
+    @staticmethod
+    def count_phrase_cases(phrase, counts=None, tagger_config=None, multiplicity=1):
+        """
+        Counts the occurrences of every case training with a phrase would insert.
+
+        :param phrase:
+        :param counts: An optional dict to add the counts to.
+        :param tagger_config: The TaggerConfig to create the cases with, defaults to the current config.
+        :param multiplicity: The number of copies of the phrase to count.
+        :return: A dict of (type, case_from, case_to) to occurrences.
+        """
+        if counts is None:
+            counts = {}
+
+        if tagger_config is None:
+            tagger_config = get_tagger_config()
+
+        for cases in CaseTagger.get_phrase_training_cases(phrase, tagger_config):
+            for case in cases:
+                key = case.get_key()
+                counts[key] = counts.get(key, 0) + case.get_weight(tagger_config) * multiplicity
+
+        return counts
+
+    @staticmethod
+    def count_text_cases(text, tagger_config=None):
+        """
+        Counts the occurrences of every case training with a text would insert.
+
+        :param text:
+        :param tagger_config: The TaggerConfig to create the cases with, defaults to the current config.
+        :return: A dict of (type, case_from, case_to) to occurrences.
+        """
+        counts = {}
+
+        if tagger_config is None:
+            tagger_config = get_tagger_config()
+
+        for phrase, count in CaseTagger.group_duplicate_phrases(text.phrases):
+            CaseTagger.count_phrase_cases(phrase, counts, tagger_config, count)
+
+        return counts
+
+    @hybridmethod
+    def apply_text_delta(self, old_text, new_text, text_id=None):
+        """
+        Updates the database from an old version of a text to a new version, in a single transaction.
+
+        Only the difference in case occurrences between the two versions is written, so the cost is
+        proportional to the size of the edit. Either text may be None, meaning it is trained from scratch
+        or untrained completely.
+
+        If a text id is given, the fingerprint of the new text is recorded in the journal of trained texts,
+        and applying a delta to a text that is already trained to the new version does nothing.
+
+        :param old_text: The previously trained version of the text, or None.
+        :param new_text: The new version of the text, or None.
+        :param text_id: An optional id identifying the text in the journal.
+        :return: True if the database was updated, False if the journal showed it to be up to date.
+        """
+        for text in [old_text, new_text]:
+            if text is not None and not isinstance(text, Text):
+                raise Exception("Invalid argument to apply_text_delta, expected typecraft_python.models.text.Text "
+                                "object")
+
+        db = self.get_training_db()
+        db.check_writable()
+        tagger_config = self.resolve_tagger_config()
+        new_fingerprint = get_text_fingerprint(new_text) if new_text is not None else None
+
+        if text_id is not None:
+            trained_fingerprint = db.get_trained_text_fingerprint(text_id)
+
+            if trained_fingerprint == new_fingerprint:
+                return False
+
+            if old_text is not None and trained_fingerprint != get_text_fingerprint(old_text):
+                raise Exception("The old version of text '%s' does not match the trained version" % text_id)
+
+            if old_text is None and trained_fingerprint is not None:
+                raise Exception("Text '%s' is already trained, provide the old version of it" % text_id)
+
+        deltas = self.count_text_cases(new_text, tagger_config) if new_text is not None else {}
+
+        if old_text is not None:
+            for key, occurrences in self.count_text_cases(old_text, tagger_config).items():
+                deltas[key] = deltas.get(key, 0) - occurrences
+
+        cursor = db.conn.cursor()
+        db.apply_case_deltas(deltas, cursor)
+
+        if text_id is not None:
+            db.set_trained_text_fingerprint(text_id, new_fingerprint, cursor)
+
+        db.conn.commit()
+        self.invalidate_readers()
+        return True
+
+    @hybridmethod
+    def untrain(self, text, text_id=None):
+        """
+        Removes the cases of a previously trained text from the database.
 
         :param text:
+        :param text_id: An optional id identifying the text in the journal.
+        :return:
+        """
+        return self.apply_text_delta(text, None, text_id)
+
+    @hybridmethod
+    def retrain(self, old_text, new_text, text_id=None):
+        """
+        Replaces a previously trained text with a revised version of it.
+
+        :param old_text:
+        :param new_text:
+        :param text_id: An optional id identifying the text in the journal.
+        :return:
+        """
+        return self.apply_text_delta(old_text, new_text, text_id)
+
+    @hybridmethod
+    def finalize_training(self):
+        """
+        Rebuilds the structures derived from the trained database. Should be called
+        once training of a language is done.
+
         :return:
         """
+        db = self.get_training_db()
+
+        if config['use_bloom_filter']:
+            db.build_bloom_filter()
+
+        if config['use_top_cases']:
+            db.refresh_top_cases()
+
+        self.invalidate_readers()
+
+    @hybridmethod
+    def tag_text(self, text, tagger_config=None, budget=None):
+        """
+        Tags a text.
+
+        Only the layers in the tag_level of the config are tagged. The other layer is left as it is, and
+        no cases are created or looked up for it.
+
+        If use_phrase_memo of the TaggerConfig is set, repeated phrases are only tagged once, see PhraseMemo. The memo
+        is cleared whenever the database or the TaggerConfig changes.
+
+        If a budget is given, the text is tagged in anytime mode, see tag_phrases_within_budget.
+
+        :param text:
+        :param tagger_config: The TaggerConfig to tag with, defaults to the one of the tagger.
+        :param budget: Optional TagBudget bounding the time and work spent on the text.
+        :return: The report of the budget, if one is given.
+        """
         if not isinstance(text, Text):
             raise Exception("Invalid argument to tag_text, expected typecraft_python.models.text.Text object")
 
-        language = text.language
+        db = self.get_db(text.language)
+        tagger_config = self.resolve_tagger_config(tagger_config)
+
+        if budget is not None:
+            return self.tag_phrases_within_budget(text.phrases, db, tagger_config, budget)
 
-        db = None
-        if cls.db is not None:
-            db = cls.db
+        if tagger_config.use_phrase_memo:
+            phrase_memo = self.get_phrase_memo()
+            phrase_memo.validate(self.get_model_key(db, tagger_config))
+            phrase_memo.tag_phrases(text.phrases, lambda phrases: self.tag_phrase_list(phrases, db, tagger_config))
         else:
-            db = DbHandler(language, config['use_memory_db'])
+            self.tag_phrase_list(text.phrases, db, tagger_config)
+
+    @hybridmethod
+    def get_phrase_memo(self):
+        """
+        Returns the memo of phrases tagged by tag_text, creating it on first use.
+
+        :return: A PhraseMemo.
+        """
+        with self.phrase_memo_lock:
+            if self.phrase_memo is None:
+                self.phrase_memo = PhraseMemo()
+
+        return self.phrase_memo
 
-        for i in range(config['number_of_passes']):
-            for phrase in text.phrases:
+    @hybridmethod
+    def get_model_key(self, db, tagger_config):
+        """
+        Returns the key identifying the model a phrase memo is filled for.
+
+        The connections of an instance all read the same model, so its key is the model version of its pool,
+        which changes when it is written to through the instance or by another process. The class uses the
+        model version of its db.
+
+        :param db: The db tagged with.
+        :param tagger_config: The TaggerConfig tagged with.
+        :return: A hashable value.
+        """
+        if self.pool is not None:
+            return self.pool, self.pool.get_model_version(), tagger_config
+
+        return db, db.get_model_version(), tagger_config
+
+    @hybridmethod
+    def tag_phrase_list(self, phrases, db, tagger_config):
+        """
+        Tags a list of phrases like tag_text, without the phrase memo.
+
+        :param phrases:
+        :param db:
+        :param tagger_config:
+        :return:
+        """
+        # Tuples of cases of the same type join their cases in the order they were created, which the static and
+        # dynamic cases created apart don't keep, so their tuples would not match the trained ones
+        if tagger_config.cache_static_cases and tagger_config.ignore_tuples_of_same_type:
+            self.tag_text_with_static_cases(phrases, db, tagger_config)
+            return
+
+        # The to-cases of every (type, case_from) looked up so far
+        to_cases = {}
+
+        key_filter = None
+        if tagger_config.prune_tag_cases:
+            key_filter = self.create_key_filter(db, to_cases)
+
+        for i in range(tagger_config.number_of_passes):
+            for phrase in phrases:
                 for word in phrase.words:
-                    word_cases = WordCases(word, phrase)
+                    if tagger_config.tag_pos:
+                        word_cases = WordCases(word, phrase, tagger_config=tagger_config, key_filter=key_filter)
+
+                        # Fetches all cases matching the type and case_from of the ones we have
+                        word_cases = self.lookup_to_cases(db, word_cases, to_cases)
 
-                    # Fetches all cases matching the type and case_from of the ones we have
-                    word_cases = db.get_all_to_cases(word_cases)
+                        most_likely_pos = word_cases.merge(tagger_config)
 
-                    most_likely_pos = word_cases.merge()
+                        word.pos = most_likely_pos
 
-                    word.pos = most_likely_pos
+                    if not tagger_config.tag_gloss:
+                        continue
 
                     for morpheme in word.morphemes:
-                        morpheme_cases = MorphemeCases(morpheme, word, phrase)
+                        morpheme_cases = MorphemeCases(morpheme, word, phrase, tagger_config=tagger_config,
+                                                       key_filter=key_filter)
 
-                        morpheme_cases = db.get_all_to_cases(morpheme_cases)
+                        morpheme_cases = self.lookup_to_cases(db, morpheme_cases, to_cases)
 
-                        most_likely_gloss = morpheme_cases.merge()
+                        most_likely_gloss = morpheme_cases.merge(tagger_config)
                         morpheme.glosses = most_likely_gloss.split(".")
 
-    @classmethod
-    def test_text(cls, text):
+    @hybridmethod
+    def tag_phrases_within_budget(self, phrases, db, tagger_config, budget):
+        """
+        Tags phrases in anytime mode, refining the tags only while the budget lasts.
+
+        Every token is first decided from the cheap cases of the word, its morphemes and the mappings, without
+        n-grams and tuples, which is linear in the number of tokens and always completed. The tokens are then
+        refined with all cases, token by token and pass by pass, until the budget is exhausted. Tokens which
+        are not refined keep their cheap tags.
+
+        :param phrases:
+        :param db:
+        :param tagger_config:
+        :param budget: The TagBudget to spend, which is started over.
+        :return: The report of the budget.
+        """
+        budget.start()
+
+        # The to-cases of every (type, case_from) looked up so far
+        to_cases = {}
+
+        key_filter = None
+        if tagger_config.prune_tag_cases:
+            key_filter = self.create_key_filter(db, to_cases)
+
+        cheap_config = tagger_config.replace(register_ngrams=False, tuple_max_length=1)
+
+        for cases in self.tag_tokens(phrases, db, cheap_config, key_filter, to_cases):
+            budget.spend(cases)
+            budget.tokens += 1
+
+        budget.refinements = budget.tokens * tagger_config.number_of_passes
+
+        for i in range(tagger_config.number_of_passes):
+            tokens = self.tag_tokens(phrases, db, tagger_config, key_filter, to_cases)
+
+            while not budget.is_exhausted():
+                cases = next(tokens, None)
+                if cases is None:
+                    break
+
+                budget.spend(cases)
+                budget.refined_tokens += 1
+
+            if budget.is_exhausted():
+                break
+
+        return budget.get_report()
+
+    @staticmethod
+    def tag_tokens(phrases, db, tagger_config, key_filter=None, to_cases=None):
+        """
+        Tags the words and morphemes of phrases one at a time, in a single pass.
+
+        This is a generator, tagging the next token when asked for it, so the tagging can be stopped between
+        any two tokens.
+
+        :param phrases:
+        :param db:
+        :param tagger_config:
+        :param key_filter: Optional function the cases are pruned with, see create_key_filter.
+        :param to_cases: Optional dict of the to-cases looked up so far, see lookup_to_cases.
+        :return: A generator of the number of cases created for every token tagged.
+        """
+        if to_cases is None:
+            to_cases = {}
+
+        for phrase in phrases:
+            for word in phrase.words:
+                if tagger_config.tag_pos:
+                    word_cases = WordCases(word, phrase, tagger_config=tagger_config, key_filter=key_filter)
+                    word.pos = CaseTagger.lookup_to_cases(db, word_cases, to_cases).merge(tagger_config)
+                    yield len(word_cases)
+
+                if not tagger_config.tag_gloss:
+                    continue
+
+                for morpheme in word.morphemes:
+                    morpheme_cases = MorphemeCases(morpheme, word, phrase, tagger_config=tagger_config,
+                                                   key_filter=key_filter)
+                    morpheme_to_cases = CaseTagger.lookup_to_cases(db, morpheme_cases, to_cases)
+                    morpheme.glosses = morpheme_to_cases.merge(tagger_config).split(".")
+                    yield len(morpheme_cases)
+
+    @staticmethod
+    def create_key_filter(db, to_cases):
+        """
+        Creates the function telling which (type, case_from) keys exist, used to prune the cases while tagging.
+
+        If a bloom filter is loaded, the keys are only checked against it, so no queries are made, and the
+        few false positives are simply looked up like before. Otherwise the to-cases of the keys are fetched
+        in bulk, and kept in to_cases, where they are reused when the cases are looked up.
+
+        Nothing is pruned on a db rare cases were removed from, as its n-grams and tuples may exist without
+        their shorter n-grams and components, see DbHandler.is_complete.
+
+        :param db: The DbHandler to check the keys in.
+        :param to_cases: A dict of (type, case_from) to the list of its to-cases, which is filled in.
+        :return: A function taking a list of keys and returning the ones that exist, or None if the cases
+            of the db can not be pruned.
+        """
+        if not db.is_complete():
+            return None
+
+        def key_filter(keys):
+            if db.bloom_filter is not None:
+                return [key for key in keys if db.may_contain(key[0], key[1])]
+
+            CaseTagger.fetch_to_cases(db, keys, to_cases)
+            return [key for key in keys if len(to_cases[key]) > 0]
+
+        return key_filter
+
+    @staticmethod
+    def fetch_to_cases(db, keys, to_cases):
+        """
+        Fetches the to-cases of the keys that are not in to_cases yet, in one bulk lookup.
+
+        :param db:
+        :param keys: An iterable of (type, case_from) keys.
+        :param to_cases: A dict of (type, case_from) to the list of its to-cases, which is filled in.
+        :return:
+        """
+        missing_keys = [key for key in set(keys) if key not in to_cases]
+
+        if len(missing_keys) > 0:
+            fetched = db.get_to_cases_by_keys(missing_keys)
+            for key in missing_keys:
+                to_cases[key] = fetched.get(key, [])
+
+    @staticmethod
+    def lookup_to_cases(db, cases, to_cases):
+        """
+        Fetches the to-cases of cases like DbHandler.get_all_to_cases, only looking up the keys that are not
+        in to_cases yet.
+
+        :param db:
+        :param cases: The cases to fetch the to-cases of.
+        :param to_cases: A dict of (type, case_from) to the list of its to-cases, which is filled in.
+        :return: A Cases object.
+        """
+        CaseTagger.fetch_to_cases(db, ((case.type, case.case_from) for case in cases), to_cases)
+
+        return DbHandler.collect_to_cases(cases, to_cases)
+
+    @staticmethod
+    def tag_text_with_static_cases(phrases, db, tagger_config):
+        """
+        Tags phrases like tag_text, creating the static cases of every word and morpheme only once.
+
+        The static cases only depend on the word- and morpheme-forms, so they are created in the first pass
+        and reused in the later ones, where only the dynamic cases depending on the POS-tags and glosses are
+        created. The to-cases fetched for a (type, case_from) are kept for the whole text, so no key is looked
+        up more than once. If prune_tag_cases of the TaggerConfig is set, the cases are pruned as they are
+        created, see Cases.prune_cases.
+
+        :param phrases:
+        :param db:
+        :param tagger_config:
+        :return:
+        """
+        # The static cases of every word and morpheme, by id
+        static_cases = {}
+        # The to-cases of every (type, case_from) looked up so far
+        to_cases = {}
+
+        key_filter = None
+        if tagger_config.prune_tag_cases:
+            key_filter = CaseTagger.create_key_filter(db, to_cases)
+
+        def get_all_to_cases(cases, dynamic_cases):
+            return CaseTagger.lookup_to_cases(db, list(itertools.chain(cases, dynamic_cases)), to_cases)
+
+        for i in range(tagger_config.number_of_passes):
+            for phrase in phrases:
+                for word in phrase.words:
+                    if tagger_config.tag_pos:
+                        word_static_cases = static_cases.get(id(word))
+                        if word_static_cases is None:
+                            word_static_cases = WordCases(word, phrase, static_only=True, tagger_config=tagger_config,
+                                                          key_filter=key_filter)
+                            static_cases[id(word)] = word_static_cases
+
+                        word_cases = WordCases(word, phrase, static_cases=word_static_cases,
+                                               tagger_config=tagger_config, key_filter=key_filter)
+                        word.pos = get_all_to_cases(word_static_cases, word_cases).merge(tagger_config)
+
+                    if not tagger_config.tag_gloss:
+                        continue
+
+                    for morpheme in word.morphemes:
+                        morpheme_static_cases = static_cases.get(id(morpheme))
+                        if morpheme_static_cases is None:
+                            morpheme_static_cases = MorphemeCases(morpheme, word, phrase, static_only=True,
+                                                                  tagger_config=tagger_config, key_filter=key_filter)
+                            static_cases[id(morpheme)] = morpheme_static_cases
+
+                        morpheme_cases = MorphemeCases(morpheme, word, phrase, static_cases=morpheme_static_cases,
+                                                       tagger_config=tagger_config, key_filter=key_filter)
+                        morpheme_cases = get_all_to_cases(morpheme_static_cases, morpheme_cases)
+                        morpheme.glosses = morpheme_cases.merge(tagger_config).split(".")
+
+    @hybridmethod
+    def tag_phrases(self, phrases, batch_size=None, tagger_config=None):
+        """
+        Tags phrases in batches, resolving the cases of a whole batch in one bulk lookup.
+
+        For every batch, the cases of all words are generated first, the union of their distinct
+        (type, case_from) keys is fetched at once, and every word is merged from the shared result.
+        The morphemes of the batch are then tagged the same way, using the new POS-tags. Like in tag_text,
+        only the layers in the tag_level of the config are tagged.
+
+        Unlike tag_text, the cases of a word are generated from the POS-tags its neighbours had
+        at the start of the batch, not from the ones assigned earlier in the same batch.
+
+        If use_sparse_scoring of the TaggerConfig is set, the tokens of a batch are instead scored with sparse matrix
+        products, see SparseModel.
+
+        :param phrases: An iterable of phrases.
+        :param batch_size: The number of phrases per batch, defaults to tag_batch_size of the TaggerConfig.
+        :param tagger_config: The TaggerConfig to tag with, defaults to the one of the tagger.
+        :return:
+        """
+        tagger_config = self.resolve_tagger_config(tagger_config)
+
+        if batch_size is None:
+            batch_size = tagger_config.tag_batch_size
+
+        phrases = list(phrases)
+        db = self.get_db()
+
+        sparse_model = None
+        if tagger_config.use_sparse_scoring:
+            sparse_model = self.get_sparse_model(db, tagger_config)
+
+        for i in range(tagger_config.number_of_passes):
+            for start in range(0, len(phrases), batch_size):
+                batch = phrases[start:start + batch_size]
+
+                words = [(word, phrase) for phrase in batch for word in phrase.words]
+
+                if tagger_config.tag_pos:
+                    word_cases = [WordCases(word, phrase, tagger_config=tagger_config) for word, phrase in words]
+
+                    if sparse_model is not None:
+                        poses = sparse_model.predict(word_cases)
+                    else:
+                        to_cases = db.get_to_cases_by_keys((case.type, case.case_from)
+                                                           for cases in word_cases for case in cases)
+                        poses = [DbHandler.collect_to_cases(cases, to_cases).merge(tagger_config)
+                                 for cases in word_cases]
+
+                    for (word, _), pos in zip(words, poses):
+                        word.pos = pos
+
+                if not tagger_config.tag_gloss:
+                    continue
+
+                morphemes = [(morpheme, word, phrase) for word, phrase in words for morpheme in word.morphemes]
+                morpheme_cases = [MorphemeCases(morpheme, word, phrase, tagger_config=tagger_config)
+                                  for morpheme, word, phrase in morphemes]
+
+                if sparse_model is not None:
+                    glosses = sparse_model.predict(morpheme_cases)
+                else:
+                    to_cases = db.get_to_cases_by_keys((case.type, case.case_from)
+                                                       for cases in morpheme_cases for case in cases)
+                    glosses = [DbHandler.collect_to_cases(cases, to_cases).merge(tagger_config)
+                               for cases in morpheme_cases]
+
+                for (morpheme, _, _), gloss in zip(morphemes, glosses):
+                    morpheme.glosses = gloss.split(".")
+
+    @hybridmethod
+    def get_sparse_model(self, db, tagger_config):
+        """
+        Returns the SparseModel of the db, building it when the model or the config has changed.
+
+        :param db:
+        :param tagger_config:
+        :return: A SparseModel.
+        """
+        # numpy and scipy are only imported when the engine is used
+        from casetagger.sparse import SparseModel
+
+        model_key = self.get_model_key(db, tagger_config)
+
+        with self.sparse_model_lock:
+            if self.sparse_model is None or self.sparse_model[0] != model_key:
+                self.sparse_model = (model_key, SparseModel(db, tagger_config))
+
+            return self.sparse_model[1]
+
+    @hybridmethod
+    def test_text(self, text, tagger_config=None):
         if not isinstance(text, Text):
             raise Exception
 
-        copied_text = copy.deepcopy(text)
-        CaseTagger.tag_text(text)
+        tagger_config = self.resolve_tagger_config(tagger_config)
+
+        # Only the gold tags are kept, instead of a copy of the whole text
+        gold_tags = get_gold_tags(text)
+        self.tag_text(text, tagger_config)
 
-        return TestResult.from_data(copied_text, text)
+        return TestResult.from_gold_tags(text.title, gold_tags, text, tagger_config.tag_level)
@@ -1,4 +1,6 @@
+import hashlib
 import math
+import types
 from typecraft_python.models import Morpheme
 
 
@@ -48,6 +50,25 @@ def get_text_morphemes(text):
     return [morpheme for word in get_text_words(text) for morpheme in word]
 
 
+def get_text_fingerprint(text):
+    """
+    Returns a hash of the annotated content of a text, i.e. its words, morphemes, POS-tags and glosses.
+
+    :param text:
+    :return: A hex-string.
+    """
+    sha = hashlib.sha1()
+
+    for phrase in text:
+        sha.update(b'\x02')
+        for word in phrase:
+            sha.update((u"\x01%s\x00%s" % (word.word or u"", word.pos or u"")).encode('utf8'))
+            for morpheme in word:
+                sha.update((u"\x00%s\x00%s" % (morpheme.morpheme or u"", u".".join(morpheme.glosses))).encode('utf8'))
+
+    return sha.hexdigest()
+
+
 def get_consecutive_sublists_of_length(parent_list, length):
     """
     Returns all consecutive sublists of a lists of a given length.
@@ -182,3 +203,22 @@ def standard_0_to_1000_factor_scale(input):
     :return:
     """
     return min(max(math.log10(9 * input + 1), 0), 4)
+
+
+class hybridmethod(object):
+    """
+    Decorator for methods that can be called both on a class and on its instances.
+
+    Called on an instance, the method gets the instance as its first argument, like a normal method. Called
+    on the class, it gets the class, like a classmethod, so class attributes stand in for instance attributes.
+    """
+
+    def __init__(self, func):
+        self.func = func
+        self.__doc__ = func.__doc__
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return types.MethodType(self.func, owner)
+
+        return types.MethodType(self.func, instance)
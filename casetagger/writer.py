@@ -0,0 +1,128 @@
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from casetagger.config import config
+
+
+"""
+Sentinel put on the queue to make the writer flush and stop.
+"""
+_STOP = object()
+
+
+class CaseWriter(object):
+    """
+    Single writer applying case deltas to a database from a background thread.
+
+    Producers put dicts of case deltas on a bounded queue, and the writer merges them and applies
+    them in one transaction per batch. When the queue is full, put blocks until the writer catches
+    up, so producers can never run ahead of the database by more than the queue size.
+
+    While the writer is running it owns the connection of the database, and nothing else may write to it.
+    """
+
+    def __init__(self, db, batch_size=None, queue_size=None):
+        """
+        Creates the writer.
+
+        :param db: The DbHandler to write to.
+        :param batch_size: The number of deltas merged into a transaction, defaults to config['train_batch_size'].
+        :param queue_size: The number of deltas waiting for the writer, defaults to config['train_queue_size'].
+        """
+        if batch_size is None:
+            batch_size = config['train_batch_size']
+        if queue_size is None:
+            queue_size = config['train_queue_size']
+
+        db.check_writable()
+
+        self.db = db
+        self.batch_size = max(batch_size, 1)
+        self.queue = queue.Queue(max(queue_size, 1))
+        self.thread = None
+        self.error = None
+
+        # Stats
+        self.transactions = 0
+
+    def start(self):
+        """
+        Starts the writer thread.
+
+        :return:
+        """
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def put(self, deltas):
+        """
+        Queues case deltas for writing, blocking while the queue is full.
+
+        :param deltas: A dict of (type, case_from, case_to) to the change in occurrences.
+        :return:
+        """
+        if self.error is not None:
+            raise self.error
+
+        self.queue.put(deltas)
+
+    def close(self):
+        """
+        Writes all queued deltas and stops the writer thread.
+
+        :return:
+        """
+        if self.thread is not None:
+            self.queue.put(_STOP)
+            self.thread.join()
+            self.thread = None
+
+        if self.error is not None:
+            raise self.error
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _run(self):
+        pending = {}
+        count = 0
+
+        while True:
+            deltas = self.queue.get()
+
+            # After a failure we keep draining the queue, so blocked producers get to see the error
+            if deltas is _STOP or self.error is not None:
+                if deltas is _STOP:
+                    break
+                continue
+
+            for key, delta in deltas.items():
+                pending[key] = pending.get(key, 0) + delta
+            count += 1
+
+            if count >= self.batch_size:
+                self._write(pending)
+                pending = {}
+                count = 0
+
+        if count > 0 and self.error is None:
+            self._write(pending)
+
+    def _write(self, deltas):
+        try:
+            cursor = self.db.conn.cursor()
+            self.db.apply_case_deltas(deltas, cursor)
+            self.db.conn.commit()
+            self.transactions += 1
+        except Exception as e:
+            self.db.conn.rollback()
+            self.error = e
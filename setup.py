@@ -38,6 +38,9 @@ setup(
     },
     include_package_data=True,
     install_requires=requirements,
+    extras_require={
+        'sparse': ['numpy', 'scipy']
+    },
     license="MIT license",
     zip_safe=False,
     keywords='casetagger',
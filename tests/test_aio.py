@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import copy
+import sys
+
+import pytest
+
+from casetagger.tagger import CaseTagger
+from tests import test_tagger
+
+pytestmark = pytest.mark.skipif(sys.version_info < (3, 5), reason="asyncio façade requires Python 3.5")
+
+
+def clear_tags(text):
+    for phrase in text.phrases:
+        for word in phrase.words:
+            word.pos = ""
+            for morpheme in word.morphemes:
+                morpheme.glosses = []
+    return text
+
+
+def get_tags(text):
+    return [(word.pos, [morpheme.glosses for morpheme in word.morphemes])
+            for phrase in text.phrases for word in phrase.words]
+
+
+class TestAsyncCaseTagger(object):
+
+    @classmethod
+    def setup_class(cls):
+        test_tagger.TestTagger.setup_class()
+        cls.text = test_tagger.TestTagger.detail_text
+
+        CaseTagger.instantiate_db("test_aio")
+        CaseTagger.train(cls.text)
+
+    def test_tag_text_matches_tagger(self):
+        import asyncio
+        from casetagger.aio import AsyncCaseTagger
+
+        expected = clear_tags(copy.deepcopy(self.text))
+        CaseTagger.tag_text(expected)
+
+        texts = [clear_tags(copy.deepcopy(self.text)) for _ in range(10)]
+        tagger = AsyncCaseTagger("test_aio")
+
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(asyncio.gather(*[tagger.tag_text(text) for text in texts]))
+
+        for text in texts:
+            assert get_tags(text) == get_tags(expected)
+
+        # Concurrent requests for the same keys are coalesced into fewer queries than lookups
+        assert tagger.queries < tagger.lookups
+
+        loop.run_until_complete(tagger.close())
+        loop.close()
+        asyncio.set_event_loop(None)
+
+    def test_tag_text_timeout(self):
+        import asyncio
+        from casetagger.aio import AsyncCaseTagger
+
+        tagger = AsyncCaseTagger("test_aio", timeout=0)
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+
+        with pytest.raises(asyncio.TimeoutError):
+            loop.run_until_complete(tagger.tag_text(clear_tags(copy.deepcopy(self.text))))
+
+        loop.run_until_complete(tagger.close())
+        loop.close()
+        asyncio.set_event_loop(None)
+
+    @classmethod
+    def teardown_class(cls):
+        CaseTagger.db._destroy_database()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+
+import pytest
+
+from casetagger.backends import create_packed_path
+from casetagger.config import config
+from casetagger.db import DbHandler
+from casetagger.models import Case, Cases
+from casetagger.packed import export_db
+
+
+class TestBackends(object):
+
+    @classmethod
+    def setup_class(cls):
+        cls.db = DbHandler("test_backends", False, 'sqlite')
+
+        for i in range(500):
+            cls.db.insert_case(Case(config['case_type_pos_word'], u"word%d" % i, u"N"))
+            cls.db.insert_case(Case(config['case_type_pos_morpheme'], u"word%d" % i, u"V"))
+        cls.db.insert_case(Case(config['case_type_pos_word'], u"word1", u"V"))
+
+        export_db(cls.db, create_packed_path("test_backends"))
+        cls.mmap_db = DbHandler("test_backends", False, 'mmap')
+
+    def test_mmap_get_cases_by_from(self):
+        for i in range(500):
+            for case_type in [config['case_type_pos_word'], config['case_type_pos_morpheme']]:
+                expected = sorted(str(case) for case in self.db.get_cases_by_from(case_type, u"word%d" % i))
+                fetched = sorted(str(case) for case in self.mmap_db.get_cases_by_from(case_type, u"word%d" % i))
+
+                assert fetched == expected
+
+        assert self.mmap_db.get_cases_by_from(config['case_type_pos_word'], u"unknown") == []
+
+    def test_mmap_get_case_counter(self):
+        assert self.mmap_db.get_case_counter(config['case_type_pos_word'], u"word1").occurrences == 2
+        assert self.mmap_db.get_case_counter(config['case_type_pos_word'], u"unknown") is None
+
+    def test_mmap_iteration(self):
+        assert len(self.mmap_db.get_all_cases()) == len(self.db.get_all_cases())
+        assert len(self.mmap_db.get_all_case_counters()) == len(self.db.get_all_case_counters())
+
+        rows = sorted(self.db.iter_case_rows())
+        assert len(rows) == len(self.db.get_all_cases())
+        assert (config['case_type_pos_word'], u"word1", u"V", 1, 2) in rows
+        assert sorted(self.mmap_db.iter_case_rows()) == rows
+
+    def test_mmap_get_all_to_cases_populates_probabilities(self):
+        cases = Cases()
+        cases.add_case(config['case_type_pos_word'], u"word1", None)
+
+        fetched = self.mmap_db.get_all_to_cases(cases)
+
+        assert sorted(case.prob for case in fetched) == [0.5, 0.5]
+
+    def test_mmap_get_case(self):
+        assert self.mmap_db.get_case(config['case_type_pos_word'], u"word1", u"V").occurrences == 1
+        assert self.mmap_db.get_case(config['case_type_pos_word'], u"word1", u"ADJ") is None
+
+    def test_mmap_is_read_only(self):
+        with pytest.raises(Exception):
+            self.mmap_db.bulk_insert([Case(config['case_type_pos_word'], u"a", u"N")], [])
+
+        writes = [
+            lambda: self.mmap_db.insert_case(Case(config['case_type_pos_word'], u"a", u"N")),
+            lambda: self.mmap_db.apply_case_deltas({(config['case_type_pos_word'], u"word1", u"V"): -1}),
+            lambda: self.mmap_db.compact(2),
+            lambda: self.mmap_db.build_bloom_filter(),
+            lambda: self.mmap_db.refresh_top_cases(),
+            lambda: self.mmap_db.get_trained_text_fingerprint(u"text")
+        ]
+
+        for write in writes:
+            with pytest.raises(Exception) as error:
+                write()
+
+            assert "read-only" in str(error.value)
+
+    def test_mmap_can_not_be_copied_to_memory(self):
+        with pytest.raises(Exception) as error:
+            DbHandler("test_backends", True, 'mmap')
+
+        assert "memory" in str(error.value)
+
+    @classmethod
+    def teardown_class(cls):
+        cls.mmap_db.close()
+        os.remove(create_packed_path("test_backends"))
+        cls.db._destroy_database()
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import tempfile
+
+from casetagger.bloom import BloomFilter, create_bloom_key
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom_filter = BloomFilter(1000, 0.01)
+
+    keys = [create_bloom_key(1, u"word%d" % i) for i in range(1000)]
+    for key in keys:
+        bloom_filter.add(key)
+
+    for key in keys:
+        assert key in bloom_filter
+
+
+def test_bloom_filter_false_positive_rate():
+    bloom_filter = BloomFilter(1000, 0.01)
+
+    for i in range(1000):
+        bloom_filter.add(create_bloom_key(1, u"word%d" % i))
+
+    false_positives = len([i for i in range(10000) if create_bloom_key(2, u"other%d" % i) in bloom_filter])
+
+    assert false_positives < 300
+
+
+def test_bloom_key_separates_type_and_from():
+    assert create_bloom_key(1, u"2a") != create_bloom_key(12, u"a")
+    assert create_bloom_key(1, u"åø") == create_bloom_key(1, u"åø")
+
+
+def test_bloom_filter_save_and_load():
+    bloom_filter = BloomFilter(10, 0.01)
+    bloom_filter.add(create_bloom_key(1, u"a"))
+
+    path = os.path.join(tempfile.mkdtemp(), "test.bloom")
+    bloom_filter.save(path)
+
+    loaded = BloomFilter.load(path)
+
+    assert loaded.num_bits == bloom_filter.num_bits
+    assert loaded.num_hashes == bloom_filter.num_hashes
+    assert create_bloom_key(1, u"a") in loaded
+
+    os.remove(path)
+
+    assert BloomFilter.load(path) is None
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from casetagger.build import ModelBuilder, get_case_sort_key, merge_sorted_counts, read_run, write_run
+from casetagger.db import DbHandler
+from casetagger.tagger import CaseTagger
+from tests import test_tagger
+
+
+def get_model(db):
+    cases = {}
+    for case in db.get_all_cases():
+        key = (case.type, case.case_from, case.case_to)
+        cases[key] = cases.get(key, 0) + case.occurrences
+
+    counters = {}
+    for counter in db.get_all_case_counters():
+        key = (counter.type, counter.case_from)
+        counters[key] = counters.get(key, 0) + counter.occurrences
+
+    return cases, counters
+
+
+def get_schema(db):
+    return sorted(row for row in db.conn.execute("SELECT type, name FROM sqlite_master")
+                  if not row[1].startswith('sqlite_'))
+
+
+class TestModelBuilder(object):
+
+    @classmethod
+    def setup_class(cls):
+        test_tagger.TestTagger.setup_class()
+        cls.texts = [test_tagger.TestTagger.detail_text, test_tagger.TestTagger.bulk_text]
+
+        CaseTagger.instantiate_db("test_build_train")
+        CaseTagger.train_texts(cls.texts)
+
+        builder = ModelBuilder("test_build")
+        builder.add_texts(cls.texts)
+        builder.build(replace=True)
+
+        cls.stats = builder.get_stats()
+        cls.db = DbHandler("test_build")
+
+    @classmethod
+    def teardown_class(cls):
+        cls.db._destroy_database()
+        CaseTagger.db._destroy_database()
+
+    def test_build_matches_train(self):
+        assert get_model(self.db) == get_model(CaseTagger.db)
+        assert get_schema(self.db) == get_schema(CaseTagger.db)
+
+        assert self.stats['cases'] == len(self.db.get_all_cases())
+        assert self.stats['total'] > 0
+
+    def test_build_analyzes(self):
+        assert self.db.conn.execute("SELECT COUNT(*) FROM sqlite_stat1").fetchone()[0] > 0
+
+    def test_spilled_build_matches_train(self):
+        builder = ModelBuilder("test_build_spilled", max_keys=100)
+        builder.add_texts(self.texts)
+        builder.build(replace=True)
+
+        stats = builder.get_stats()
+        assert stats['spilled_runs'] > 1
+        assert builder.runs == []
+
+        db = DbHandler("test_build_spilled")
+        try:
+            assert get_model(db) == get_model(CaseTagger.db)
+        finally:
+            db._destroy_database()
+
+    def test_capped_builder_streams_texts(self):
+        builder = ModelBuilder("test_build_spilled", max_keys=100)
+
+        def texts():
+            for text in self.texts * 3:
+                # The phrases waiting to be counted and the counts stay within the cap
+                assert len(builder.phrases) + len(builder.counts) < 100
+                yield text
+
+        builder.add_texts(texts())
+        builder.count_phrases()
+
+        assert len(builder.counts) < 100
+        assert builder.get_stats()['spilled_runs'] > 1
+
+        builder.close()
+
+    def test_spilled_train_matches_train(self):
+        db = DbHandler("test_build_spilled")
+        try:
+            builder = ModelBuilder("test_build_spilled", max_keys=100)
+            builder.add_texts(self.texts[:1])
+            builder.train(db)
+
+            builder = ModelBuilder("test_build_spilled", max_keys=100)
+            builder.add_texts(self.texts[1:])
+            builder.train(db, batch_size=50)
+
+            assert get_model(db) == get_model(CaseTagger.db)
+        finally:
+            db._destroy_database()
+
+    def test_build_does_not_replace_by_default(self):
+        builder = ModelBuilder("test_build")
+        builder.add_texts(self.texts[:1])
+
+        with pytest.raises(Exception):
+            builder.build()
+
+        assert get_model(self.db) == get_model(CaseTagger.db)
+
+
+def test_case_sort_key_orders_nulls_first():
+    keys = [(1, u"b", u"N"), (1, None, u"V"), (1, u"a", None), (0, u"z", u"N"), (1, u"a", u"ADJ")]
+
+    assert sorted(keys, key=get_case_sort_key) == [(0, u"z", u"N"), (1, None, u"V"), (1, u"a", None),
+                                                    (1, u"a", u"ADJ"), (1, u"b", u"N")]
+
+
+def test_merge_sorted_counts():
+    runs = [[((1, u"a", u"N"), 1), ((1, u"b", u"V"), 2)],
+            [((1, None, u"N"), 3), ((1, u"a", u"N"), 4)],
+            []]
+    runs = [write_run(run) for run in runs]
+
+    assert list(merge_sorted_counts([read_run(run) for run in runs])) == \
+        [((1, None, u"N"), 3), ((1, u"a", u"N"), 5), ((1, u"b", u"V"), 2)]
+
+    for run in runs:
+        run.close()
@@ -0,0 +1,103 @@
+import pytest
+
+from typecraft_python.models import Phrase, Word
+
+from casetagger.config import config, TaggerConfig, get_tagger_config
+from casetagger.models import WordCases
+
+
+def test_tagger_config_is_frozen():
+    tagger_config = TaggerConfig()
+
+    assert tagger_config.tuple_max_length == config['tuple_max_length']
+    assert tagger_config.case_groups[config['case_type_pos_word']] == config['case_groups']['1']
+
+    with pytest.raises(Exception):
+        tagger_config.tuple_max_length = 1
+
+
+def test_tagger_config_mappings_are_independent():
+    tagger_config = TaggerConfig()
+    copied_config = TaggerConfig()
+
+    config['case_mappings']['1foo'] = "X"
+
+    assert '1foo' not in tagger_config.case_mappings
+    assert '1foo' in TaggerConfig().case_mappings
+
+    del config['case_mappings']['1foo']
+
+    with pytest.raises(Exception):
+        tagger_config.case_mappings['1foo'] = "X"
+
+    assert copied_config.case_mappings == tagger_config.case_mappings
+    assert copied_config.case_mappings is not tagger_config.case_mappings
+
+
+def test_tagger_config_validates():
+    with pytest.raises(Exception):
+        TaggerConfig(tuple_max_length=0)
+
+    with pytest.raises(Exception):
+        TaggerConfig(tag_level="everything")
+
+    with pytest.raises(Exception):
+        TaggerConfig(train_level="everything")
+
+    with pytest.raises(Exception):
+        TaggerConfig(case_type_pos_new=1 << 7)
+
+    case_groups = dict(config['case_groups'])
+    del case_groups['1']
+    with pytest.raises(Exception):
+        TaggerConfig(case_groups=case_groups)
+
+
+def test_get_tagger_config_follows_config():
+    tagger_config = get_tagger_config()
+    assert get_tagger_config() is tagger_config
+
+    old_value = config['tuple_max_length']
+    config['tuple_max_length'] = 1
+    assert get_tagger_config().tuple_max_length == 1
+
+    config['tuple_max_length'] = old_value
+    assert get_tagger_config().tuple_max_length == old_value
+
+
+def test_tagger_configs_coexist():
+    phrase = Phrase()
+    for form in ["Dette", "er", "kult"]:
+        word = Word()
+        word.word = form
+        word.pos = "N"
+        phrase.add_word(word)
+
+    word = phrase.words[1]
+    without_tuples = WordCases(word, phrase, tagger_config=TaggerConfig(tuple_max_length=1))
+    with_tuples = WordCases(word, phrase, tagger_config=TaggerConfig(tuple_max_length=2))
+
+    assert all('@' not in case.case_from for case in without_tuples)
+    assert any('@' in case.case_from for case in with_tuples)
+
+
+def test_tagger_config_levels():
+    tagger_config = TaggerConfig(tag_level="pos", train_level="gloss")
+
+    assert tagger_config.tag_pos and not tagger_config.tag_gloss
+    assert tagger_config.train_gloss and not tagger_config.train_pos
+
+    tagger_config = TaggerConfig(tag_level="all", train_level="all")
+    assert tagger_config.tag_pos and tagger_config.tag_gloss
+    assert tagger_config.train_pos and tagger_config.train_gloss
+
+
+def test_tagger_config_replace():
+    tagger_config = TaggerConfig(tuple_max_length=2)
+    replaced = tagger_config.replace(register_ngrams=False)
+
+    assert not replaced.register_ngrams
+    assert replaced.tuple_max_length == 2
+    assert replaced.case_groups == tagger_config.case_groups
+    assert replaced.case_importance == tagger_config.case_importance
+    assert replaced.case_types == tagger_config.case_types
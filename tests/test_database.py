@@ -156,14 +156,119 @@ class TestDatabase(object):
         cases.add_case(config['case_type_pos_morpheme'], "from", None)
 
         # This should return all cases where case_from and type are equal
-        # to either case_1 or case_2
+        # to either case_1 or case_2, each once with the multiplicity of the duplicated input case
         fetched = self.db.get_all_to_cases(cases)
 
         assert fetched is not None
-        assert len(fetched) == 6
+        assert len(fetched) == 3
+        assert all(case.multiplicity == 2 for case in fetched)
 
         self.db._clear_database()
 
+    def test_bloom_filter_skips_unknown_keys(self):
+        db = DbHandler("test_bloom", False)
+
+        db.insert_case(Case(config['case_type_pos_word'], "from", "to"))
+        db.build_bloom_filter()
+
+        assert os.path.isfile(db.bloom_filter_path)
+        assert len(list(db.get_cases_by_from(config['case_type_pos_word'], "from"))) == 1
+        assert len(list(db.get_cases_by_from(config['case_type_pos_word'], "unknown"))) == 0
+
+        stats = db.get_bloom_filter_stats()
+        assert stats['lookups'] == 2
+        assert stats['skipped'] == 1
+
+        # Keys inserted after the filter was built should still be found
+        db.insert_case(Case(config['case_type_pos_word'], "new", "to"))
+        assert len(list(db.get_cases_by_from(config['case_type_pos_word'], "new"))) == 1
+
+        db._destroy_database()
+
+        assert not os.path.isfile(db.bloom_filter_path)
+
+    def test_bloom_filter_is_not_stale_after_reopening(self):
+        db = DbHandler("test_bloom_reopen", False)
+
+        db.insert_case(Case(config['case_type_pos_word'], "from", "to"))
+        db.build_bloom_filter()
+
+        # Writing after the filter was built removes the persisted filter, which would miss the new key
+        db.insert_case(Case(config['case_type_pos_word'], "new", "N"))
+        assert not os.path.isfile(db.bloom_filter_path)
+        db.close()
+
+        db = DbHandler("test_bloom_reopen", False)
+
+        assert db.may_contain(config['case_type_pos_word'], "new")
+        assert db.get_case(config['case_type_pos_word'], "new", "N").occurrences == 1
+
+        db.build_bloom_filter()
+        db.insert_case(Case(config['case_type_pos_word'], "newer", "N"))
+        db.close()
+
+        db = DbHandler("test_bloom_reopen", False)
+
+        assert db.may_contain(config['case_type_pos_word'], "newer")
+
+        db._destroy_database()
+
+    def test_compact(self):
+        db = DbHandler("test_compact", False)
+
+        db.insert_case(Case(config['case_type_pos_word'], "a", "N"))
+        db.insert_case(Case(config['case_type_pos_word'], "a", "N"))
+        db.insert_case(Case(config['case_type_pos_word'], "a", "V"))
+        db.insert_case(Case(config['case_type_pos_word'], "b", "N"))
+        db.insert_case(Case(config['case_type_pos_morpheme'], "c", "N"))
+
+        removed_cases, removed_counters = db.compact(2, type_thresholds={config['case_type_pos_morpheme']: 1})
+
+        assert removed_cases == 2
+        assert removed_counters == 1
+        assert db.get_case(config['case_type_pos_word'], "a", "N").occurrences == 2
+        assert db.get_case(config['case_type_pos_word'], "a", "V") is None
+        assert db.get_case_counter(config['case_type_pos_word'], "b") is None
+        assert db.get_case(config['case_type_pos_morpheme'], "c", "N") is not None
+
+        # Counters are kept exact unless asked otherwise
+        assert db.get_case_counter(config['case_type_pos_word'], "a").occurrences == 3
+
+        db.compact(2, recompute_counters=True)
+        assert db.get_case_counter(config['case_type_pos_word'], "a").occurrences == 2
+
+        # The db is marked incomplete once cases are removed, also after reopening it
+        assert not db.is_complete()
+        db.close()
+
+        db = DbHandler("test_compact", False)
+        assert not db.is_complete()
+
+        db._destroy_database()
+
+    def test_top_cases(self):
+        db = DbHandler("test_top_cases", False)
+
+        db.insert_case(Case(config['case_type_pos_word'], "a", "N"))
+        db.insert_case(Case(config['case_type_pos_word'], "a", "N"))
+        db.insert_case(Case(config['case_type_pos_word'], "a", "V"))
+        db.insert_case(Case(config['case_type_pos_word'], "a", "ADJ"))
+
+        db.refresh_top_cases(2)
+
+        top_cases = db.get_top_cases_by_from(config['case_type_pos_word'], "a")
+
+        assert len(top_cases) == 2
+        assert Case(config['case_type_pos_word'], "a", "N") in top_cases
+        assert Case(config['case_type_pos_word'], "a", "ADJ") in top_cases
+        assert [case.prob for case in top_cases if case.case_to == "N"] == [0.5]
+
+        # Writing to the database invalidates the top cases
+        db.insert_case(Case(config['case_type_pos_word'], "a", "V"))
+        assert len(db.get_top_cases_by_from(config['case_type_pos_word'], "a")) == 0
+
+        db._destroy_database()
+
     def test_clear_and_destroy_database(self):
         db = DbHandler("test_test_2", False)
 
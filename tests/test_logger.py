@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+import casetagger.logger as logger
+from casetagger.config import config
+
+
+def test_log_prints_text_and_objects(capsys):
+    old_value = config['verbosity_level']
+    config['verbosity_level'] = 2
+
+    logger.log(u"Built gøy")
+    logger.debug(42)
+    logger.critical(u"Text %s" % u"å")
+
+    config['verbosity_level'] = old_value
+
+    out, _ = capsys.readouterr()
+
+    assert u"[Log]: Built gøy" in out
+    assert u"[Debug]: 42" in out
+    assert u"[Critical error]: Text å" in out
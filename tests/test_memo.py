@@ -0,0 +1,159 @@
+import copy
+
+import pytest
+
+from typecraft_python.models import Text, Phrase, Word, Morpheme
+
+from casetagger.config import config
+from casetagger.memo import PhraseMemo, get_phrase_key
+from casetagger.tagger import CaseTagger
+
+
+def create_phrase(forms, pos=None):
+    phrase = Phrase()
+
+    for form in forms:
+        word = Word()
+        word.word = form
+        word.pos = pos
+
+        morpheme = Morpheme()
+        morpheme.morpheme = form
+        morpheme.glosses = []
+        word.add_morpheme(morpheme)
+
+        phrase.add_word(word)
+
+    return phrase
+
+
+def create_phrase_text(forms, pos):
+    text = Text()
+    text.language = "test_memo"
+    text.add_phrase(create_phrase(forms, pos))
+    return text
+
+
+def test_memo_evicts_least_recently_used():
+    memo = PhraseMemo(2)
+
+    memo.put("a", 1)
+    memo.put("b", 2)
+    assert memo.get("a") == 1
+
+    memo.put("c", 3)
+    assert memo.get("b") is None
+    assert memo.get("a") == 1
+    assert memo.get("c") == 3
+
+    stats = memo.get_stats()
+    assert stats['hits'] == 3
+    assert stats['misses'] == 1
+    assert stats['evictions'] == 1
+    assert stats['size'] == 2
+
+
+def test_memo_is_cleared_for_other_model():
+    memo = PhraseMemo(2)
+
+    memo.validate("first")
+    memo.put("a", 1)
+    memo.validate("first")
+    assert memo.get("a") == 1
+
+    memo.validate("second")
+    assert memo.get("a") is None
+    assert memo.get_stats()['invalidations'] == 1
+
+
+def test_memo_tags_duplicates_once():
+    memo = PhraseMemo(10)
+    tagged = []
+
+    def tag(phrases):
+        tagged.extend(phrases)
+        for phrase in phrases:
+            for word in phrase.words:
+                word.pos = "N"
+                word.morphemes[0].glosses = ["SG"]
+
+    phrases = [create_phrase(["Hei"]), create_phrase(["Hei", "du"]), create_phrase(["Hei"])]
+    memo.tag_phrases(phrases, tag)
+
+    assert tagged == phrases[:2]
+    assert phrases[2].words[0].pos == "N"
+    assert phrases[2].words[0].morphemes[0].glosses == ["SG"]
+
+    # The glosses are copied, not shared
+    assert phrases[2].words[0].morphemes[0].glosses is not phrases[0].words[0].morphemes[0].glosses
+
+    memo.tag_phrases([create_phrase(["Hei", "du"])], tag)
+    assert len(tagged) == 2
+    assert memo.get_stats()['hits'] == 2
+
+
+def test_phrase_key_includes_existing_tags():
+    assert get_phrase_key(create_phrase(["Hei"])) != get_phrase_key(create_phrase(["Hei"], "N"))
+
+
+class TestTaggerMemo(object):
+
+    @classmethod
+    def setup_class(cls):
+        cls.text = Text()
+        cls.text.language = "test_memo"
+
+        for forms, pos in [(["Hei", "du"], "INTRJ"), (["Dette", "er", "kult"], "N"), (["Hei", "du"], "INTRJ")]:
+            cls.text.add_phrase(create_phrase(forms, pos))
+
+        CaseTagger.instantiate_db("test_memo")
+        CaseTagger.train(cls.text)
+
+    @classmethod
+    def teardown_class(cls):
+        config['use_phrase_memo'] = False
+        CaseTagger.phrase_memo = None
+        CaseTagger.db._destroy_database()
+
+    def untagged_text(self):
+        text = copy.deepcopy(self.text)
+        for phrase in text.phrases:
+            for word in phrase.words:
+                word.pos = None
+        return text
+
+    def tag(self):
+        text = self.untagged_text()
+        CaseTagger.tag_text(text)
+
+        return [(word.pos, [morpheme.glosses for morpheme in word.morphemes])
+                for phrase in text.phrases for word in phrase.words]
+
+    def test_memo_keeps_tags(self):
+        config['use_phrase_memo'] = False
+        expected = self.tag()
+
+        config['use_phrase_memo'] = True
+        assert self.tag() == expected
+
+        stats = CaseTagger.phrase_memo.get_stats()
+        assert stats['hits'] == 1
+        assert stats['size'] == 2
+
+        assert self.tag() == expected
+        assert CaseTagger.phrase_memo.get_stats()['hits'] == 4
+
+    def test_memo_is_invalidated_by_training(self):
+        config['use_phrase_memo'] = True
+        self.tag()
+        invalidations = CaseTagger.phrase_memo.get_stats()['invalidations']
+
+        CaseTagger.train(create_phrase_text(["Hei", "du"], "N"))
+        self.tag()
+
+        assert CaseTagger.phrase_memo.get_stats()['invalidations'] == invalidations + 1
+
+
+def test_memo_size_must_be_positive():
+    with pytest.raises(Exception):
+        PhraseMemo(0)
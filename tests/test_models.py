@@ -1,4 +1,8 @@
+# -*- coding: utf-8 -*-
+import itertools
+
 from casetagger import config
+from casetagger.config import TaggerConfig
 from casetagger.models import Cases, Case, CaseFromCounter, Morpheme
 
 
@@ -89,3 +93,128 @@ def test_cases_has_config_mapping():
     cases.add_case(1, "jeg", "")
 
     assert cases.merge() == "PN"
+
+
+def test_cases_merges_duplicates():
+    cases = Cases()
+    cases.add_case(1, "a", "b")
+    cases.add_case(1, "a", "b")
+    cases.add_case(4, "a", "b")
+    cases.add_case_from_obj(Case(1, "a", "b", multiplicity=2))
+
+    assert len(cases) == 2
+    assert cases.cases[0].multiplicity == 4
+    assert cases.cases[1].multiplicity == 1
+
+
+def test_tuple_multiplicity():
+    cases = Cases()
+    cases.add_case(1, "a", "b")
+    cases.add_case(1, "a", "b")
+    cases.add_case(4, "c", "b")
+
+    cases.create_tuple_cases()
+
+    tuple_cases = [case for case in cases if case.type == 5]
+    assert len(tuple_cases) == 1
+    assert tuple_cases[0].multiplicity == 2
+
+
+def test_tuples_of_repeated_cases():
+    tagger_config = TaggerConfig(ignore_tuples_of_same_type=False, tuple_max_length=3)
+    generated = [(1, "a"), (1, "a"), (1, "a"), (4, "c"), (16, "d"), (16, "d")]
+
+    cases = Cases(tagger_config)
+    for case_type, case_from in generated:
+        cases.add_case(case_type, case_from, "b")
+
+    cases.create_tuple_cases()
+
+    # The tuples the duplicated cases would have generated one by one
+    expected = {}
+    for length in range(1, 4):
+        for case_tuple in itertools.combinations(generated, length):
+            case_type = sum(set(case_type for case_type, _ in case_tuple))
+            key = (case_type, "@".join(case_from for _, case_from in case_tuple))
+            expected[key] = expected.get(key, 0) + 1
+
+    assert dict(((case.type, case.case_from), case.multiplicity) for case in cases) == expected
+    assert expected[(1, "a@a@a")] == 1
+    assert expected[(5, "a@a@c")] == 3
+
+
+def test_combine_similar_cases_counts_multiplicity():
+    cases = Cases()
+    cases.add_case_from_obj(Case(1, "a", "b", 1, 0.5, multiplicity=2))
+    cases.add_case_from_obj(Case(2, "a", "b", 1, 0.5))
+
+    combined = Cases.combine_similar_cases(cases.cases)
+
+    assert len(combined) == 1
+    assert combined[0].prob == 1 - 0.5 ** 3
+    assert combined[0].occurrences == 3
+
+
+def test_static_and_dynamic_cases_add_up():
+    from typecraft_python.models import Phrase, Word
+    from casetagger.models import WordCases, MorphemeCases
+
+    phrase = Phrase()
+    for form, pos, glosses in [("Dette", "PN", ["DEM"]), ("er", "V", ["PRES"]), (u"gøy", "ADJ", ["FUN", "N"])]:
+        word = Word()
+        word.word = form
+        word.pos = pos
+
+        for gloss in glosses:
+            morpheme = Morpheme()
+            morpheme.morpheme = form + gloss
+            morpheme.glosses = [gloss]
+            word.add_morpheme(morpheme)
+
+        phrase.add_word(word)
+
+    def count(*cases_objects):
+        counts = {}
+        for cases in cases_objects:
+            for case in cases:
+                key = (case.type, case.case_from)
+                counts[key] = counts.get(key, 0) + case.multiplicity
+        return counts
+
+    for word in phrase.words:
+        static_cases = WordCases(word, phrase, static_only=True)
+        assert count(static_cases, WordCases(word, phrase, static_cases=static_cases)) == \
+            count(WordCases(word, phrase))
+
+        for morpheme in word.morphemes:
+            static_cases = MorphemeCases(morpheme, word, phrase, static_only=True)
+            assert count(static_cases, MorphemeCases(morpheme, word, phrase, static_cases=static_cases)) == \
+                count(MorphemeCases(morpheme, word, phrase))
+
+
+def test_prune_cases():
+    cases = Cases()
+
+    cases.add_case(1, "a", "N")
+    cases.add_case(2, "b", "N")
+    cases.add_ngram_case(8, "x", "N", None)
+    cases.add_ngram_case(8, "y|x", "N", "x")
+    cases.add_ngram_case(8, "z|y|x", "N", "y|x")
+    cases.add_ngram_case(16, "v", "N", None)
+    cases.add_ngram_case(16, "v|w", "N", "v")
+
+    existing = set([(1, "a"), (8, "x"), (8, "z|y|x"), (16, "v|w")])
+    checked = []
+
+    def key_filter(keys):
+        checked.append(sorted(keys))
+        return [key for key in keys if key in existing]
+
+    cases.prune_cases(key_filter)
+
+    # The longer n-grams are only checked if the n-gram they extend exists
+    assert checked == [[(1, "a"), (2, "b"), (8, "x"), (16, "v")], [(8, "y|x")]]
+    assert [(case.type, case.case_from) for case in cases] == [(1, "a"), (8, "x")]
+
+    cases.create_tuple_cases()
+    assert all("b" not in case.case_from.split("@") for case in cases)
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import tempfile
+
+from casetagger.config import config
+from casetagger.db import DbHandler
+from casetagger.models import Case
+from casetagger.packed import PackedModel, export_db, import_db, encode_varint, decode_varint
+
+
+def sort_nulls_first(tuples):
+    return sorted(tuples, key=lambda values: [(value is not None, value) for value in values])
+
+
+def case_tuples(cases):
+    return sort_nulls_first((case.type, case.case_from, case.case_to, case.occurrences) for case in cases)
+
+
+def counter_tuples(case_counters):
+    return sort_nulls_first((counter.type, counter.case_from, counter.occurrences) for counter in case_counters)
+
+
+class TestPacked(object):
+
+    @classmethod
+    def setup_class(cls):
+        cls.db = DbHandler("test_packed", False)
+        cls.path = os.path.join(tempfile.mkdtemp(), "test_packed.ctpk")
+
+        cases = [
+            Case(config['case_type_pos_word'], u"hei", u"N"),
+            Case(config['case_type_pos_word'], u"hei", u"N"),
+            Case(config['case_type_pos_word'], u"hei", u"V"),
+            Case(config['case_type_pos_word'], u"gøy", u"ADJ"),
+            Case(config['case_type_pos_morpheme'], u"hei", u"N"),
+            Case(config['case_type_gloss_morph'] | config['case_type_gloss_word'], u"å@øl", u"3SG.PL"),
+            # Words and morphemes without a tag are trained with NULLs
+            Case(config['case_type_pos_word'], u"tom", None),
+            Case(config['case_type_pos_morpheme'], None, u"N"),
+        ]
+        for i in range(200):
+            cases.append(Case(config['case_type_pos_prefix_ngram'], u"w%d|x" % i, u"N"))
+
+        for case in cases:
+            cls.db.insert_case(case)
+
+        export_db(cls.db, cls.path)
+        cls.model = PackedModel(cls.path)
+
+    def test_varint_round_trip(self):
+        buf = bytearray()
+        values = [0, 1, 127, 128, 300, 2 ** 32 + 5]
+        for value in values:
+            encode_varint(value, buf)
+
+        pos = 0
+        for value in values:
+            decoded, pos = decode_varint(buf, pos)
+            assert decoded == value
+
+    def test_round_trip_cases(self):
+        assert case_tuples(self.model.get_all_cases()) == case_tuples(self.db.get_all_cases())
+
+    def test_round_trip_case_counters(self):
+        assert counter_tuples(self.model.get_all_case_counters()) == \
+            counter_tuples(self.db.get_all_case_counters())
+
+    def test_lookup(self):
+        cases = self.model.get_cases_by_from(config['case_type_pos_word'], u"hei")
+
+        assert case_tuples(cases) == case_tuples(self.db.get_cases_by_from(config['case_type_pos_word'], u"hei"))
+        assert self.model.get_case_counter(config['case_type_pos_word'], u"hei").occurrences == 3
+        assert self.model.get_case_counter(config['case_type_pos_word'], u"gøy").occurrences == 1
+
+        assert self.model.get_cases_by_from(config['case_type_pos_word'], u"unknown") == []
+        assert self.model.get_cases_by_from(config['case_type_pos_suffix_ngram'], u"hei") == []
+        assert self.model.get_case_counter(config['case_type_pos_word'], u"N") is None
+
+    def test_null_strings(self):
+        assert (config['case_type_pos_word'], u"tom", None, 0) in case_tuples(self.model.get_all_cases())
+        assert (config['case_type_pos_morpheme'], None, u"N", 0) in case_tuples(self.model.get_all_cases())
+        assert (config['case_type_pos_word'], u"tom", 1) in counter_tuples(self.model.get_all_case_counters())
+
+        # Like in sqlite, NULL never matches a lookup
+        assert self.model.get_cases_by_from(config['case_type_pos_morpheme'], None) == []
+        assert self.model.get_case_counter(config['case_type_pos_morpheme'], None) is None
+
+    def test_import(self):
+        db = DbHandler("test_packed_import", False)
+        import_db(db, self.path)
+
+        assert case_tuples(db.get_all_cases()) == case_tuples(self.db.get_all_cases())
+        assert counter_tuples(db.get_all_case_counters()) == counter_tuples(self.db.get_all_case_counters())
+
+        # The bloom filter is rebuilt, so a handler opened later finds the imported keys
+        assert os.path.isfile(db.bloom_filter_path)
+        db.close()
+
+        db = DbHandler("test_packed_import", False)
+        assert len(db.get_cases_by_from(config['case_type_pos_word'], u"gøy")) == 1
+
+        db._destroy_database()
+
+    def test_incomplete_flag(self):
+        assert self.model.complete
+
+        db = DbHandler("test_packed_compacted", False)
+        db.bulk_insert(self.db.get_all_cases(), self.db.get_all_case_counters())
+        db.compact(2)
+        assert not db.is_complete()
+
+        path = os.path.join(tempfile.mkdtemp(), "test_packed_compacted.ctpk")
+        export_db(db, path)
+
+        model = PackedModel(path)
+        assert not model.complete
+        model.close()
+
+        db_2 = DbHandler("test_packed_compacted_import", False)
+        import_db(db_2, path)
+        assert not db_2.is_complete()
+
+        os.remove(path)
+        db._destroy_database()
+        db_2._destroy_database()
+
+    @classmethod
+    def teardown_class(cls):
+        cls.model.close()
+        os.remove(cls.path)
+        cls.db._destroy_database()
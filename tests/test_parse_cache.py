@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+import os
+import pickle
+import shutil
+import tempfile
+
+from typecraft_python.models import Text, Phrase, Word, Morpheme
+
+from casetagger.parse_cache import parse_cached, create_parse_cache_path, get_content_hash, \
+    create_parse_cache_header
+
+unpickled = []
+
+
+def record_unpickling():
+    unpickled.append(True)
+
+
+class Unpickled(object):
+    def __reduce__(self):
+        return record_unpickling, ()
+
+
+def create_text(title):
+    text = Text()
+    text.title = title
+
+    phrase = Phrase()
+    phrase.phrase = u"Dette er gøy"
+
+    word = Word()
+    word.word = "Dette"
+    word.pos = "PN"
+
+    morpheme = Morpheme()
+    morpheme.morpheme = "Dette"
+    morpheme.glosses = ["DEM"]
+
+    word.add_morpheme(morpheme)
+    phrase.add_word(word)
+    text.add_phrase(phrase)
+
+    return text
+
+
+class TestParseCache(object):
+
+    def setup_method(self, method):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "input.xml")
+        self.parse_count = 0
+
+    def teardown_method(self, method):
+        shutil.rmtree(self.directory)
+
+    def parse(self, file_contents):
+        self.parse_count += 1
+        return [create_text(file_contents)]
+
+    def test_parse_cached(self):
+        texts = parse_cached("first", self.path, self.parse)
+        assert self.parse_count == 1
+        assert os.path.isfile(create_parse_cache_path(self.path))
+
+        cached_texts = parse_cached("first", self.path, self.parse)
+        assert self.parse_count == 1
+        assert cached_texts[0].title == texts[0].title
+        assert cached_texts[0].phrases[0].words[0].pos == "PN"
+        assert cached_texts[0].phrases[0].words[0].morphemes[0].glosses == ["DEM"]
+
+    def test_changed_contents_are_reparsed(self):
+        parse_cached("first", self.path, self.parse)
+        texts = parse_cached("second", self.path, self.parse)
+
+        assert self.parse_count == 2
+        assert texts[0].title == "second"
+
+    def test_corrupt_cache_is_rebuilt(self):
+        with open(create_parse_cache_path(self.path), 'wb') as cache_file:
+            cache_file.write(b'garbage')
+
+        texts = parse_cached("first", self.path, self.parse)
+        assert self.parse_count == 1
+        assert texts[0].title == "first"
+
+        parse_cached("first", self.path, self.parse)
+        assert self.parse_count == 1
+
+    def test_cache_of_other_contents_is_not_unpickled(self):
+        with open(create_parse_cache_path(self.path), 'wb') as cache_file:
+            cache_file.write(create_parse_cache_header(get_content_hash("other")))
+            pickle.dump(Unpickled(), cache_file)
+
+        texts = parse_cached("first", self.path, self.parse)
+        assert self.parse_count == 1
+        assert texts[0].title == "first"
+        assert unpickled == []
+
+    def test_unpicklable_texts_are_not_cached(self):
+        def parse(file_contents):
+            text = create_text(file_contents)
+            text.parse = lambda: None
+            return [text]
+
+        texts = parse_cached("first", self.path, parse)
+        assert texts[0].title == "first"
+        assert os.listdir(self.directory) == []
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+Performance regression checks for training and tagging.
+
+Throughput depends on the machine, so a drop beyond the tolerance only warns, unless CASETAGGER_PERF_STRICT
+is set. Query counts per token don't depend on the machine, and an increase beyond the query tolerance fails.
+
+Environment variables:
+    CASETAGGER_PERF_TOLERANCE: The allowed relative drop in throughput, defaults to 0.5.
+    CASETAGGER_QUERY_TOLERANCE: The allowed relative increase in queries, defaults to 0.1.
+    CASETAGGER_PERF_STRICT: Fail instead of warn when throughput drops.
+    CASETAGGER_PERF_UPDATE: Write the measured values as the new baselines.
+"""
+import copy
+import json
+import os
+import time
+import warnings
+
+import pytest
+
+from benchmarks.corpus import create_text, strip_tags, count_tokens
+from casetagger.tagger import CaseTagger
+
+BASELINES_PATH = os.path.join(os.path.dirname(__file__), 'performance_baselines.json')
+
+TRAIN_PHRASES = 40
+TAG_PHRASES = 5
+
+
+def load_baselines():
+    with open(BASELINES_PATH) as baselines_file:
+        return json.load(baselines_file)
+
+
+class QueryCounter(object):
+    """
+    Counts the statements executed on a sqlite connection.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.count = 0
+
+    def __enter__(self):
+        self.conn.set_trace_callback(self.trace)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.conn.set_trace_callback(None)
+
+    def trace(self, statement):
+        self.count += 1
+
+
+class TestPerformance(object):
+
+    @classmethod
+    def setup_class(cls):
+        cls.baselines = load_baselines()
+        cls.measured = {}
+
+        cls.train_text = create_text(TRAIN_PHRASES, seed=0, language="test_performance")
+        cls.tag_text = strip_tags(create_text(TAG_PHRASES, seed=1, language="test_performance"))
+
+        CaseTagger.instantiate_db("test_performance")
+
+    @classmethod
+    def teardown_class(cls):
+        if os.environ.get('CASETAGGER_PERF_UPDATE') and len(cls.measured) > 0:
+            baselines = dict(cls.baselines)
+            baselines.update(cls.measured)
+
+            with open(BASELINES_PATH, 'w') as baselines_file:
+                json.dump(baselines, baselines_file, indent=2, sort_keys=True)
+                baselines_file.write('\n')
+
+        CaseTagger.db._destroy_database()
+
+    def check_throughput(self, name, value):
+        self.measured[name] = round(value, 1)
+
+        tolerance = float(os.environ.get('CASETAGGER_PERF_TOLERANCE', 0.5))
+        minimum = self.baselines[name] * (1 - tolerance)
+
+        if value < minimum:
+            message = "%s dropped to %.1f, the baseline is %.1f" % (name, value, self.baselines[name])
+
+            if os.environ.get('CASETAGGER_PERF_STRICT'):
+                pytest.fail(message)
+
+            warnings.warn(message)
+
+    def check_queries(self, name, value):
+        self.measured[name] = round(value, 2)
+
+        tolerance = float(os.environ.get('CASETAGGER_QUERY_TOLERANCE', 0.1))
+
+        assert value <= self.baselines[name] * (1 + tolerance), \
+            "%s increased to %.2f, the baseline is %.2f" % (name, value, self.baselines[name])
+
+    def test_train_throughput(self):
+        db = CaseTagger.db
+        db._clear_database()
+
+        case_count = sum(CaseTagger.count_text_cases(self.train_text).values())
+        counts_queries = hasattr(db.conn, 'set_trace_callback')
+
+        start = time.time()
+        if counts_queries:
+            with QueryCounter(db.conn) as counter:
+                CaseTagger.train(self.train_text)
+        else:
+            CaseTagger.train(self.train_text)
+        elapsed = time.time() - start
+
+        CaseTagger.finalize_training()
+
+        self.check_throughput('train_cases_per_second', case_count / elapsed)
+
+        if counts_queries:
+            self.check_queries('train_queries_per_case', float(counter.count) / case_count)
+
+    def test_tag_throughput(self):
+        db = CaseTagger.db
+
+        if len(list(db.get_all_case_counters())) == 0:
+            CaseTagger.train(self.train_text)
+            CaseTagger.finalize_training()
+
+        text = copy.deepcopy(self.tag_text)
+        token_count = count_tokens(text)
+        counts_queries = hasattr(db.conn, 'set_trace_callback')
+
+        start = time.time()
+        if counts_queries:
+            with QueryCounter(db.conn) as counter:
+                CaseTagger.tag_text(text)
+        else:
+            CaseTagger.tag_text(text)
+        elapsed = time.time() - start
+
+        self.check_throughput('tag_tokens_per_second', token_count / elapsed)
+
+        if counts_queries:
+            self.check_queries('tag_queries_per_token', float(counter.count) / token_count)
@@ -0,0 +1,186 @@
+import copy
+import gc
+import threading
+
+from benchmarks.corpus import create_text, strip_tags
+
+from casetagger.config import TaggerConfig, config
+from casetagger.db import DbHandler
+from casetagger.models import Case
+from casetagger.pool import DbPool
+from casetagger.tagger import CaseTagger
+
+
+def get_tags(texts):
+    return [(word.pos, [morpheme.glosses for morpheme in word.morphemes])
+            for text in texts for phrase in text.phrases for word in phrase.words]
+
+
+def test_pool_gives_every_thread_its_own_handler():
+    pool = DbPool("test_pool", use_memory=False, backend='sqlite')
+    handlers = []
+    errors = []
+
+    def run():
+        try:
+            handler = pool.get()
+            handlers.append(handler)
+            assert pool.get() is handler
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run) for i in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert len(set(id(handler) for handler in handlers)) == 3
+
+    handler = pool.get()
+    pool.invalidate()
+    assert pool.get() is not handler
+
+    pool.get()._destroy_database()
+    pool.close()
+
+
+def test_pool_releases_superseded_handlers():
+    pool = DbPool("test_pool_release", use_memory=False, backend='sqlite')
+
+    def run():
+        pool.get()
+
+    threads = [threading.Thread(target=run) for i in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    del threads
+    gc.collect()
+
+    # The handlers of the threads are released when they exit
+    handler = pool.get()
+    assert len(pool.handlers) == 1
+
+    for i in range(5):
+        pool.invalidate()
+        pool.get()
+
+    assert len(pool.handlers) == 1
+    assert handler not in pool.handlers
+
+    pool.get()._destroy_database()
+    pool.close()
+
+
+def test_pool_notices_writes_by_other_connections():
+    pool = DbPool("test_pool_version", use_memory=False, backend='sqlite')
+    handler = pool.get()
+    version = pool.get_model_version()
+
+    assert pool.get_model_version() == version
+
+    other_db = DbHandler("test_pool_version", False, 'sqlite')
+    other_db.insert_case(Case(config['case_type_pos_word'], u"new", u"N"))
+
+    assert pool.get_model_version() != version
+    assert pool.get() is not handler
+    assert len(pool.get().get_cases_by_from(config['case_type_pos_word'], u"new")) == 1
+
+    other_db.close()
+    pool.get()._destroy_database()
+    pool.close()
+
+
+def test_memory_instance_keeps_what_it_trains():
+    tagger = CaseTagger("test_pool_memory", use_memory=True, backend='sqlite')
+    text = create_text(5, seed=0, language="test_pool_memory")
+
+    tagger.train(text)
+    cases = len(tagger.get_db().get_all_cases())
+    assert cases > 0
+
+    tagger.finalize_training()
+    assert len(tagger.get_db().get_all_cases()) == cases
+
+    tagger.untrain(text)
+    assert all(case.occurrences == 0 for case in tagger.get_db().get_all_cases())
+
+    tagger.get_training_db()._destroy_database()
+    tagger.close()
+
+
+class TestThreadedTagging(object):
+
+    @classmethod
+    def setup_class(cls):
+        cls.tagger = CaseTagger("test_pool", use_memory=False, backend='sqlite')
+        cls.tagger.train(create_text(40, seed=0, language="test_pool"))
+        cls.tagger.finalize_training()
+
+        cls.texts = [strip_tags(create_text(2, seed=10 + i, language="test_pool")) for i in range(8)]
+
+    @classmethod
+    def teardown_class(cls):
+        cls.tagger.get_db()._destroy_database()
+        cls.tagger.close()
+
+    def test_threads_tag_like_sequential(self):
+        sequential_texts = copy.deepcopy(self.texts)
+        for text in sequential_texts:
+            self.tagger.tag_text(text)
+
+        threaded_texts = copy.deepcopy(self.texts)
+        errors = []
+
+        def run(thread_texts):
+            try:
+                for text in thread_texts:
+                    self.tagger.tag_text(text)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=run, args=(threaded_texts[i::4],)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert errors == []
+        assert get_tags(threaded_texts) == get_tags(sequential_texts)
+
+    def test_instances_keep_their_config(self):
+        pos_tagger = CaseTagger("test_pool", TaggerConfig(tag_level="pos"), use_memory=False, backend='sqlite')
+
+        text = copy.deepcopy(self.texts[0])
+        pos_tagger.tag_text(text)
+        pos_tagger.close()
+
+        all_text = copy.deepcopy(self.texts[0])
+        self.tagger.tag_text(all_text)
+
+        glosses = [morpheme.glosses for phrase in text.phrases for word in phrase.words for morpheme in word.morphemes]
+        all_glosses = [morpheme.glosses for phrase in all_text.phrases for word in phrase.words
+                       for morpheme in word.morphemes]
+
+        assert all(word.pos is not None for phrase in text.phrases for word in phrase.words)
+        assert glosses == [morpheme.glosses for phrase in self.texts[0].phrases for word in phrase.words
+                           for morpheme in word.morphemes]
+        assert glosses != all_glosses
+
+    def test_instances_keep_their_switches(self):
+        memo_tagger = CaseTagger("test_pool", TaggerConfig(use_phrase_memo=True, prune_tag_cases=False),
+                                 use_memory=False, backend='sqlite')
+
+        text = copy.deepcopy(self.texts[0])
+        memo_tagger.tag_text(text)
+        memo_tagger.close()
+
+        other_text = copy.deepcopy(self.texts[0])
+        self.tagger.tag_text(other_text)
+
+        assert memo_tagger.phrase_memo.get_stats()['size'] > 0
+        assert self.tagger.phrase_memo is None
+        assert get_tags([text]) == get_tags([other_text])
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import copy
+import math
+
+import pytest
+
+from casetagger.config import config, get_tagger_config
+from casetagger.db import DbHandler
+from casetagger.models import Cases, WordCases, MorphemeCases
+from casetagger.sparse import SparseModel, is_available
+from casetagger.tagger import CaseTagger
+from tests import test_tagger
+
+pytestmark = pytest.mark.skipif(not is_available(), reason="sparse scoring requires numpy and scipy")
+
+
+def get_tags(text):
+    return [(word.pos, [morpheme.glosses for morpheme in word.morphemes])
+            for phrase in text.phrases for word in phrase.words]
+
+
+class TestSparseModel(object):
+
+    @classmethod
+    def setup_class(cls):
+        test_tagger.TestTagger.setup_class()
+        cls.text = test_tagger.TestTagger.detail_text
+
+        CaseTagger.instantiate_db("test_sparse")
+        CaseTagger.train(cls.text)
+
+    @classmethod
+    def teardown_class(cls):
+        config['use_sparse_scoring'] = False
+        CaseTagger.sparse_model = None
+        CaseTagger.db._destroy_database()
+
+    def test_predict_matches_merge(self):
+        db = CaseTagger.db
+        tagger_config = get_tagger_config()
+        model = SparseModel(db, tagger_config)
+
+        word_cases = [WordCases(word, phrase, tagger_config=tagger_config)
+                      for phrase in self.text.phrases for word in phrase.words]
+        morpheme_cases = [MorphemeCases(morpheme, word, phrase, tagger_config=tagger_config)
+                          for phrase in self.text.phrases for word in phrase.words for morpheme in word.morphemes]
+
+        for token_cases in [word_cases, morpheme_cases]:
+            to_cases = db.get_to_cases_by_keys((case.type, case.case_from) for cases in token_cases for case in cases)
+            expected = [DbHandler.collect_to_cases(cases, to_cases).merge(tagger_config) for cases in token_cases]
+
+            assert model.predict(token_cases) == expected
+
+    def test_tag_phrases_with_sparse_scoring(self):
+        text = copy.deepcopy(self.text)
+        CaseTagger.tag_phrases(text.phrases)
+
+        config['use_sparse_scoring'] = True
+        sparse_text = copy.deepcopy(self.text)
+        CaseTagger.tag_phrases(sparse_text.phrases)
+        config['use_sparse_scoring'] = False
+
+        assert get_tags(sparse_text) == get_tags(text)
+
+    def test_sparse_model_follows_training(self):
+        tagger_config = get_tagger_config()
+        model = CaseTagger.get_sparse_model(CaseTagger.db, tagger_config)
+        assert CaseTagger.get_sparse_model(CaseTagger.db, tagger_config) is model
+
+        CaseTagger.train(self.text)
+        assert CaseTagger.get_sparse_model(CaseTagger.db, tagger_config) is not model
+
+    def test_model_adjusts_cases_like_merge(self):
+        db = CaseTagger.db
+        cases = [case for case in db.get_all_cases() if case.occurrences > 0]
+        word_case = next(case for case in cases if case.type == config['case_type_pos_word'])
+        ngram_case = next(case for case in cases if '|' in case.case_from)
+
+        tagger_config = get_tagger_config().replace(
+            case_from_adjustments={u"%d%s" % (word_case.type, word_case.case_from): 0.1},
+            case_full_adjustments={u"%d%s%s" % (ngram_case.type, ngram_case.case_from, ngram_case.case_to): 0.5})
+        model = SparseModel(db, tagger_config)
+
+        for case in [word_case, ngram_case]:
+            case.prob = float(case.occurrences) / db.get_case_counter(case.type, case.case_from).occurrences
+            Cases.adjust_individual_probabilities([case], tagger_config)
+
+            row = model.key_index[(case.type, case.case_from)]
+            column = model.labels.index(case.case_to)
+
+            assert model.log_misses[row, column] == pytest.approx(math.log(1 - case.prob))
+
+    def test_predict_without_cases(self):
+        model = SparseModel(CaseTagger.db)
+        assert model.predict([]) == []
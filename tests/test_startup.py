@@ -0,0 +1,108 @@
+import subprocess
+import sys
+import threading
+
+import pytest
+
+"""
+Budget in microseconds for importing the cli, including click. Generous, so only real regressions fail.
+"""
+CLI_IMPORT_BUDGET = 250000
+
+"""
+Modules the cli must not import until a command needs them.
+"""
+DEFERRED_MODULES = [
+    'casetagger.tagger',
+    'casetagger.db',
+    'casetagger.models',
+    'sqlite3',
+    'typecraft_python.models',
+    'typecraft_python.parsing.parser'
+]
+
+
+def get_import_times(module):
+    """
+    Imports a module in a fresh interpreter with -X importtime.
+
+    :param module:
+    :return: A dict of imported module name to cumulative import time in microseconds.
+    """
+    output = subprocess.check_output([sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+                                     stderr=subprocess.STDOUT).decode('utf8')
+
+    import_times = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+
+        _, cumulative, name = line[len('import time:'):].split('|')
+        import_times[name.strip()] = int(cumulative)
+
+    return import_times
+
+
+@pytest.mark.skipif(sys.version_info < (3, 7), reason="requires -X importtime")
+def test_cli_defers_heavy_imports():
+    import_times = get_import_times('casetagger.cli')
+
+    for module in DEFERRED_MODULES:
+        assert module not in import_times
+
+    assert import_times['casetagger.cli'] < CLI_IMPORT_BUDGET
+
+
+@pytest.mark.skipif(sys.version_info < (3, 7), reason="requires -X importtime")
+def test_config_import_has_no_side_effects():
+    import_times = get_import_times('casetagger.config')
+
+    assert 'json' not in import_times
+    assert 'glob' not in import_times
+
+
+def test_lazy_config_loads_json_on_first_access(tmpdir):
+    from casetagger.config import Config
+
+    tmpdir.join('a.json').write('{"number_of_passes": 3, "tag_level": "pos"}')
+
+    lazy_config = Config({"number_of_passes": 2, "tag_level": "all"}, str(tmpdir) + "/*.json")
+    assert not lazy_config.loaded
+
+    lazy_config['tag_level'] = "gloss"
+
+    assert lazy_config.loaded
+    assert lazy_config['number_of_passes'] == 3
+    assert lazy_config['tag_level'] == "gloss"
+
+
+def test_lazy_config_loads_once_from_several_threads(tmpdir, monkeypatch):
+    import glob
+    from casetagger.config import Config
+
+    tmpdir.join('a.json').write('{"number_of_passes": 3}')
+
+    patterns = []
+    original_glob = glob.glob
+
+    def counting_glob(pattern):
+        patterns.append(pattern)
+        return original_glob(pattern)
+
+    monkeypatch.setattr(glob, 'glob', counting_glob)
+
+    lazy_config = Config({"number_of_passes": 2}, str(tmpdir) + "/*.json")
+    values = []
+
+    def read():
+        values.append(lazy_config['number_of_passes'])
+
+    threads = [threading.Thread(target=read) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert values == [3] * 8
+    assert len(patterns) == 1
+    assert lazy_config.version == 1
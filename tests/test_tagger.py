@@ -6,9 +6,14 @@ from typecraft_python.models import Phrase
 from typecraft_python.models import Word
 from typecraft_python.models import Morpheme
 
+from casetagger.budget import TagBudget
+from casetagger.config import config, TaggerConfig, get_tagger_config
 from casetagger.tagger import CaseTagger
-from casetagger.models import Case, CaseFromCounter
+from casetagger.db import DbHandler
+from casetagger import debug
+from casetagger.models import Case, CaseFromCounter, WordCases, MorphemeCases
 
+import copy
 import random
 
 words = ["Hei", "dette", "er", u"gøy", "og", "veldig", "morsomt", "la", "oss", "leke"]
@@ -101,6 +106,32 @@ class TestTagger(object):
 
         CaseTagger.db._clear_database()
 
+    def test_train_collapses_duplicate_phrases(self):
+        CaseTagger.instantiate_db("test")
+        db = CaseTagger.db
+
+        def get_counts():
+            return sorted((case.type, case.case_from, case.case_to, case.occurrences) for case in db.get_all_cases()), \
+                sorted((counter.type, counter.case_from, counter.occurrences)
+                       for counter in db.get_all_case_counters())
+
+        for i in range(3):
+            CaseTagger.train(self.detail_text)
+        expected = get_counts()
+        db._clear_database()
+
+        text = copy.deepcopy(self.detail_text)
+        for i in range(2):
+            for phrase in copy.deepcopy(self.detail_text.phrases):
+                text.add_phrase(phrase)
+
+        assert len(CaseTagger.group_duplicate_phrases(text.phrases)) == len(self.detail_text.phrases)
+
+        CaseTagger.train(text)
+        assert get_counts() == expected
+
+        db._clear_database()
+
     def test_tag_simple_text(self):
         CaseTagger.instantiate_db("test")
         CaseTagger.train(self.detail_text)
@@ -145,6 +176,245 @@ class TestTagger(object):
 
         CaseTagger.db._clear_database()
 
+    def test_tag_phrases(self):
+        CaseTagger.instantiate_db("test")
+        CaseTagger.train(self.detail_text)
+
+        text = copy.deepcopy(self.detail_text)
+        for phrase in text.phrases:
+            for word in phrase.words:
+                word.pos = ""
+                for morpheme in word.morphemes:
+                    morpheme.glosses = []
+
+        CaseTagger.tag_phrases(text.phrases + copy.deepcopy(text.phrases), batch_size=2)
+
+        for phrase, gold_phrase in zip(text.phrases, self.detail_text.phrases):
+            for word, gold_word in zip(phrase.words, gold_phrase.words):
+                assert word.pos == gold_word.pos
+                for morpheme, gold_morpheme in zip(word.morphemes, gold_word.morphemes):
+                    assert morpheme.glosses == gold_morpheme.glosses
+
+        CaseTagger.db._clear_database()
+
+    def test_pruning_keeps_to_cases(self):
+        CaseTagger.instantiate_db("test")
+        CaseTagger.train(self.detail_text)
+
+        db = CaseTagger.db
+        key_filter = CaseTagger.create_key_filter(db, {})
+
+        def get_to_cases(cases):
+            to_cases = db.get_to_cases_by_keys((case.type, case.case_from) for case in cases)
+            return sorted((case.type, case.case_from, case.case_to, case.occurrences, case.multiplicity)
+                          for case in DbHandler.collect_to_cases(cases, to_cases))
+
+        for phrase in self.bulk_text.phrases:
+            for word in phrase.words:
+                assert get_to_cases(WordCases(word, phrase, key_filter=key_filter)) == \
+                    get_to_cases(WordCases(word, phrase))
+
+                for morpheme in word.morphemes:
+                    assert get_to_cases(MorphemeCases(morpheme, word, phrase, key_filter=key_filter)) == \
+                        get_to_cases(MorphemeCases(morpheme, word, phrase))
+
+        CaseTagger.db._clear_database()
+
+    def test_pruning_reuses_the_fetched_to_cases(self):
+        CaseTagger.instantiate_db("test")
+        CaseTagger.train(self.detail_text)
+
+        db = CaseTagger.db
+        db.bloom_filter = None
+        fetched_keys = []
+        get_to_cases_by_keys = db.get_to_cases_by_keys
+
+        def get_counted_to_cases_by_keys(keys):
+            keys = list(keys)
+            fetched_keys.extend(keys)
+            return get_to_cases_by_keys(keys)
+
+        db.get_to_cases_by_keys = get_counted_to_cases_by_keys
+
+        # Without a bloom filter, the to-cases fetched by the key filter are merged, so no key is fetched twice
+        for tagger_config in [TaggerConfig(cache_static_cases=False),
+                              TaggerConfig(cache_static_cases=False, prune_tag_cases=False)]:
+            del fetched_keys[:]
+            text = copy.deepcopy(self.bulk_text)
+            CaseTagger.tag_phrase_list(text.phrases, db, tagger_config)
+
+            assert len(fetched_keys) == len(set(fetched_keys)) > 0
+
+        del db.get_to_cases_by_keys
+        CaseTagger.db._clear_database()
+
+    def test_pruning_is_disabled_on_compacted_dbs(self):
+        CaseTagger.instantiate_db("test")
+        CaseTagger.train(self.detail_text)
+
+        db = CaseTagger.db
+        assert db.is_complete()
+        assert CaseTagger.create_key_filter(db, {}) is not None
+
+        # Removing rare cases can remove the keys a kept key was pruned by
+        db.compact(2, type_thresholds={config['case_type_pos_word']: 3})
+        assert not db.is_complete()
+        assert CaseTagger.create_key_filter(db, {}) is None
+
+        CaseTagger.db._clear_database()
+        assert db.is_complete()
+
+    def test_tag_levels(self):
+        CaseTagger.instantiate_db("test")
+        CaseTagger.train(self.detail_text, tagger_config=TaggerConfig(train_level="pos"))
+
+        gloss_types = [config['case_type_gloss_morph'], config['case_type_gloss_word'], config['case_type_gloss_pos']]
+        assert not any(case.type & gloss_type for case in CaseTagger.db.get_all_cases() for gloss_type in gloss_types)
+
+        def clear_tags(text):
+            for phrase in text.phrases:
+                for word in phrase.words:
+                    word.pos = ""
+                    for morpheme in word.morphemes:
+                        morpheme.glosses = []
+            return text
+
+        text = clear_tags(copy.deepcopy(self.detail_text))
+        CaseTagger.tag_text(text, TaggerConfig(tag_level="gloss"))
+        assert all(word.pos == "" for phrase in text.phrases for word in phrase.words)
+
+        text = clear_tags(copy.deepcopy(self.detail_text))
+        CaseTagger.tag_text(text, TaggerConfig(tag_level="pos"))
+        assert all(word.pos != "" for phrase in text.phrases for word in phrase.words)
+        assert all(morpheme.glosses == [] for phrase in text.phrases for word in phrase.words
+                   for morpheme in word.morphemes)
+
+        result = CaseTagger.test_text(copy.deepcopy(self.detail_text), TaggerConfig(tag_level="pos"))
+        assert result.words_total > 0
+        assert result.morphemes_total == 0
+
+        CaseTagger.db._clear_database()
+
+    def test_tag_within_budget(self):
+        CaseTagger.instantiate_db("test")
+        CaseTagger.train(self.detail_text)
+
+        def get_poses(text):
+            return [word.pos for phrase in text.phrases for word in phrase.words]
+
+        cheap_text = copy.deepcopy(self.detail_text)
+        CaseTagger.tag_text(cheap_text, get_tagger_config().replace(register_ngrams=False, tuple_max_length=1,
+                                                                     number_of_passes=1))
+
+        text = copy.deepcopy(self.detail_text)
+        report = CaseTagger.tag_text(text, budget=TagBudget(max_cases=0))
+        assert report['refined'] == 0 and report['completed'] == 0
+        assert report['tokens'] > 0
+        assert get_poses(text) == get_poses(cheap_text)
+
+        text = copy.deepcopy(self.detail_text)
+        report = CaseTagger.tag_text(text, budget=TagBudget())
+        assert report['refined'] == report['refinements'] == report['tokens'] * config['number_of_passes']
+        assert report['completed'] == 1.0
+
+        text = copy.deepcopy(self.detail_text)
+        report = CaseTagger.tag_text(text, budget=TagBudget(max_cases=report['cases'] // 2))
+        assert 0 < report['refined'] < report['refinements']
+
+        CaseTagger.db._clear_database()
+
+    def test_test_text(self):
+        CaseTagger.instantiate_db("test")
+        CaseTagger.train(self.detail_text)
+
+        tagged_text = copy.deepcopy(self.bulk_text)
+        CaseTagger.tag_text(tagged_text)
+        expected = debug.TestResult.from_data(self.bulk_text, tagged_text)
+
+        result = CaseTagger.test_text(copy.deepcopy(self.bulk_text))
+
+        assert result.words_total == expected.words_total > 0
+        assert result.morphemes_total == expected.morphemes_total
+        assert [(word.word, word.pos_1, word.pos_2) for word in result.wrong_words] == \
+            [(word.word, word.pos_1, word.pos_2) for word in expected.wrong_words]
+        assert len(result.correct_morphemes) == len(expected.correct_morphemes)
+
+        merged = debug.TestResult.merge(result, expected)
+        assert merged.words_total == 2 * result.words_total
+        assert len(merged.correct_words) == 2 * len(result.correct_words)
+
+        CaseTagger.db._clear_database()
+
+    def test_test_result_compares_sorted_glosses(self):
+        def create_text(glosses):
+            text = Text()
+            phrase = Phrase()
+            word = Word()
+            word.word = u"hei"
+            word.pos = u"N"
+            morpheme = Morpheme()
+            morpheme.morpheme = u"hei"
+            morpheme.glosses = glosses
+            word.add_morpheme(morpheme)
+            phrase.add_word(word)
+            text.add_phrase(phrase)
+            return text
+
+        gold_text = create_text([u"3.SG", u"PL"])
+
+        # The order of the glosses doesn't matter, but glosses holding dots are not split
+        result = debug.TestResult.from_data(gold_text, create_text([u"PL", u"3.SG"]))
+        assert len(result.correct_morphemes) == 1
+
+        result = debug.TestResult.from_data(gold_text, create_text([u"SG", u"3.PL"]))
+        assert len(result.wrong_morphemes) == 1
+
+    def test_untrain(self):
+        CaseTagger.instantiate_db("test")
+        CaseTagger.train(self.detail_text)
+        CaseTagger.train(self.bulk_text)
+        CaseTagger.untrain(self.bulk_text)
+
+        cases = sorted((case.type, case.case_from, case.case_to, case.occurrences)
+                       for case in CaseTagger.db.get_all_cases())
+        CaseTagger.db._clear_database()
+
+        CaseTagger.train(self.detail_text)
+        expected = sorted((case.type, case.case_from, case.case_to, case.occurrences)
+                          for case in CaseTagger.db.get_all_cases())
+
+        assert cases == expected
+
+        CaseTagger.db._clear_database()
+
+    def test_retrain(self):
+        revised_text = copy.deepcopy(self.detail_text)
+        revised_text.phrases[0].words[1].pos = "AUX"
+        revised_text.phrases[0].words[3].morphemes[0].glosses = ["PL"]
+
+        CaseTagger.instantiate_db("test")
+        CaseTagger.train(revised_text)
+        expected_cases = sorted((case.type, case.case_from, case.case_to, case.occurrences)
+                                for case in CaseTagger.db.get_all_cases())
+        expected_counters = sorted((counter.type, counter.case_from, counter.occurrences)
+                                   for counter in CaseTagger.db.get_all_case_counters())
+        CaseTagger.db._clear_database()
+
+        assert CaseTagger.apply_text_delta(None, self.detail_text, "detail")
+        assert not CaseTagger.apply_text_delta(None, self.detail_text, "detail")
+        assert CaseTagger.retrain(self.detail_text, revised_text, "detail")
+        assert not CaseTagger.retrain(self.detail_text, revised_text, "detail")
+
+        cases = sorted((case.type, case.case_from, case.case_to, case.occurrences)
+                       for case in CaseTagger.db.get_all_cases())
+        counters = sorted((counter.type, counter.case_from, counter.occurrences)
+                          for counter in CaseTagger.db.get_all_case_counters())
+
+        assert cases == expected_cases
+        assert counters == expected_counters
+
+        CaseTagger.db._clear_database()
+
     @classmethod
     def teardown_class(cls):
         pass
@@ -0,0 +1,72 @@
+import threading
+
+import pytest
+
+from casetagger.db import DbHandler
+from casetagger.writer import CaseWriter
+
+
+def create_deltas(i):
+    return {
+        (1, "word", "N"): 1,
+        (2, "morph%d" % (i % 3), "V"): 2
+    }
+
+
+def get_counts(db):
+    cases = sorted((case.type, case.case_from, case.case_to, case.occurrences) for case in db.get_all_cases())
+    counters = sorted((counter.type, counter.case_from, counter.occurrences) for counter in db.get_all_case_counters())
+    return cases, counters
+
+
+def test_writer_batches_transactions():
+    db = DbHandler("test_writer", False)
+
+    with CaseWriter(db, batch_size=10, queue_size=2) as writer:
+        for i in range(25):
+            writer.put(create_deltas(i))
+
+    assert writer.transactions == 3
+
+    cases, counters = get_counts(db)
+    assert cases == [(1, "word", "N", 25), (2, "morph0", "V", 18), (2, "morph1", "V", 16), (2, "morph2", "V", 16)]
+    assert counters == [(1, "word", 25), (2, "morph0", 18), (2, "morph1", 16), (2, "morph2", 16)]
+
+    db._destroy_database()
+
+
+def test_writer_raises_errors():
+    db = DbHandler("test_writer", False)
+
+    writer = CaseWriter(db, batch_size=1, queue_size=1)
+    writer.start()
+    writer.put({(1, "word"): 1})
+
+    with pytest.raises(Exception):
+        for i in range(10):
+            writer.put(create_deltas(i))
+        writer.close()
+
+    db._destroy_database()
+
+
+def test_concurrent_writers():
+    # Two handlers on the same file, like two training processes
+    dbs = [DbHandler("test_writer", False), DbHandler("test_writer", False)]
+
+    def train(db):
+        with CaseWriter(db, batch_size=5) as writer:
+            for i in range(50):
+                writer.put(create_deltas(i))
+
+    threads = [threading.Thread(target=train, args=(db,)) for db in dbs]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    cases, counters = get_counts(dbs[0])
+    assert cases == [(1, "word", "N", 100), (2, "morph0", "V", 68), (2, "morph1", "V", 68), (2, "morph2", "V", 64)]
+
+    dbs[1].close()
+    dbs[0]._destroy_database()